@@ -0,0 +1,60 @@
+#################################################
+# asset_cache.py - pre-rendered screens and animation frames
+#
+# Text screens and the crash animation never change, so rasterize them
+# with PIL once and hand back the same images every time after that.
+# Drawing one is then just a copy into the renderer's frame.
+#################################################
+
+from PIL import Image, ImageDraw
+
+crash_color = (255,0,0)
+crash_fill = (255,255,255)
+
+class AssetCache(object):
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.text_images = {}
+    self.crash_images = None
+
+  ###################################
+  # text()
+  #   full-panel image of my_text in text_color, rendered on first use.
+  ###################################
+  def text(self, my_text, text_color):
+    key = (my_text, text_color, self.width, self.height)
+    image = self.text_images.get(key)
+    if image is None:
+      image = Image.new("RGB", (self.width, self.height))
+      temp_draw = ImageDraw.Draw(image)
+      temp_draw.text((0,0), my_text, fill=text_color)
+      self.text_images[key] = image
+    return image
+
+  ###################################
+  # crash_frames()
+  #   list of (image, offset) for the growing crash ellipse.  Draw each
+  #   image with its top left corner at (crash_x - offset, crash_y - offset).
+  ###################################
+  def crash_frames(self):
+    if self.crash_images is None:
+      self.crash_images = []
+      for crashloop in range(3,13,2):
+        ellipse_offset = (crashloop-1)//2
+        image = Image.new("RGB", (crashloop,crashloop))
+        temp_draw = ImageDraw.Draw(image)
+        temp_draw.ellipse((0,0,crashloop-1,crashloop-1), outline=crash_color, fill=crash_fill)
+        self.crash_images.append((image, ellipse_offset))
+    return self.crash_images
+
+  ###################################
+  # preload()
+  #   renders a list of (text, color) screens plus the crash animation now,
+  #   so the first round doesn't pay for it.
+  ###################################
+  def preload(self, screens):
+    for my_text, text_color in screens:
+      self.text(my_text, text_color)
+    self.crash_frames()
@@ -0,0 +1,287 @@
+#################################################
+# bench.py - timings for the per-tick hot paths
+#
+# Runs each benchmark against the 64x64 single panel and the 128x96
+# chained layout, and reports microseconds per operation (best of
+# several runs).  Save the numbers as a baseline, then compare later
+# runs against it to catch regressions:
+#
+#   python bench.py --save bench_baseline.json
+#   python bench.py --compare bench_baseline.json
+#
+# --compare exits non-zero if anything got slower by more than
+# --threshold (default 10%).
+#################################################
+
+import argparse
+import json
+import random
+import sys
+from collections import namedtuple
+
+from tick_scheduler import monotonic
+from collision_grid import CollisionGrid
+from engine import CyclesEngine, EngineSnapshot, EVENT_MOVE
+from renderer import FrameRenderer
+from display_backends import ImageMatrix
+from gamepad_profiles import default_table, decode
+
+# name -> (width, height)
+configs = [("64x64", 64, 64), ("128x96", 128, 96)]
+
+###################################
+# Each bench_ function sets things up and returns run(count), which does
+# count operations.  Only run() gets timed.
+###################################
+
+###################################
+# bench_engine_step()
+#   one engine tick with random turns.  Finished games get reset, so a
+#   few resets are mixed in with the ticks.  bench_trail_step() is the
+#   same with trails limited to 32 cells, so the tails are being pulled
+#   in on nearly every tick.
+###################################
+def bench_engine_step(width, height, trail_length=None):
+  engine = CyclesEngine(width, height, None, trail_length)
+  rng = random.Random(1)
+  inputs = []
+  for i in range(4096):
+    inputs.append([rng.randrange(4) if rng.random() < 0.1 else None
+                   for player in range(engine.players)])
+
+  def run(count):
+    step = engine.step
+    for i in range(count):
+      if engine.game_over:
+        engine.reset()
+      step(inputs[i & 4095])
+  return run
+
+def bench_trail_step(width, height):
+  return bench_engine_step(width, height, 32)
+
+###################################
+# bench_collision()
+#   x,y -> index -> test_and_set, over every playfield cell in random
+#   order, resetting the grid after each full pass.
+###################################
+def bench_collision(width, height):
+  grid = CollisionGrid(width, height)
+  cells = [(x, y) for x in range(width) for y in range(height)]
+  random.Random(1).shuffle(cells)
+  cell_count = len(cells)
+
+  def run(count):
+    index = grid.index
+    test_and_set = grid.test_and_set
+    for i in range(count):
+      x, y = cells[i % cell_count]
+      test_and_set(index(x, y))
+      if i % cell_count == cell_count - 1:
+        grid.reset()
+  return run
+
+###################################
+# bench_round_setup()
+#   what a new round costs:  engine reset (collision grid and players),
+#   then walls and players drawn and presented.
+###################################
+def bench_round_setup(width, height):
+  engine = CyclesEngine(width, height)
+  renderer = FrameRenderer(ImageMatrix(width, height), width, height)
+
+  def run(count):
+    for i in range(count):
+      engine.reset()
+      renderer.clear()
+      renderer.draw_box((255,0,0))
+      for player in range(engine.players):
+        start_x, start_y = engine.coords(player)
+        renderer.set_pixel(start_x, start_y, (0,255,0))
+      renderer.present()
+  return run
+
+###################################
+# bench_decode()
+#   gamepad event decode through the generic profile's table, using a
+#   realistic mix of D-pad, button and SYN events.
+###################################
+def bench_decode(width, height):
+  Event = namedtuple("Event", "type code value")
+  mix = [Event(3, 1, 0), Event(0, 0, 0), Event(3, 1, 127), Event(0, 0, 0),
+         Event(3, 0, 255), Event(0, 0, 0), Event(1, 297, 1), Event(1, 297, 0)]
+  events = mix * 128
+
+  def run(count):
+    event_count = len(events)
+    for i in range(count):
+      decode(default_table, events[i % event_count])
+  return run
+
+###################################
+# bench_render_tick()
+#   a normal tick's worth of drawing (two moves) pushed through a mock
+#   matrix with present().
+###################################
+def bench_render_tick(width, height):
+  engine = CyclesEngine(width, height)
+  renderer = FrameRenderer(ImageMatrix(width, height), width, height)
+  colors = [(0,255,0), (0,0,255)]
+  moves = []
+  while not engine.game_over:
+    for event in engine.step([None] * engine.players):
+      if event[0] == EVENT_MOVE:
+        moves.append(event)
+  move_count = len(moves)
+
+  def run(count):
+    for i in range(count):
+      for j in (2 * i, 2 * i + 1):
+        event = moves[j % move_count]
+        renderer.set_pixel(event[2], event[3], colors[event[1] & 1])
+      renderer.present()
+  return run
+
+###################################
+# bench_snapshot()
+#   one save and one restore of the whole engine state, the unit of
+#   work behind a rollback.
+###################################
+def bench_snapshot(width, height):
+  engine = CyclesEngine(width, height)
+  snapshot = EngineSnapshot(engine)
+
+  def run(count):
+    save = engine.save
+    restore = engine.restore
+    for i in range(count):
+      save(snapshot)
+      restore(snapshot)
+  return run
+
+###################################
+# bench_trails()
+#   a --trails tick:  two moves marked, the whole frame composed through
+#   the lookup tables, and pushed through a mock matrix as one image.
+###################################
+def bench_trails(width, height):
+  try:
+    from trails import TrailPipeline
+  except ImportError:
+    return None
+
+  engine = CyclesEngine(width, height)
+  trails = TrailPipeline(engine.grid, (255,0,0), [(0,255,0), (0,0,255)])
+  renderer = FrameRenderer(ImageMatrix(width, height), width, height)
+  moves = []
+  while not engine.game_over:
+    for event in engine.step([None] * engine.players):
+      if event[0] == EVENT_MOVE:
+        moves.append((engine.grid.index(event[2], event[3]), event[1]))
+  move_count = len(moves)
+
+  def run(count):
+    for i in range(count):
+      for j in (2 * i, 2 * i + 1):
+        cell, player = moves[j % move_count]
+        trails.mark(cell, player, i)
+      renderer.draw_frame(trails.compose(i), trails.changed)
+      renderer.present()
+  return run
+
+benchmarks = [("engine_step", bench_engine_step),
+              ("trail_step", bench_trail_step),
+              ("collision", bench_collision),
+              ("round_setup", bench_round_setup),
+              ("decode", bench_decode),
+              ("render_tick", bench_render_tick),
+              ("snapshot", bench_snapshot),
+              ("trails", bench_trails)]
+
+###################################
+# time_it()
+#   best microseconds per op over repeat runs.  count is picked so one
+#   run takes roughly min_time seconds.
+###################################
+def time_it(run, min_time, repeat):
+  count = 1
+  while True:
+    start = monotonic()
+    run(count)
+    elapsed = monotonic() - start
+    if elapsed >= min_time / 10.0:
+      break
+    count *= 10
+  count = max(1, int(count * min_time / max(elapsed, 1e-9) / 10.0) * 10)
+
+  best = None
+  for i in range(repeat):
+    start = monotonic()
+    run(count)
+    per_op = (monotonic() - start) / count
+    if (best is None) or (per_op < best):
+      best = per_op
+  return best * 1e6
+
+def run_benchmarks(selected, min_time, repeat):
+  results = {}
+  for config_name, width, height in configs:
+    for bench_name, bench in benchmarks:
+      if selected and bench_name not in selected:
+        continue
+      run = bench(width, height)
+      if run is None:
+        print("%-12s %-8s skipped" % (bench_name, config_name))
+        continue
+      key = "%s/%s" % (bench_name, config_name)
+      results[key] = time_it(run, min_time, repeat)
+      print("%-12s %-8s %10.2f us/op" % (bench_name, config_name, results[key]))
+  return results
+
+###################################
+# compare()
+#   prints how each result moved against the baseline.  Returns the names
+#   of the ones that got slower by more than threshold (a fraction).
+###################################
+def compare(results, baseline, threshold):
+  regressions = []
+  for key in sorted(results):
+    if key not in baseline:
+      print("%-22s new" % key)
+      continue
+    change = results[key] / baseline[key] - 1.0
+    flag = ""
+    if change > threshold:
+      flag = "  REGRESSION"
+      regressions.append(key)
+    print("%-22s %10.2f -> %10.2f us/op  %+6.1f%%%s" % (key, baseline[key], results[key], change * 100, flag))
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark the tick, collision and render hot paths.")
+  parser.add_argument("--save", help="write results to this baseline file")
+  parser.add_argument("--compare", help="compare results against this baseline file")
+  parser.add_argument("--threshold", type=float, default=0.10,
+                      help="slowdown that counts as a regression (default 0.10)")
+  parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run")
+  parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+  parser.add_argument("benchmarks", nargs="*", help="only run these (default all)")
+  args = parser.parse_args()
+
+  results = run_benchmarks(args.benchmarks, args.min_time, args.repeat)
+
+  if args.save:
+    with open(args.save, "w") as f:
+      json.dump(results, f, indent=2, sort_keys=True)
+
+  if args.compare:
+    with open(args.compare) as f:
+      baseline = json.load(f)
+    print("")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+      print("%d regression(s)" % len(regressions))
+      sys.exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,234 @@
+#################################################
+# bot.py - computer player
+#
+# Picks a direction by looking a few of its own moves ahead and scoring
+# each position with a Voronoi split of the board:  cells the bot can
+# reach before any opponent are its territory, cells an opponent gets
+# to first are theirs, ties belong to nobody.  More territory is better.
+# Opponents are treated as standing still during the lookahead.
+#
+# The search is iterative deepening with a hard time budget, checked
+# between moves and between layers of every Voronoi fill.  When the
+# budget runs out the best move from the deepest finished search is used,
+# or if not even one move ahead got finished, straight on if that's safe.
+#
+# Everything works on flat bytearrays the same shape as the collision
+# grid.  The grid is copied into a scratch buffer once per decision
+# (one slice copy) and lookahead moves are set and cleared in place.
+#################################################
+
+import time
+
+from tick_scheduler import monotonic
+from gamepad_profiles import ACTION_UP, ACTION_RIGHT, ACTION_DOWN, ACTION_LEFT
+
+# indexed by engine direction (up, right, down, left)
+direction_actions = [ACTION_UP, ACTION_RIGHT, ACTION_DOWN, ACTION_LEFT]
+
+# values in the owner buffer during a Voronoi fill
+MINE_NEW = 1      # reached by us on the layer being filled
+MINE = 2
+THEIRS = 3
+CONTESTED = 4
+
+class OutOfTime(Exception):
+  pass
+
+class Bot(object):
+
+  ###################################
+  # budget is the most time (in seconds) one decision is allowed to take.
+  # max_depth caps how far ahead we look even if there's time left.
+  ###################################
+  def __init__(self, engine, player, budget=0.03, max_depth=6):
+    self.engine = engine
+    self.player = player
+    self.budget = budget
+    self.max_depth = max_depth
+
+    size = engine.grid.size
+    self.scratch = bytearray(size)
+    self.owner = bytearray(size)
+    self.blank = bytearray(size)
+    self.offsets = engine.grid.step
+
+    # the worst a position can score is losing the whole board
+    self.dead = -2 * size
+
+    self.last_tick = -1
+    self.depth_reached = 0
+
+  ###################################
+  # read_all()
+  #   Same shape as dual_gamepad.gamepad0_read_all(), so a bot can sit in
+  #   any player's seat.  Decides once per engine tick, and only "presses"
+  #   something when it wants to turn.
+  ###################################
+  def read_all(self):
+    engine = self.engine
+    player = self.player
+    if engine.game_over or (not engine.alive[player]) or (engine.tick == self.last_tick):
+      return []
+    self.last_tick = engine.tick
+
+    direction = self.choose()
+    if direction == engine.dirs[player]:
+      return []
+    return [(time.time(), direction_actions[direction])]
+
+  ###################################
+  # choose()
+  #   the direction we want to go next tick.
+  ###################################
+  def choose(self):
+    return self.choose_from(self.engine.grid.cells, self.engine.pos, self.engine.dirs, self.engine.alive)
+
+  ###################################
+  # choose_from()
+  #   Same as choose(), but from a snapshot of the grid cells and the
+  #   player arrays instead of the live engine.  deadline (on the
+  #   monotonic clock) defaults to budget seconds from now.
+  ###################################
+  def choose_from(self, cells, pos, dirs, alive, deadline=None):
+    if deadline is None:
+      deadline = monotonic() + self.budget
+    player = self.player
+    scratch = self.scratch
+    offsets = self.offsets
+
+    scratch[:] = cells
+    head = pos[player]
+    current = dirs[player]
+    opponents = [pos[other] for other in range(len(pos)) if (other != player) and alive[other]]
+
+    moves = [d for d in range(4) if (d != current ^ 2) and not scratch[head + offsets[d]]]
+
+    # A cell next to an opponent's head might get taken by them this very
+    # tick, which is a crash (or at best a tie).  Stay out of those unless
+    # there's no other choice.
+    safe_moves = []
+    for d in moves:
+      target = head + offsets[d]
+      if not [other for other in opponents if (target - other) in offsets]:
+        safe_moves.append(d)
+    if safe_moves:
+      moves = safe_moves
+
+    if not moves:
+      # nothing left but to crash
+      self.depth_reached = 0
+      return current
+    if len(moves) == 1:
+      self.depth_reached = 0
+      return moves[0]
+
+    # what we go with if there's no time for even one move of lookahead
+    if current in moves:
+      best = current
+    else:
+      best = moves[0]
+    self.depth_reached = 0
+    for depth in range(1, self.max_depth + 1):
+      scores = []
+      try:
+        for d in moves:
+          if monotonic() > deadline:
+            raise OutOfTime()
+          scores.append(self.search(head + offsets[d], d, depth - 1, opponents, deadline))
+      except OutOfTime:
+        break
+      best = moves[scores.index(max(scores))]
+      self.depth_reached = depth
+
+    return best
+
+  ###################################
+  # search()
+  #   best score reachable after moving onto head, looking depth more of
+  #   our own moves ahead.
+  ###################################
+  def search(self, head, direction, depth, opponents, deadline):
+    scratch = self.scratch
+    scratch[head] = 1
+    try:
+      if depth == 0:
+        return self.voronoi(head, opponents, deadline)
+
+      offsets = self.offsets
+      best = None
+      for d in range(4):
+        if d == direction ^ 2:
+          continue
+        next_head = head + offsets[d]
+        if scratch[next_head]:
+          continue
+        if monotonic() > deadline:
+          raise OutOfTime()
+        score = self.search(next_head, d, depth - 1, opponents, deadline)
+        if (best is None) or (score > best):
+          best = score
+
+      if best is None:
+        # boxed in...the sooner it happens the worse it is.
+        return self.dead - depth
+      return best
+    finally:
+      scratch[head] = 0
+
+  ###################################
+  # voronoi()
+  #   Fills out from our head and every opponent head a layer at a time.
+  #   Returns our cell count minus theirs.  Raises OutOfTime if deadline
+  #   passes part way through.
+  ###################################
+  def voronoi(self, my_head, opponents, deadline):
+    scratch = self.scratch
+    owner = self.owner
+    offsets = self.offsets
+    owner[:] = self.blank
+
+    mine = [my_head]
+    theirs = list(opponents)
+    owner[my_head] = MINE
+    for head in theirs:
+      owner[head] = THEIRS
+
+    my_count = 0
+    their_count = 0
+    while mine or theirs:
+      if monotonic() > deadline:
+        raise OutOfTime()
+      next_mine = []
+      for cell in mine:
+        for offset in offsets:
+          neighbor = cell + offset
+          if scratch[neighbor] or owner[neighbor]:
+            continue
+          owner[neighbor] = MINE_NEW
+          next_mine.append(neighbor)
+
+      next_theirs = []
+      for cell in theirs:
+        for offset in offsets:
+          neighbor = cell + offset
+          if scratch[neighbor]:
+            continue
+          cell_owner = owner[neighbor]
+          if cell_owner == 0:
+            owner[neighbor] = THEIRS
+            next_theirs.append(neighbor)
+          elif cell_owner == MINE_NEW:
+            # same distance from both...nobody's
+            owner[neighbor] = CONTESTED
+
+      mine = []
+      for cell in next_mine:
+        if owner[cell] == MINE_NEW:
+          owner[cell] = MINE
+          mine.append(cell)
+
+      my_count += len(mine)
+      their_count += len(next_theirs)
+      theirs = next_theirs
+
+    return my_count - their_count
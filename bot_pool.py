@@ -0,0 +1,174 @@
+#################################################
+# bot_pool.py - bot decisions in worker processes
+#
+# The game loop is single threaded and also has to keep up with the
+# gamepads and the matrix, so bot searches run in a multiprocessing pool
+# instead.  After every engine tick each bot sends the workers a snapshot
+# of the board (the grid cells as one bytes string plus the player
+# arrays) and gets its answer back asynchronously.
+#
+# Nothing ever waits on a worker.  If a bot's answer isn't back by the
+# time the next tick is due, it simply doesn't turn that tick...the
+# engine keeps it going in its last direction...and the late answer is
+# thrown away.  A decision that raises in the worker is treated the same
+# way.
+#
+# Each bot keeps a decision latency histogram (snapshot sent -> answer
+# back) and a count of missed ticks, printed after every round.
+#################################################
+
+import multiprocessing
+import signal
+import time
+
+from bot import Bot, direction_actions
+from engine import CyclesEngine
+from latency_trace import Histogram
+from tick_scheduler import monotonic
+
+###################################
+# Worker side
+#   Each worker process builds its own engine (just for the grid shape)
+#   and one Bot per seat the first time that seat asks for a move, so the
+#   scratch buffers get reused from one decision to the next.
+###################################
+worker_engine = None
+worker_bots = {}
+
+def worker_init(width, height, starts):
+  global worker_engine
+
+  # Ctrl-C is for the game loop to handle, not every worker at once.
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  worker_engine = CyclesEngine(width, height, starts)
+
+###################################
+# worker_decide()
+#   deadline is on the monotonic clock, which is system wide, so it means
+#   the same thing here as in the game loop.  A snapshot that sat in the
+#   queue gets less time rather than holding up the next one.
+#   Returns (tick, direction) so the answer can be matched to its request.
+###################################
+def worker_decide(player, tick, deadline, cells, pos, dirs, alive):
+  bot = worker_bots.get(player)
+  if bot is None:
+    bot = Bot(worker_engine, player)
+    worker_bots[player] = bot
+  return tick, bot.choose_from(cells, pos, dirs, alive, deadline)
+
+###################################
+# PooledBot
+#   One seat's worth of bot.  read_all() has the same shape as
+#   dual_gamepad.gamepad0_read_all(), same as Bot.read_all().
+###################################
+class PooledBot(object):
+
+  def __init__(self, pool, engine, player, budget):
+    self.pool = pool
+    self.engine = engine
+    self.player = player
+    self.budget = budget
+
+    self.pending = None
+    self.pending_tick = -1
+    self.sent_time = 0.0
+    self.arrived_time = None
+    self.asked_tick = -1
+
+    self.latency = Histogram()
+    self.missed = 0
+
+  ###################################
+  # read_all()
+  #   Picks up the answer for this tick if it's back, and sends off a new
+  #   snapshot once per tick.  Never blocks.
+  ###################################
+  def read_all(self):
+    engine = self.engine
+    player = self.player
+    if engine.game_over or not engine.alive[player]:
+      self.pending = None
+      return []
+
+    actions = []
+    pending = self.pending
+    if pending is not None:
+      if self.pending_tick != engine.tick:
+        # The tick went by without our answer.  Only count it if it was
+        # the very next tick...anything else is left over from a round
+        # that has since ended.
+        if engine.tick == self.pending_tick + 1:
+          self.missed += 1
+        self.pending = None
+      elif pending.ready():
+        self.pending = None
+        try:
+          tick, direction = pending.get()
+        except Exception:
+          # The worker blew up on this snapshot.  Count it the same as a
+          # late answer...the bot goes straight on and asks again next tick.
+          self.missed += 1
+        else:
+          if self.arrived_time is not None:
+            self.latency.add(self.arrived_time - self.sent_time)
+          if direction != engine.dirs[player]:
+            actions.append((time.time(), direction_actions[direction]))
+
+    if (self.pending is None) and (self.asked_tick != engine.tick):
+      self.asked_tick = engine.tick
+      self.pending_tick = engine.tick
+      self.sent_time = monotonic()
+      self.arrived_time = None
+      self.pending = self.pool.apply_async(
+        worker_decide,
+        (player, engine.tick, self.sent_time + self.budget,
+         bytes(engine.grid.cells), engine.pos.tolist(), list(engine.dirs), list(engine.alive)),
+        callback=self.arrived)
+
+    return actions
+
+  ###################################
+  # arrived()
+  #   Runs on the pool's result thread as soon as an answer comes back,
+  #   so the latency doesn't include however long the game loop took to
+  #   come round and look.
+  ###################################
+  def arrived(self, result):
+    if result[0] == self.pending_tick:
+      self.arrived_time = monotonic()
+
+  def stats(self):
+    return "missed=%d latency %s" % (self.missed, self.latency.summary())
+
+  def reset_stats(self):
+    self.latency.reset()
+    self.missed = 0
+
+###################################
+# BotPool
+#   processes defaults to one per core, less the one the game loop is
+#   using, and never more than there are bots.
+###################################
+class BotPool(object):
+
+  def __init__(self, engine, players, budget=0.03, processes=None):
+    if processes is None:
+      processes = max(1, multiprocessing.cpu_count() - 1)
+    processes = max(1, min(processes, len(players)))
+    self.pool = multiprocessing.Pool(processes, worker_init,
+                                     (engine.width, engine.height, engine.starts))
+    self.processes = processes
+    self.bots = [PooledBot(self.pool, engine, player, budget) for player in players]
+
+  ###################################
+  # end_round()
+  #   prints each bot's latency stats and starts them fresh.
+  ###################################
+  def end_round(self):
+    for bot in self.bots:
+      print("Bot %d stats: %s" % (bot.player + 1, bot.stats()))
+      bot.reset_stats()
+
+  def close(self):
+    self.pool.terminate()
+    self.pool.join()
@@ -0,0 +1,72 @@
+#################################################
+# collision_grid.py - flat occupancy grid for the playfield
+#
+# One byte per cell in a single bytearray.  Zero means there's nothing in
+# that slot, one means you can't move there.
+#
+# The playfield is surrounded by an extra ring of occupied padding cells,
+# so looking at the neighbor of any playfield cell never walks off the
+# array or wraps around onto the next row.  Walls (the outermost playfield
+# cells) and the padding are baked into a template once; resetting for a
+# new round is a single slice copy of that template.
+#################################################
+
+class CollisionGrid(object):
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.stride = width + 2
+    self.size = self.stride * (height + 2)
+
+    # Top and bottom: padding row plus wall row.  Sides: padding column
+    # plus wall column, done as strided slices so there's no per-cell loop.
+    stride = self.stride
+    template = bytearray(self.size)
+    template[0:2 * stride] = b"\x01" * (2 * stride)
+    template[self.size - 2 * stride:] = b"\x01" * (2 * stride)
+    rows = height + 2
+    template[0::stride] = b"\x01" * rows
+    template[1::stride] = b"\x01" * rows
+    template[stride - 2::stride] = b"\x01" * rows
+    template[stride - 1::stride] = b"\x01" * rows
+    self.template = template
+
+    self.cells = bytearray(template)
+
+    # how far a cell index moves for one step in each direction, in
+    # engine direction order:  up, right, down, left.
+    self.step = [-stride, 1, stride, -1]
+
+  ###################################
+  # reset()
+  #   empties the playfield, leaving just the walls.
+  ###################################
+  def reset(self):
+    self.cells[:] = self.template
+
+  ###################################
+  # index() / coords()
+  #   convert between playfield x,y and a cell index.
+  ###################################
+  def index(self, x, y):
+    return (y + 1) * self.stride + x + 1
+
+  def coords(self, index):
+    y, x = divmod(index, self.stride)
+    return x - 1, y - 1
+
+  def is_set(self, index):
+    return self.cells[index]
+
+  ###################################
+  # test_and_set()
+  #   marks the cell as occupied, and returns whether it already was.
+  ###################################
+  def test_and_set(self, index):
+    hit = self.cells[index]
+    self.cells[index] = 1
+    return hit
+
+  def clear(self, index):
+    self.cells[index] = 0
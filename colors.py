@@ -0,0 +1,21 @@
+#################################################
+# colors.py - the game's colors
+#
+# Shared by the game and anything else that draws a round (replays),
+# without having to import cycles.py and its gamepads.
+#################################################
+
+black = (0,0,0)
+red = (255,0,0)
+green = (0,255,0)
+blue = (0,0,255)
+yellow = (255,255,0)
+magenta = (255,0,255)
+cyan = (0,255,255)
+orange = (255,128,0)
+white = (255,255,255)
+
+wall_color = red
+
+# p1 is green, p2 blue, then on from there if there are more riders.
+player_colors = [green, blue, yellow, magenta, cyan, orange, white, (128,0,255)]
@@ -7,17 +7,31 @@
 ################################################# 
 
 import time
-from datetime import datetime
+import argparse
 
 import random
 
-from dual_gamepad import gamepad0_read_nonblocking, gamepad1_read_nonblocking
+from dual_gamepad import gamepads_wait
+from dual_gamepad import gamepad0_read_all, gamepad1_read_all, close_gamepads
+from dual_gamepad import ACTION_UP, ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT
+from turn_buffer import TurnBuffer
+from tick_scheduler import TickScheduler, monotonic
+from latency_trace import LatencyTracer
+from timeline import Timeline, run_timeline
+from replay import ReplayWriter, ReplayReader, ReplayPlayer
+from bot import Bot
+from bot_pool import BotPool
+from rollback import steer
+from engine import CyclesEngine, default_starts, random_starts, EVENT_MOVE, EVENT_CRASH, EVENT_ERASE
+from engine import DIR_UP, DIR_DOWN, DIR_LEFT, DIR_RIGHT
 
 ###################################
 # Graphics imports, constants and structures
 ###################################
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image, ImageDraw
+from display_backends import open_display, close_display, default_display, display_names
+from renderer import FrameRenderer
+from asset_cache import AssetCache
+from spectator_stream import SpectatorStream
 
 # this is the size of ONE of our matrixes. 
 matrix_rows = 64 
@@ -30,300 +44,563 @@ matrix_vertical = 1
 total_rows = matrix_rows * matrix_vertical
 total_columns = matrix_columns * matrix_horizontal
 
-options = RGBMatrixOptions()
-options.rows = matrix_rows 
-options.cols = matrix_columns 
-options.chain_length = matrix_horizontal
-options.parallel = matrix_vertical 
+# These get set up by main(), so just importing this file doesn't go
+# grab the matrix.
+matrix = None
+renderer = None
+assets = None
 
-#options.hardware_mapping = 'adafruit-hat-pwm' 
-#options.hardware_mapping = 'adafruit-hat'  # If you have an Adafruit HAT: 'adafruit-hat'
-options.hardware_mapping = 'regular'  
+# off unless main() is asked to turn it on
+tracer = LatencyTracer()
 
-options.gpio_slowdown = 2
+# every round gets appended here (see replay.py), unless it's None
+replay_writer = None
 
-matrix = RGBMatrix(options = options)
+# crash animation, countdown and text screens (see timeline.py)
+timeline = Timeline()
+
+# fading trails (see trails.py), or None for flat colors.  If a frame
+# takes more than trail_budget of a tick, trails get turned back off.
+trails = None
+trail_budget = .25
+
+# viewers watching over the network (see spectator_stream.py), or None.
+# While anything's waiting they get looked after every spectator_poll
+# seconds, so they don't stall through a countdown or end of round screen.
+spectators = None
+spectator_poll = .05
 
 ###################################################
 #Creates global data
 # Update this comment!!!
 ###################################################
 
-black = (0,0,0)
-red = (255,0,0)
-green = (0,255,0)
-blue = (0,0,255)
+from colors import black, red, green, blue, yellow, magenta, cyan, orange, white
+from colors import wall_color, player_colors
 
-wall_color = red 
+num_players = 2
 
 # start positions:  p1 at the top middle going down, p2 at bottom middle going up.
-p1_start_x = total_columns / 2
-p1_start_y = 5
-p2_start_x = p1_start_x
-p2_start_y = total_rows - p1_start_y
+starts = default_starts(total_columns, total_rows, num_players)
+
+# cells each rider's trail keeps, or None for the whole round
+trail_length = None
+
+# The engine owns the collision grid and player positions.
+engine = CyclesEngine(total_columns, total_rows, starts)
 
-player1 = [p1_start_x,p1_start_y]
-p1_color = green 
+# player n is driven by gamepad n.  setup_players() fills in bots for
+# everybody else.
+gamepad_readers = [gamepad0_read_all, gamepad1_read_all]
+player_readers = list(gamepad_readers)
 
-player2 = [p2_start_x,p2_start_y]
-p2_color = blue 
+# seconds a bot gets to think each tick...a fraction of speed_delay
+bot_budget = .03
 
+# Bots think in worker processes (see bot_pool.py) unless bot_workers is
+# 0, in which case they think in the game loop.  None means one worker
+# per spare core.
+bot_workers = None
+bot_pool = None
 
-# The collision matrix is a 2d matrix of our full playfield size.
-# Zero means there's nothing in that slot.
-# One means you can't move there.
-collision = []
-#collision = [[0] * total_rows for i in range(total_columns)]
+# maps D-pad events onto directions
+dpad_dirs = {ACTION_UP: DIR_UP, ACTION_DOWN: DIR_DOWN, ACTION_LEFT: DIR_LEFT, ACTION_RIGHT: DIR_RIGHT}
 
+# seconds per engine tick.  The scheduler runs at exactly 1/speed_delay Hz.
 speed_delay = .1
 
-###################################
-# reset_collision()
-###################################
-def reset_collision():
+# Attract mode:  after attract_delay seconds on the start screen a demo
+# round plays, and after screensaver_delay seconds with nobody around the
+# panel dims down to the screen saver.
+attract_delay = 20.0
+screensaver_delay = 300.0
+
+# demo riders don't search (see rollback.steer()), they just turn now
+# and then and when they're about to hit something.  A Bot decision is
+# several milliseconds, which is a lot to spend on an empty cabinet.
+demo_turn_chance = .05
 
-  # The collision matrix is a 2d matrix of our full playfield size.
-  # Zero means there's nothing in that slot.
-  # One means you can't move there.
-  global collision
+# screen saver:  panel brightness (percent), and seconds between frames
+screensaver_brightness = 20
+screensaver_period = .5
 
-  del collision[:]
-  collision = [[0] * total_rows for i in range(total_columns)]
+# the replay file, indexed (see replay.ReplayReader), and the numbers of
+# the rounds in it that fit the panel, out of the first demo_rounds_checked
+demo_reader = None
+demo_rounds = []
+demo_rounds_checked = 0
+
+###################################
+# setup_players()
+#   players riders in all, the last bots of them computer players.
+#   Seats without a gamepad get a bot too.
+###################################
+def setup_players(players, bots):
+  global num_players
+  global starts
+  global engine
+  global player_readers
+  global bot_pool
+
+  num_players = players
+  starts = default_starts(total_columns, total_rows, num_players)
+  engine = CyclesEngine(total_columns, total_rows, starts, trail_length)
+
+  bot_seats = [player for player in range(num_players)
+               if (player >= len(gamepad_readers)) or (player >= num_players - bots)]
+
+  if bot_pool is not None:
+    bot_pool.close()
+    bot_pool = None
+  bot_readers = {}
+  if bot_seats and (bot_workers != 0):
+    bot_pool = BotPool(engine, bot_seats, bot_budget, bot_workers)
+    for bot in bot_pool.bots:
+      bot_readers[bot.player] = bot.read_all
+  else:
+    for player in bot_seats:
+      bot_readers[player] = Bot(engine, player, bot_budget).read_all
+
+  player_readers = []
+  for player in range(num_players):
+    if player in bot_readers:
+      player_readers.append(bot_readers[player])
+    else:
+      player_readers.append(gamepad_readers[player])
 
 ###################################
 # init_walls()
+#   The walls are already part of the collision template...this just
+#   draws them.
 ###################################
 def init_walls():
-  global collision
   global wall_color
 
-  #top and bottom boarders
-  for x in range(total_columns):
-    collision[x][0] = 1
-    collision[x][total_rows-1] = 1
-
-  #left and right boarders
-  for y in range(total_rows):
-    collision[0][y]= 1
-    collision[total_columns-1][y] = 1
-
   #now draw the box
-  temp_image = Image.new("RGB", (total_columns, total_rows))
-  temp_draw = ImageDraw.Draw(temp_image)
-  temp_draw.rectangle((0,0,total_columns-1,total_rows-1), outline=wall_color)
-  matrix.SetImage(temp_image, 0,0)
+  renderer.clear()
+  renderer.draw_box(wall_color)
 
 ###################################
 # init_players
 ###################################
 def init_players():
-  global collision
-  global p1_start_x
-  global p1_start_y
-  global p2_start_x
-  global p2_start_y
-  global p1_color
-  global p2_color
-  global player1
-  global player2
-
-  player1 = [p1_start_x,p1_start_y]
-  player2 = [p2_start_x,p2_start_y]
-
-  collision[p1_start_x][p1_start_y] = 1
-  collision[p2_start_x][p2_start_y] = 1
-
-  temp_image = Image.new("RGB", (1,1))
-  temp_draw = ImageDraw.Draw(temp_image)
-  temp_draw.rectangle((0,0,0,0), outline=p1_color, fill=p1_color)
-  matrix.SetImage(temp_image, p1_start_x, p1_start_y)
-  temp_draw.rectangle((0,0,0,0), outline=p2_color, fill=p2_color)
-  matrix.SetImage(temp_image, p2_start_x, p2_start_y)
+  for player in range(engine.players):
+    start_x, start_y = engine.coords(player)
+    renderer.set_pixel(start_x, start_y, player_colors[player])
 
 ####################################################
-# show_crash() 
+# crash_animation() 
+#   a timeline sequence (see timeline.py)
 ####################################################
-def show_crash(crash_x, crash_y):
+def crash_animation(crash_x, crash_y):
   
-  crash_color = (255,0,0)
-  crash_fill = (255,255,255)
-  for crashloop in range(3,13,2):
-    ellipse_offset = (crashloop-1)/2
-    temp_image = Image.new("RGB", (crashloop,crashloop))
-    temp_draw = ImageDraw.Draw(temp_image)
-    temp_draw.ellipse((0,0,crashloop-1,crashloop-1), outline=crash_color, fill=crash_fill)
-    matrix.SetImage(temp_image, crash_x-ellipse_offset,crash_y-ellipse_offset)
-    time.sleep(.15)
-
-  time.sleep(1)
+  for crash_image, ellipse_offset in assets.crash_frames():
+    renderer.draw_image(crash_image, crash_x-ellipse_offset,crash_y-ellipse_offset)
+    renderer.present()
+    yield .15
+
+  yield 1
 
 ###################################
-#  display_text()
+#  text_screen()
+#   a timeline sequence.  A delay of None holds it until a button press.
 ###################################
-def display_text(my_text, text_color, delay):
-    temp_image = Image.new("RGB", (total_columns, total_rows))
-    temp_draw = ImageDraw.Draw(temp_image)
-    temp_draw.text((0,0),my_text, fill=text_color)
-    matrix.SetImage(temp_image,0,0)
-    time.sleep(delay)
+def text_screen(my_text, text_color, delay):
+    renderer.draw_image(assets.text(my_text, text_color))
+    renderer.present()
+    yield delay
+
+###################################
+# find_demo_rounds()
+#   the numbers of the recorded rounds we could play back as demos.
+#   Only the rounds added to the replay file since last time get looked
+#   at, and none of them get decoded until one is picked to play.
+###################################
+def find_demo_rounds():
+  global demo_reader
+  global demo_rounds
+  global demo_rounds_checked
+
+  if replay_writer is None:
+    return []
+  try:
+    if demo_reader is None:
+      demo_reader = ReplayReader(replay_writer.path)
+    else:
+      demo_reader.update()
+  except (OSError, IOError, ValueError):
+    return []
+
+  if len(demo_reader) < demo_rounds_checked:
+    # the file got cut back, so it's all been indexed over again
+    demo_rounds = []
+    demo_rounds_checked = 0
+  for number in range(demo_rounds_checked, len(demo_reader)):
+    offset, width, height, players = demo_reader.entries[number]
+    if (width == total_columns) and (height == total_rows) and (players <= len(player_colors)):
+      demo_rounds.append(number)
+  demo_rounds_checked = len(demo_reader)
+  return demo_rounds
+
+###################################
+# demo_round()
+#   a timeline sequence:  a round for attract mode.  Plays back something
+#   from the replay file if there's anything, otherwise demo riders play
+#   one.
+#   Either way there's one engine step (and a few pixels) per tick, and
+#   the rest of the tick is spent asleep waiting on the gamepads.
+###################################
+def demo_round():
+  rounds = find_demo_rounds()
+  if rounds:
+    replay_round = demo_reader.read_round(random.choice(rounds))
+    replay_player = ReplayPlayer(replay_round)
+    demo_engine = replay_player.engine
+    step = replay_player.step
+    period = replay_round.tick_seconds
+  else:
+    rng = random.Random()
+    demo_engine = CyclesEngine(total_columns, total_rows, random_starts(total_columns, total_rows, 2, rng))
+    step = lambda: demo_engine.step([steer(demo_engine, player, rng, demo_turn_chance)
+                                     for player in range(demo_engine.players)])
+    period = speed_delay
+
+  renderer.clear()
+  renderer.draw_box(wall_color)
+  for player in range(demo_engine.players):
+    start_x, start_y = demo_engine.coords(player)
+    renderer.set_pixel(start_x, start_y, player_colors[player])
+  renderer.present()
+  yield period
+
+  while not demo_engine.game_over:
+    for event in step():
+      if event[0] in (EVENT_MOVE, EVENT_CRASH):
+        renderer.set_pixel(event[2], event[3], player_colors[event[1]])
+      elif event[0] == EVENT_ERASE:
+        renderer.set_pixel(event[2], event[3], black)
+    renderer.present()
+    yield period
+
+  yield 2
+
+###################################
+# screensaver()
+#   a timeline sequence that never ends on its own:  the panel turned
+#   down, a dim box, and one dim dot going round inside it a step every
+#   screensaver_period.  Brightness goes back up when it's stopped.
+###################################
+def screensaver():
+  dim_wall = tuple(value // 8 for value in wall_color)
+  dim_rider = tuple(value // 8 for value in player_colors[0])
+
+  # the ring just inside the walls
+  ring = [(x, 1) for x in range(1, total_columns - 1)]
+  ring += [(total_columns - 2, y) for y in range(2, total_rows - 1)]
+  ring += [(x, total_rows - 2) for x in range(total_columns - 3, 0, -1)]
+  ring += [(1, y) for y in range(total_rows - 3, 1, -1)]
+
+  old_brightness = matrix.brightness
+  matrix.brightness = screensaver_brightness
+  try:
+    renderer.clear()
+    renderer.draw_box(dim_wall)
+    spot = 0
+    while True:
+      renderer.set_pixel(ring[spot - 1][0], ring[spot - 1][1], black)
+      renderer.set_pixel(ring[spot][0], ring[spot][1], dim_rider)
+      renderer.present()
+      spot = (spot + 1) % len(ring)
+      yield screensaver_period
+  finally:
+    matrix.brightness = old_brightness
+
+###################################
+# wait()
+#   gamepads_wait(), but keeping the spectators going while we do.
+###################################
+def wait(timeout):
+  if spectators is None:
+    return gamepads_wait(timeout)
+  spectators.service()
+  if (timeout is None) or (timeout > spectator_poll):
+    timeout = spectator_poll
+  return gamepads_wait(timeout)
+
+###################################
+# show()
+#   plays whatever's been put on the timeline, plus any background work
+#   queued up for it.  A press on either gamepad skips ahead (unless it
+#   isn't skippable), or stops the lot if interruptible.  True if anybody
+#   pressed anything.
+###################################
+def show(skippable=True, interruptible=False):
+  return run_timeline(timeline, gamepad_readers, wait, skippable, interruptible)
+
+###################################
+# attract()
+#   the start screen, then demo rounds until somebody presses a button,
+#   then the screen saver once nobody has for screensaver_delay.
+#   Everything sleeps in select() on the gamepads between frames, and a
+#   press wakes it straight away.  Returns once somebody wants to play.
+###################################
+def attract():
+  idle_start = monotonic()
+  while True:
+    timeline.add(text_screen("Press Any\nButton to\nStart", green, attract_delay))
+    if show(interruptible=True):
+      return
+
+    if monotonic() - idle_start < screensaver_delay:
+      timeline.add(demo_round())
+      if show(interruptible=True):
+        return
+    else:
+      # a press just wakes it up, back to the start screen
+      timeline.add(screensaver())
+      show(interruptible=True)
+      idle_start = monotonic()
 
 ###################################
 # play_game 
 ###################################
 def play_game():
-  display_text("Get Ready",red, 3)
-  display_text("3",red,1)
-  display_text("2",red,1)
-  display_text("1",red,1)
-  display_text("GO!!!",red,1)
-
-  reset_collision()
+  timeline.add(text_screen("Get Ready",red, 3))
+  timeline.add(text_screen("3",red,1))
+  timeline.add(text_screen("2",red,1))
+  timeline.add(text_screen("1",red,1))
+  timeline.add(text_screen("GO!!!",red,1))
+  # nobody gets to start the race early by mashing buttons
+  show(skippable=False)
+
+  engine.reset()
+  if replay_writer is not None:
+    replay_writer.start_round(engine, speed_delay)
   init_walls()
   init_players()
+  if trails is not None:
+    trails.start_round(engine)
+    renderer.draw_frame(trails.compose(engine.tick), trails.changed)
+  renderer.present()
  
-  p1_dir = "down"
-  p2_dir = "up"
-
-  p1_image = Image.new("RGB", (1,1))
-  p1_draw = ImageDraw.Draw(p1_image)
-  p1_draw.rectangle((0,0,0,0), outline=p1_color, fill=p1_color)
-
-  p2_image = Image.new("RGB", (1,1))
-  p2_draw = ImageDraw.Draw(p2_image)
-  p2_draw.rectangle((0,0,0,0), outline=p2_color, fill=p2_color)
-
-  p1_crash = False
-  p2_crash = False
+  turn_buffers = [TurnBuffer(engine.dirs[player]) for player in range(engine.players)]
 
-  last_update_time = datetime.now()
+  scheduler = TickScheduler(1.0 / speed_delay)
+  tracing = tracer.enabled
 
   while True:
 
-    dir_pressed = False
-    current_time = datetime.now()
-    deltaT = current_time - last_update_time
-
-    # check for player 1 dir changes, but don't let them back into themselves
-    p1_input = gamepad0_read_nonblocking()
-    if (p1_input == "D-up") & (p1_dir != "down"):
-      p1_dir = "up" 
-      dir_pressed = True
-    if (p1_input == "D-down") & (p1_dir != "up"):
-      p1_dir = "down" 
-      dir_pressed = True
-    if (p1_input == "D-left") & (p1_dir != "right"):
-      p1_dir = "left" 
-      dir_pressed = True
-    if (p1_input == "D-right") & (p1_dir != "left"):
-      p1_dir = "right" 
-      dir_pressed = True
-   
-    # check for player 2 dir changes, but don't let them back into themselves
-    p2_input = gamepad1_read_nonblocking()
-    if (p2_input == "D-up") & (p2_dir != "down"):
-      p2_dir = "up" 
-      dir_pressed = True
-    if (p2_input == "D-down") & (p2_dir != "up"):
-      p2_dir = "down" 
-      dir_pressed = True
-    if (p2_input == "D-left") & (p2_dir != "right"):
-      p2_dir = "left" 
-      dir_pressed = True
-    if (p2_input == "D-right") & (p2_dir != "left"):
-      p2_dir = "right" 
-      dir_pressed = True
-
-    # Should probably use positive logic here to update the current direciton,
-    # but instead, I'm using the continue construct.
-    if ((deltaT.total_seconds() < speed_delay) & (dir_pressed == False)):
+    if tracing:
+      decode_start = monotonic()
+    player_actions = [read_all() for read_all in player_readers]
+    if tracing:
+      tracer.record("decode", monotonic() - decode_start)
+      read_time = time.time()
+      for actions in player_actions:
+        for timestamp, action in actions:
+          tracer.record("input_wait", read_time - timestamp)
+
+    # Queue up every D-pad press (or bot decision) since the last pass.
+    # Turns come off the queues one per tick, so quick double-turns don't
+    # get lost.
+    for player in range(len(player_actions)):
+      for timestamp, action in player_actions[player]:
+        if action in dpad_dirs:
+          turn_buffers[player].push(dpad_dirs[action], timestamp)
+
+    if not scheduler.tick_due():
+      # Rather than spinning on the nonblocking reads, sleep until one of the
+      # gamepads has something for us or the next tick is due.  Coming
+      # round to the reads straight after each tick gives the bots the
+      # whole tick to think in.
+      time_left = scheduler.time_until_tick()
+      if time_left > 0:
+        if tracing:
+          sleep_start = monotonic()
+        wait(time_left)
+        if tracing:
+          tracer.record("sleep", monotonic() - sleep_start)
       continue
 
-    last_update_time = current_time
-
     # The engine!
-    # If both p1 and p2 are going to hit something, it's a draw.
-    # If only p1 or p2 hits something, it's a win for the other one.
-    # if neither are going to hit anything, update the collision matrix 
-    # and add the new "dot"
-
-    #figure out next spot for p1
-    p1_new_x = player1[0]
-    p1_new_y = player1[1]
-    if (p1_dir == "up"):
-      p1_new_y = p1_new_y - 1
-    if (p1_dir == "down"):
-      p1_new_y = p1_new_y + 1
-    if (p1_dir == "left"):
-      p1_new_x = p1_new_x - 1
-    if (p1_dir == "right"):
-      p1_new_x = p1_new_x + 1
-
-    # will the new spot for p1 cause a crash?
-    if (collision[p1_new_x][p1_new_y] == 1):
-      print "Player 1 crashes!!!"
-      p1_crash = True
-    else:
-      collision[p1_new_x][p1_new_y] = 1
-      player1[0] = p1_new_x
-      player1[1] = p1_new_y
-      matrix.SetImage(p1_image, p1_new_x, p1_new_y)
-
-    #figure out next spot for p2
-    p2_new_x = player2[0]
-    p2_new_y = player2[1]
-    if (p2_dir == "up"):
-      p2_new_y = p2_new_y - 1
-    if (p2_dir == "down"):
-      p2_new_y = p2_new_y + 1
-    if (p2_dir == "left"):
-      p2_new_x = p2_new_x - 1
-    if (p2_dir == "right"):
-      p2_new_x = p2_new_x + 1
-
-    # will the new spot for p2 cause a crash?
-    if (collision[p2_new_x][p2_new_y] == 1):
-      print "Player 2 crashes!!!"
-      p2_crash = True
-    else:
-      collision[p2_new_x][p2_new_y] = 1
-      player2[0] = p2_new_x
-      player2[1] = p2_new_y
-      matrix.SetImage(p2_image, p2_new_x, p2_new_y)
-
-    if (p1_crash & p2_crash):
-      print "Tie game!!!"
-      show_crash(p1_new_x,p1_new_y)
-      display_text("TIE!", red, 3)
-      break;
-
-    if (p1_crash):
-      print "Player 2 wins!"
-      show_crash(p1_new_x,p1_new_y)
-      display_text("Player 2\nWins!",blue,3)
-      break;
-
-    if (p2_crash):
-      print "Player 1 wins!"
-      show_crash(p2_new_x,p2_new_y)
-      display_text("Player 1\nWins!",green,3)
-      break;
-
-    time.sleep(speed_delay)
+    if tracing:
+      simulate_start = monotonic()
+    inputs = [turns.pop() for turns in turn_buffers]
+    events = engine.step(inputs)
+    if replay_writer is not None:
+      replay_writer.turns(engine.tick, inputs)
+    if tracing:
+      render_start = monotonic()
+      tracer.record("simulate", render_start - simulate_start)
+
+    for event in events:
+      if event[0] == EVENT_MOVE:
+        if trails is not None:
+          trails.mark(engine.pos[event[1]], event[1], engine.tick)
+        else:
+          renderer.set_pixel(event[2], event[3], player_colors[event[1]])
+      elif event[0] == EVENT_ERASE:
+        if trails is not None:
+          trails.erase(engine.grid.index(event[2], event[3]))
+        else:
+          renderer.set_pixel(event[2], event[3], black)
+      elif event[0] == EVENT_CRASH:
+        print "Player %d crashes!!!" % (event[1] + 1)
+        crash_x = event[2]
+        crash_y = event[3]
+    if trails is not None:
+      renderer.draw_frame(trails.compose(engine.tick), trails.changed)
+
+    # one push to the panel for everything that moved this tick
+    renderer.present()
+
+    if tracing:
+      tracer.record("render", monotonic() - render_start)
+      swap_time = time.time()
+      for turns in turn_buffers:
+        if turns.turn_timestamp is not None:
+          tracer.record("input_to_pixel", swap_time - turns.turn_timestamp)
+
+    if engine.game_over:
+      break
+
+  print "Tick stats: " + scheduler.stats()
+  if trails is not None:
+    print "Trail frames: " + trails.costs.summary()
+    trails.costs.reset()
+
+  timeline.add(crash_animation(crash_x,crash_y))
+  if engine.winner is None:
+    print "Tie game!!!"
+    timeline.add(text_screen("TIE!", red, 3))
+  else:
+    print "Player %d wins!" % (engine.winner + 1)
+    timeline.add(text_screen("Player %d\nWins!" % (engine.winner + 1), player_colors[engine.winner], 3))
+
+  # the round's bookkeeping gets done while the crash is on screen
+  if replay_writer is not None:
+    timeline.background(replay_writer.end_round, engine)
+  timeline.background(tracer.end_round, "round latency")
+  if bot_pool is not None:
+    timeline.background(bot_pool.end_round)
+  show()
 
 ###################################
 # Main loop 
 ###################################
-while True:
-
-  # Wait to start until one of the two players hits a key
-  wait = True
-  display_text("Press Any\nButton to\nStart", green, 3)
-  while wait:
-    input=gamepad0_read_nonblocking()
-    if input != "No Input":
-      wait = False
-    input=gamepad1_read_nonblocking()
-    if input != "No Input":
-      wait = False 
-
-  play_game()
+def main():
+  global matrix
+  global renderer
+  global assets
+  global tracer
+  global bot_workers
+  global replay_writer
+  global attract_delay
+  global screensaver_delay
+  global trails
+  global trail_length
+  global spectators
+
+  parser = argparse.ArgumentParser(description="Tron style light cycle game.")
+  parser.add_argument("--display", choices=display_names, default=default_display(),
+                      help="where to draw (default: $CYCLES_DISPLAY or matrix)")
+  parser.add_argument("--record-path", default="cycles.gif",
+                      help="GIF file, or directory for PNG frames, for --display record")
+  parser.add_argument("--trace", action="store_true",
+                      help="print input-to-pixel latency histograms after each round")
+  parser.add_argument("--trace-file", help="also append the histograms to this file")
+  parser.add_argument("--spectate-port", type=int,
+                      help="stream the game to viewers on this port (see spectator_stream.py)")
+  parser.add_argument("--replay-file", default="cycles.replay",
+                      help="append every round here (empty string to turn off)")
+  parser.add_argument("--players", type=int, default=num_players,
+                      help="riders in all (up to %d)" % len(player_colors))
+  parser.add_argument("--bots", type=int, default=0,
+                      help="how many of them (from the last) are computer players")
+  parser.add_argument("--bot-workers", type=int, default=bot_workers,
+                      help="processes for bot decisions (default one per spare core, 0 = in the game loop)")
+  parser.add_argument("--trail-length", type=int,
+                      help="cells each rider's trail keeps (default: the whole round)")
+  parser.add_argument("--trails", action="store_true",
+                      help="glowing heads and fading trails (needs numpy)")
+  parser.add_argument("--gamma", type=float, default=2.2,
+                      help="gamma correction for --trails")
+  parser.add_argument("--attract-delay", type=float, default=attract_delay,
+                      help="seconds on the start screen before a demo round plays")
+  parser.add_argument("--screensaver-delay", type=float, default=screensaver_delay,
+                      help="seconds with nobody playing before the panel dims")
+  args = parser.parse_args()
+
+  if not (1 <= args.players <= len(player_colors)):
+    parser.error("--players must be between 1 and %d" % len(player_colors))
+  if (args.trail_length is not None) and (args.trail_length < 2):
+    parser.error("--trail-length must be at least 2")
+  trail_length = args.trail_length
+  # before the display comes up, so the workers aren't forked from a
+  # process that's already driving the matrix.
+  bot_workers = args.bot_workers
+  attract_delay = args.attract_delay
+  screensaver_delay = args.screensaver_delay
+  setup_players(args.players, args.bots)
+
+  tracer = LatencyTracer(args.trace or (args.trace_file is not None), args.trace_file)
+  if args.replay_file:
+    try:
+      replay_writer = ReplayWriter(args.replay_file)
+    except ValueError as error:
+      print "Not recording replays: %s" % error
+    else:
+      if replay_writer.dropped:
+        print "Cut %d bytes of an unfinished round off %s" % (replay_writer.dropped, args.replay_file)
+
+  matrix = open_display(args.display, matrix_rows, matrix_columns,
+                        matrix_horizontal, matrix_vertical, args.record_path)
+  renderer = FrameRenderer(matrix, total_columns, total_rows)
+  assets = AssetCache(total_columns, total_rows)
+
+  if args.trails:
+    from trails import TrailPipeline
+    trails = TrailPipeline(engine.grid, wall_color, player_colors[:engine.players], gamma=args.gamma)
+    cost = trails.measure(renderer)
+    budget = trail_budget * speed_delay
+    if cost > budget:
+      print "Trails take %.1fms a frame, more than %.1fms...drawing flat instead" % (cost * 1000.0, budget * 1000.0)
+      trails = None
+    renderer.clear()
+
+  if args.spectate_port is not None:
+    spectators = SpectatorStream(args.spectate_port, total_columns, total_rows)
+    renderer.add_tap(spectators.tap)
+
+  try:
+    run()
+  finally:
+    if spectators is not None:
+      spectators.close()
+    if bot_pool is not None:
+      bot_pool.close()
+    close_gamepads()
+    close_display(matrix)
+
+###################################
+# run()
+#   start screen, game, repeat.
+###################################
+def run():
+  # Render every text screen up front so rounds don't wait on PIL.
+  screens = [("Press Any\nButton to\nStart", green),
+             ("Get Ready", red), ("3", red), ("2", red), ("1", red), ("GO!!!", red),
+             ("TIE!", red)]
+  for player in range(engine.players):
+    screens.append(("Player %d\nWins!" % (player + 1), player_colors[player]))
+  assets.preload(screens)
+
+  while True:
+
+    # Wait to start until one of the two players hits a key
+    attract()
+
+    play_game()
+
+if __name__ == "__main__":
+  main()
@@ -9,28 +9,24 @@
 ###############################
 #  Imports for reading keyboard
 ##############################
-import sys, os
-import termios, fcntl
+from keyboard_input import KeyboardInput
+from gamepad_profiles import ACTION_UP, ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT
 
-# used to slow down our main loop
 import time
 
 import random
 
-##################################
-# Non-blocking character read function.
-#################################
-def getch_noblock():
-  try:
-    return sys.stdin.read()
-  except (IOError, TypeError) as e:
-    return None
+from collision_grid import CollisionGrid
+from engine import DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT
+from turn_buffer import TurnBuffer
+from tick_scheduler import TickScheduler
 
 ###################################
 # Graphics imports, constants and structures
 ###################################
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image, ImageDraw
+from display_backends import open_display, close_display, default_display
+from renderer import FrameRenderer
+from asset_cache import AssetCache
 
 # this is the size of ONE of our matrixes. 
 matrix_rows = 32 
@@ -43,19 +39,11 @@ matrix_vertical = 3
 total_rows = matrix_rows * matrix_vertical
 total_columns = matrix_columns * matrix_horizontal
 
-options = RGBMatrixOptions()
-options.rows = matrix_rows 
-options.cols = matrix_columns 
-options.chain_length = matrix_horizontal
-options.parallel = matrix_vertical 
-
-#options.hardware_mapping = 'adafruit-hat-pwm' 
-#options.hardware_mapping = 'adafruit-hat'  # If you have an Adafruit HAT: 'adafruit-hat'
-options.hardware_mapping = 'regular'  
-
-options.gpio_slowdown = 2
-
-matrix = RGBMatrix(options = options)
+# Set CYCLES_DISPLAY to null, terminal or record to play without the panels.
+matrix = open_display(default_display(), matrix_rows, matrix_columns,
+                      matrix_horizontal, matrix_vertical)
+renderer = FrameRenderer(matrix, total_columns, total_rows)
+assets = AssetCache(total_columns, total_rows)
 
 ###################################################
 #Creates global data
@@ -76,19 +64,23 @@ p2_start_x = p1_start_x
 p2_start_y = total_rows - p1_start_y
 
 player1 = [p1_start_x,p1_start_y]
-p1_dir = "down"
+p1_dir = DIR_DOWN
 p1_color = green 
 
 player2 = [p2_start_x,p2_start_y]
-p2_dir = "up"
+p2_dir = DIR_UP
 p2_color = blue 
 
+key_dirs = {ACTION_UP: DIR_UP, ACTION_DOWN: DIR_DOWN, ACTION_LEFT: DIR_LEFT, ACTION_RIGHT: DIR_RIGHT}
 
-# The collision matrix is a 2d matrix of our full playfield size.
+# x and y change for each direction
+dir_steps = {DIR_UP: (0,-1), DIR_RIGHT: (1,0), DIR_DOWN: (0,1), DIR_LEFT: (-1,0)}
+
+
+# The collision grid covers our full playfield size, walls included.
 # Zero means there's nothing in that slot.
 # One means you can't move there.
-collision = []
-collision = [[0] * total_rows for i in range(total_columns)]
+collision = CollisionGrid(total_columns, total_rows)
 
 # initial speed is set with a delay between moving of .1
 speed_delay = .14
@@ -101,24 +93,11 @@ speed_delay = .14
 # init_walls()
 ###################################
 def init_walls():
-  global collision
   global wall_color
 
-  #top and bottom boarders
-  for x in range(total_columns):
-    collision[x][0] = 1
-    collision[x][total_rows-1] = 1
-
-  #left and right boarders
-  for y in range(total_rows):
-    collision[0][y]= 1
-    collision[total_columns-1][y] = 1
-
-  #now draw the box
-  temp_image = Image.new("RGB", (total_columns, total_rows))
-  temp_draw = ImageDraw.Draw(temp_image)
-  temp_draw.rectangle((0,0,total_columns-1,total_rows-1), outline=wall_color)
-  matrix.SetImage(temp_image, 0,0)
+  # The walls are already part of the collision template...just draw them.
+  renderer.clear()
+  renderer.draw_box(wall_color)
 
 ###################################
 # init_players
@@ -132,44 +111,38 @@ def init_players():
   global p1_color
   global p2_color
 
-  collision[p1_start_x][p1_start_y] = 1
-  collision[p2_start_x][p2_start_y] = 1
+  collision.test_and_set(collision.index(p1_start_x, p1_start_y))
+  collision.test_and_set(collision.index(p2_start_x, p2_start_y))
 
-  temp_image = Image.new("RGB", (1,1))
-  temp_draw = ImageDraw.Draw(temp_image)
-  temp_draw.rectangle((0,0,0,0), outline=p1_color, fill=p1_color)
-  matrix.SetImage(temp_image, p1_start_x, p1_start_y)
-  temp_draw.rectangle((0,0,0,0), outline=p2_color, fill=p2_color)
-  matrix.SetImage(temp_image, p2_start_x, p2_start_y)
+  renderer.set_pixel(p1_start_x, p1_start_y, p1_color)
+  renderer.set_pixel(p2_start_x, p2_start_y, p2_color)
 
 ####################################################
 # show_crash() 
 ####################################################
 def show_crash(crash_x, crash_y):
   
-  crash_color = (255,0,0)
-  crash_fill = (255,255,255)
-  for crashloop in range(3,13,2):
-    ellipse_offset = (crashloop-1)/2
-    temp_image = Image.new("RGB", (crashloop,crashloop))
-    temp_draw = ImageDraw.Draw(temp_image)
-    temp_draw.ellipse((0,0,crashloop-1,crashloop-1), outline=crash_color, fill=crash_fill)
-    matrix.SetImage(temp_image, crash_x-ellipse_offset,crash_y-ellipse_offset)
+  for crash_image, ellipse_offset in assets.crash_frames():
+    renderer.draw_image(crash_image, crash_x-ellipse_offset,crash_y-ellipse_offset)
+    renderer.present()
     time.sleep(.1)
 
 ###################################
 #  display_text()
 ###################################
 def display_text(my_text, text_color, delay):
-    temp_image = Image.new("RGB", (total_columns, total_rows))
-    temp_draw = ImageDraw.Draw(temp_image)
-    temp_draw.text((0,0),my_text, fill=text_color)
-    matrix.SetImage(temp_image,0,0)
+    renderer.draw_image(assets.text(my_text, text_color))
+    renderer.present()
     time.sleep(delay)
 
 ###################################
 # Main loop 
 ###################################
+
+# Render every text screen up front so the game doesn't wait on PIL.
+assets.preload([("Get Ready", red), ("3", red), ("2", red), ("1", red), ("GO!!!", red),
+                ("TIE!", red), ("Player 1\nWins!", green), ("Player 2\nWins!", blue)])
+
 display_text("Get Ready",red, 3)
 display_text("3",red,1)
 display_text("2",red,1)
@@ -178,136 +151,100 @@ display_text("GO!!!",red,1)
 
 init_walls()
 init_players()
+renderer.present()
 #time.sleep(3)
 
 ################################
 #  Initialize keyboard reading. 
-#  Save the old terminal configuration, and
-#  tweak the terminal so that it doesn't echo, and doesn't block.
+#  KeyboardInput puts the terminal in cbreak mode (no echo, no line
+#  buffering) and puts it back however we leave.
 ################################
-fd = sys.stdin.fileno()
-newattr = termios.tcgetattr(fd)
-
-oldterm = termios.tcgetattr(fd)
-oldflags = fcntl.fcntl(fd, fcntl.F_GETFL)
-
-newattr[3] = newattr[3] & ~termios.ICANON
-newattr[3] = newattr[3] & ~termios.ECHO
-
-fcntl.fcntl(fd, fcntl.F_SETFL, oldflags | os.O_NONBLOCK)
-
-termios.tcsetattr(fd, termios.TCSANOW, newattr)
+keyboard = KeyboardInput()
 
 print "Player 1 controls:  i=up, j=left, k=down, l=right"
 print "Player 2 controls:  w=up, a=left, s=down, d=right"
 
-p1_image = Image.new("RGB", (1,1))
-p1_draw = ImageDraw.Draw(p1_image)
-p1_draw.rectangle((0,0,0,0), outline=p1_color, fill=p1_color)
-
-p2_image = Image.new("RGB", (1,1))
-p2_draw = ImageDraw.Draw(p2_image)
-p2_draw.rectangle((0,0,0,0), outline=p2_color, fill=p2_color)
-
 p1_crash = False
 p2_crash = False
 
-while True:
-  key = getch_noblock()
-
-  # check for player 1 direction changes, but don't let them back into themselves
-  if (key == 'i') & (p1_dir != "down"):
-    p1_dir = "up" 
-  if (key == 'k') & (p1_dir != "up"):
-    p1_dir = "down" 
-  if (key == 'j') & (p1_dir != "right"):
-    p1_dir = "left" 
-  if (key == 'l') & (p1_dir != "left"):
-    p1_dir = "right" 
-   
-  # check for player 2 direction changes, but don't let them back into themselves
-  if (key == 'w') & (p2_dir != "down"):
-    p2_dir = "up" 
-  if (key == 's') & (p2_dir != "up"):
-    p2_dir = "down" 
-  if (key == 'a') & (p2_dir != "right"):
-    p2_dir = "left" 
-  if (key == 'd') & (p2_dir != "left"):
-    p2_dir = "right" 
-
-  # The engine!
-  # If both p1 and p2 are going to hit something, it's a draw.
-  # If only p1 or p2 hits something, it's a win for the other one.
-  # if neither are going to hit anything, update the collision matrix and add the new "dot"
-
-  #figure out next spot for p1
-  p1_new_x = player1[0]
-  p1_new_y = player1[1]
-  if (p1_dir == "up"):
-    p1_new_y = p1_new_y - 1
-  if (p1_dir == "down"):
-    p1_new_y = p1_new_y + 1
-  if (p1_dir == "left"):
-    p1_new_x = p1_new_x - 1
-  if (p1_dir == "right"):
-    p1_new_x = p1_new_x + 1
-
-  # will the new spot for p1 cause a crash?
-  if (collision[p1_new_x][p1_new_y] == 1):
-    print "Player 1 crashes!!!"
-    p1_crash = True
-  else:
-    collision[p1_new_x][p1_new_y] = 1
-    player1[0] = p1_new_x
-    player1[1] = p1_new_y
-    matrix.SetImage(p1_image, p1_new_x, p1_new_y)
-
-  #figure out next spot for p2
-  p2_new_x = player2[0]
-  p2_new_y = player2[1]
-  if (p2_dir == "up"):
-    p2_new_y = p2_new_y - 1
-  if (p2_dir == "down"):
-    p2_new_y = p2_new_y + 1
-  if (p2_dir == "left"):
-    p2_new_x = p2_new_x - 1
-  if (p2_dir == "right"):
-    p2_new_x = p2_new_x + 1
-
-  # will the new spot for p2 cause a crash?
-  if (collision[p2_new_x][p2_new_y] == 1):
-    print "Player 2 crashes!!!"
-    p2_crash = True
-  else:
-    collision[p2_new_x][p2_new_y] = 1
-    player2[0] = p2_new_x
-    player2[1] = p2_new_y
-    matrix.SetImage(p2_image, p2_new_x, p2_new_y)
-
-  if (p1_crash & p2_crash):
-    print "Tie game!!!"
-    show_crash(p1_new_x,p1_new_y)
-    display_text("TIE!", red, 3)
-    break;
-
-  if (p1_crash):
-    print "Player 2 wins!"
-    show_crash(p1_new_x,p1_new_y)
-    display_text("Player 2\nWins!",blue,3)
-    break;
-
-  if (p2_crash):
-    print "Player 1 wins!"
-    show_crash(p2_new_x,p2_new_y)
-    display_text("Player 1\nWins!",green,3)
-    break;
-
-  time.sleep(speed_delay)
-
-
-###################################
-# Reset the terminal on exit
-###################################
-termios.tcsetattr(fd, termios.TCSANOW, oldterm)
-
-fcntl.fcntl(fd, fcntl.F_SETFL, oldflags)
+# Both players' presses get queued, and come off one per tick, so two
+# keys in the same tick (or a quick double-turn) don't get lost.
+p1_turns = TurnBuffer(p1_dir)
+p2_turns = TurnBuffer(p2_dir)
+scheduler = TickScheduler(1.0 / speed_delay)
+
+try:
+  while True:
+    for timestamp, action in keyboard.read_all(0):
+      p1_turns.push(key_dirs[action], timestamp)
+    for timestamp, action in keyboard.read_all(1):
+      p2_turns.push(key_dirs[action], timestamp)
+
+    # Sleep until somebody presses something or the next tick is due.
+    if not scheduler.tick_due():
+      keyboard.wait(scheduler.time_until_tick())
+      continue
+
+    # check for direction changes.  The turn buffers already won't let
+    # anybody back into themselves.
+    p1_dir = p1_turns.pop()
+    p2_dir = p2_turns.pop()
+
+    # The engine!
+    # If both p1 and p2 are going to hit something, it's a draw.
+    # If only p1 or p2 hits something, it's a win for the other one.
+    # if neither are going to hit anything, update the collision matrix and add the new "dot"
+
+    #figure out next spot for p1
+    p1_new_x = player1[0] + dir_steps[p1_dir][0]
+    p1_new_y = player1[1] + dir_steps[p1_dir][1]
+
+    # will the new spot for p1 cause a crash?
+    if collision.test_and_set(collision.index(p1_new_x, p1_new_y)):
+      print "Player 1 crashes!!!"
+      p1_crash = True
+    else:
+      player1[0] = p1_new_x
+      player1[1] = p1_new_y
+      renderer.set_pixel(p1_new_x, p1_new_y, p1_color)
+
+    #figure out next spot for p2
+    p2_new_x = player2[0] + dir_steps[p2_dir][0]
+    p2_new_y = player2[1] + dir_steps[p2_dir][1]
+
+    # will the new spot for p2 cause a crash?
+    if collision.test_and_set(collision.index(p2_new_x, p2_new_y)):
+      print "Player 2 crashes!!!"
+      p2_crash = True
+    else:
+      player2[0] = p2_new_x
+      player2[1] = p2_new_y
+      renderer.set_pixel(p2_new_x, p2_new_y, p2_color)
+
+    # one push to the panel for everything that moved this tick
+    renderer.present()
+
+    if (p1_crash & p2_crash):
+      print "Tie game!!!"
+      show_crash(p1_new_x,p1_new_y)
+      display_text("TIE!", red, 3)
+      break;
+
+    if (p1_crash):
+      print "Player 2 wins!"
+      show_crash(p1_new_x,p1_new_y)
+      display_text("Player 2\nWins!",blue,3)
+      break;
+
+    if (p2_crash):
+      print "Player 1 wins!"
+      show_crash(p2_new_x,p2_new_y)
+      display_text("Player 1\nWins!",green,3)
+      break;
+
+finally:
+  ###################################
+  # Reset the terminal on exit
+  ###################################
+  keyboard.close()
+  close_display(matrix)
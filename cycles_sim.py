@@ -0,0 +1,158 @@
+#################################################
+# cycles_sim.py - headless game simulator
+#
+# Runs the engine with no matrix, no gamepads and no clock, as fast as
+# the CPU will go.  Players are either driven by a script file or by a
+# seeded random turner, and the last --bots players can be computer
+# players instead.
+#
+#   python cycles_sim.py --games 1000 --seed 42
+#   python cycles_sim.py --script round1.txt
+#   python cycles_sim.py --games 100 --bots 1
+#   python cycles_sim.py --games 50 --record regress.replay
+#
+# A script file has one turn per line:  <tick> <player> <direction>
+# e.g. "12 1 left" turns player 1 left on tick 12.  Ticks count from 1,
+# players from 1, and lines starting with # are ignored.
+#################################################
+
+import argparse
+import random
+
+from engine import CyclesEngine, default_starts, direction_names, EVENT_WIN, EVENT_TIE
+from tick_scheduler import monotonic
+from bot import Bot
+from replay import ReplayWriter
+
+###################################
+# load_script()
+#   returns a dict of tick -> list of (player, direction), players from 0
+#   and directions as the engine's DIR_ numbers.  Raises ValueError naming
+#   the line for anything malformed or for a player past players.
+###################################
+def load_script(path, players):
+  script = {}
+  with open(path) as f:
+    for line_number, line in enumerate(f, 1):
+      line = line.strip()
+      if (line == "") or line.startswith("#"):
+        continue
+      try:
+        tick, player, direction = line.split()
+        tick = int(tick)
+        player = int(player) - 1
+      except ValueError:
+        raise ValueError("%s line %d: expected <tick> <player> <direction>" % (path, line_number))
+      if not (0 <= player < players):
+        raise ValueError("%s line %d: no player %d in a %d player game" % (path, line_number, player + 1, players))
+      if direction not in direction_names:
+        raise ValueError("%s line %d: bad direction %s" % (path, line_number, direction))
+      script.setdefault(tick, []).append((player, direction_names.index(direction)))
+  return script
+
+###################################
+# run_game()
+#   plays one game to the end (or max_ticks) and returns the final event,
+#   or None if we ran out of ticks.  bots maps player number to Bot.
+#   Finished games get appended to writer, if there is one.
+###################################
+def run_game(engine, script, rng, turn_chance, max_ticks, bots={}, writer=None):
+  engine.reset()
+  players = engine.players
+  if writer is not None:
+    writer.start_round(engine, 0.1)
+
+  while engine.tick < max_ticks:
+    inputs = [None] * players
+    if script is not None:
+      for player, direction in script.get(engine.tick + 1, ()):
+        inputs[player] = direction
+    else:
+      for player in range(players):
+        if rng.random() < turn_chance:
+          inputs[player] = rng.randrange(4)
+    for player in bots:
+      if engine.alive[player]:
+        direction = bots[player].choose()
+        if direction != engine.dirs[player]:
+          inputs[player] = direction
+
+    events = engine.step(inputs)
+    if writer is not None:
+      writer.turns(engine.tick, inputs)
+    if engine.game_over:
+      if writer is not None:
+        writer.end_round(engine)
+      return events[-1]
+
+  return None
+
+def main():
+  parser = argparse.ArgumentParser(description="Fast-forward headless light cycle games.")
+  parser.add_argument("--width", type=int, default=64)
+  parser.add_argument("--height", type=int, default=64)
+  parser.add_argument("--players", type=int, default=2)
+  parser.add_argument("--games", type=int, default=1)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--turn-chance", type=float, default=0.1,
+                      help="chance per tick that a random player turns")
+  parser.add_argument("--max-ticks", type=int, default=100000)
+  parser.add_argument("--script", help="scripted turns instead of random ones")
+  parser.add_argument("--bots", type=int, default=0, help="how many players (from the last) are bots")
+  parser.add_argument("--bot-budget", type=float, default=0.03,
+                      help="seconds each bot decision may take")
+  parser.add_argument("--record", help="append finished games to this replay file")
+  parser.add_argument("--trail-length", type=int,
+                      help="cells each trail keeps (default: the whole round)")
+  args = parser.parse_args()
+
+  if (args.trail_length is not None) and (args.trail_length < 2):
+    parser.error("--trail-length must be at least 2")
+  if not (0 <= args.bots <= args.players):
+    parser.error("--bots must be between 0 and --players")
+
+  script = None
+  if args.script:
+    try:
+      script = load_script(args.script, args.players)
+    except ValueError as error:
+      parser.error(str(error))
+
+  engine = CyclesEngine(args.width, args.height, default_starts(args.width, args.height, args.players),
+                        args.trail_length)
+  wins = [0] * engine.players
+  bots = {}
+  for player in range(engine.players - args.bots, engine.players):
+    bots[player] = Bot(engine, player, args.bot_budget)
+  writer = None
+  if args.record:
+    try:
+      writer = ReplayWriter(args.record)
+    except ValueError as error:
+      parser.error(str(error))
+  ties = 0
+  unfinished = 0
+  total_ticks = 0
+
+  start_time = monotonic()
+  for game in range(args.games):
+    rng = random.Random(args.seed + game)
+    result = run_game(engine, script, rng, args.turn_chance, args.max_ticks, bots, writer)
+    total_ticks += engine.tick
+    if result is None:
+      unfinished += 1
+    elif result[0] == EVENT_WIN:
+      wins[result[1]] += 1
+    elif result[0] == EVENT_TIE:
+      ties += 1
+  elapsed = monotonic() - start_time
+
+  print("games=%d ticks=%d avg length=%.1f" % (args.games, total_ticks, float(total_ticks) / max(args.games, 1)))
+  for player in range(len(wins)):
+    print("player %d wins: %d" % (player + 1, wins[player]))
+  print("ties: %d  unfinished: %d" % (ties, unfinished))
+  if elapsed > 0:
+    print("%.3fs  %.0f ticks/sec" % (elapsed, total_ticks / elapsed))
+
+if __name__ == "__main__":
+  main()
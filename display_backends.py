@@ -0,0 +1,298 @@
+#################################################
+# display_backends.py - where the frames go
+#
+# Every backend looks like the bits of rgbmatrix.RGBMatrix that the game
+# uses:  CreateFrameCanvas(), SwapOnVSync(), SetImage() and Clear() on
+# the matrix, and SetImage(), SetPixel() and Clear() on a canvas.
+#
+#   matrix    - the real LED panels
+#   null      - throws everything away
+#   terminal  - draws the panel in the terminal with ANSI colors
+#   record    - saves every frame to GIFs, or numbered PNGs in a directory
+#
+# rgbmatrix is only imported if the matrix backend gets picked, so the
+# rest work on machines without the panel driver.
+#################################################
+
+import os
+import sys
+import threading
+
+from PIL import Image
+
+from tick_scheduler import monotonic
+
+display_names = ["matrix", "null", "terminal", "record"]
+
+###################################
+# default_display()
+#   $CYCLES_DISPLAY if it's set, otherwise the real matrix.
+###################################
+def default_display():
+  return os.environ.get("CYCLES_DISPLAY", "matrix")
+
+###################################
+# open_display()
+#   rows/cols are the size of ONE matrix, chain_length and parallel are
+#   how many are stacked horizontally and vertically...same as
+#   RGBMatrixOptions.  record_path is only used by the record backend.
+###################################
+def open_display(name, rows, cols, chain_length=1, parallel=1, record_path="cycles.gif"):
+  width = cols * chain_length
+  height = rows * parallel
+
+  if name == "matrix":
+    return open_matrix(rows, cols, chain_length, parallel)
+  if name == "null":
+    return NullMatrix(width, height)
+  if name == "terminal":
+    return TerminalMatrix(width, height)
+  if name == "record":
+    return RecorderMatrix(width, height, record_path)
+
+  raise ValueError("unknown display %s (pick one of %s)" % (name, ", ".join(display_names)))
+
+###################################
+# close_display()
+#   gives the backend a chance to finish up (e.g. write out the GIF).
+#   The real matrix doesn't need it.
+###################################
+def close_display(display):
+  if hasattr(display, "close"):
+    display.close()
+
+###################################
+# open_matrix()
+###################################
+def open_matrix(rows, cols, chain_length, parallel):
+  from rgbmatrix import RGBMatrix, RGBMatrixOptions
+
+  options = RGBMatrixOptions()
+  options.rows = rows
+  options.cols = cols
+  options.chain_length = chain_length
+  options.parallel = parallel
+
+  #options.hardware_mapping = 'adafruit-hat-pwm'
+  #options.hardware_mapping = 'adafruit-hat'  # If you have an Adafruit HAT: 'adafruit-hat'
+  options.hardware_mapping = 'regular'
+
+  options.gpio_slowdown = 2
+
+  return RGBMatrix(options = options)
+
+###################################
+# NullMatrix
+###################################
+class NullCanvas(object):
+
+  def SetImage(self, image, x=0, y=0):
+    pass
+
+  def SetPixel(self, x, y, r, g, b):
+    pass
+
+  def Clear(self):
+    pass
+
+class NullMatrix(object):
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.brightness = 100
+    self.canvas = NullCanvas()
+
+  def CreateFrameCanvas(self):
+    return self.canvas
+
+  def SwapOnVSync(self, canvas):
+    return canvas
+
+  def SetImage(self, image, x=0, y=0):
+    pass
+
+  def Clear(self):
+    pass
+
+  def close(self):
+    pass
+
+###################################
+# ImageCanvas
+#   a canvas backed by a PIL image, for the backends that need to
+#   actually see the pixels.
+###################################
+class ImageCanvas(object):
+
+  def __init__(self, width, height):
+    self.image = Image.new("RGB", (width, height))
+    self.pixels = self.image.load()
+    self.width = width
+    self.height = height
+
+  def SetImage(self, image, x=0, y=0):
+    self.image.paste(image.convert("RGB"), (int(x), int(y)))
+
+  def SetPixel(self, x, y, r, g, b):
+    if (0 <= x < self.width) & (0 <= y < self.height):
+      self.pixels[x, y] = (r, g, b)
+
+  def Clear(self):
+    self.image.paste((0, 0, 0), (0, 0, self.width, self.height))
+
+###################################
+# ImageMatrix
+#   double buffered like the real thing:  SwapOnVSync shows the canvas it
+#   was given and hands back the one that was showing before.  Subclasses
+#   do something with the new front canvas in show().
+###################################
+class ImageMatrix(object):
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.brightness = 100
+    self.front = ImageCanvas(width, height)
+    self.back = ImageCanvas(width, height)
+
+  def CreateFrameCanvas(self):
+    return self.back
+
+  def SwapOnVSync(self, canvas):
+    previous = self.front
+    self.front = canvas
+    self.back = previous
+    self.show(canvas)
+    return previous
+
+  def SetImage(self, image, x=0, y=0):
+    self.front.SetImage(image, x, y)
+    self.show(self.front)
+
+  def Clear(self):
+    self.front.Clear()
+    self.show(self.front)
+
+  def show(self, canvas):
+    pass
+
+  def close(self):
+    pass
+
+###################################
+# TerminalMatrix
+#   Two panel rows per line of text, using the upper half block with the
+#   top pixel as foreground and the bottom pixel as background.
+###################################
+half_block = u"\u2580"
+
+class TerminalMatrix(ImageMatrix):
+
+  def __init__(self, width, height, out=None):
+    ImageMatrix.__init__(self, width, height)
+    if out is None:
+      out = sys.stdout
+    self.out = out
+    # clear the screen once up front
+    self.out.write("\x1b[2J")
+
+  def show(self, canvas):
+    pixels = canvas.pixels
+    lines = ["\x1b[H"]
+    for y in range(0, self.height, 2):
+      line = []
+      for x in range(self.width):
+        top = pixels[x, y]
+        if y + 1 < self.height:
+          bottom = pixels[x, y + 1]
+        else:
+          bottom = (0, 0, 0)
+        line.append(u"\x1b[38;2;%d;%d;%dm\x1b[48;2;%d;%d;%dm" % (top + bottom))
+        line.append(half_block)
+      line.append(u"\x1b[0m\n")
+      lines.append(u"".join(line))
+
+    text = u"".join(lines)
+    if sys.version_info[0] < 3:
+      text = text.encode("utf-8")
+    self.out.write(text)
+    self.out.flush()
+
+  def close(self):
+    self.out.write("\x1b[0m\n")
+    self.out.flush()
+
+###################################
+# RecorderMatrix
+#   If path is a directory every frame is written straight out as
+#   frame_NNNNNN.png.  Otherwise frames are saved as animated GIFs (with
+#   the real frame timing), chunk_frames at a time so a long session
+#   doesn't pile up in memory:  the first chunk goes to path, the rest to
+#   path with _002, _003... before the extension.  Each chunk is written
+#   on a thread of its own so the game doesn't stall while it's encoded.
+###################################
+class RecorderMatrix(ImageMatrix):
+
+  def __init__(self, width, height, path, chunk_frames=600):
+    ImageMatrix.__init__(self, width, height)
+    self.path = path
+    self.to_directory = os.path.isdir(path)
+    self.chunk_frames = chunk_frames
+    self.frames = []
+    self.times = []
+    self.frame_count = 0
+    self.chunks = 0
+    self.writer = None
+
+  def show(self, canvas):
+    self.frame_count += 1
+    if self.to_directory:
+      canvas.image.save(os.path.join(self.path, "frame_%06d.png" % self.frame_count))
+    else:
+      self.frames.append(canvas.image.copy())
+      self.times.append(monotonic())
+      if len(self.frames) >= self.chunk_frames:
+        self.flush()
+
+  def chunk_path(self, chunk):
+    if chunk == 0:
+      return self.path
+    base, extension = os.path.splitext(self.path)
+    return "%s_%03d%s" % (base, chunk + 1, extension or ".gif")
+
+  ###################################
+  # flush()
+  #   starts writing out the frames so far.  Waits for the last chunk to
+  #   finish first, so there's never more than two chunks in memory.
+  ###################################
+  def flush(self):
+    if not self.frames:
+      return
+
+    durations = []
+    for frame in range(len(self.frames) - 1):
+      durations.append(max(int((self.times[frame + 1] - self.times[frame]) * 1000), 20))
+    durations.append(1000)
+
+    self.wait_for_writer()
+    self.writer = threading.Thread(target=save_gif,
+                                   args=(self.chunk_path(self.chunks), self.frames, durations))
+    self.writer.start()
+    self.chunks += 1
+    self.frames = []
+    self.times = []
+
+  def wait_for_writer(self):
+    if self.writer is not None:
+      self.writer.join()
+      self.writer = None
+
+  def close(self):
+    if self.to_directory:
+      return
+    self.flush()
+    self.wait_for_writer()
+
+def save_gif(path, frames, durations):
+  frames[0].save(path, save_all=True, append_images=frames[1:], duration=durations, loop=0)
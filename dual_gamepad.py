@@ -1,131 +1,101 @@
-from evdev import InputDevice, categorize, ecodes
+from gamepad_profiles import ACTION_NONE, ACTION_UP, ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT
+from gamepad_profiles import ACTION_X, ACTION_Y, ACTION_A, ACTION_B, ACTION_SELECT, ACTION_START
+from gamepad_profiles import ACTION_RIGHT_BUMPER, ACTION_LEFT_BUMPER
+from gamepad_profiles import action_names, default_table, decode
+from gamepad_manager import GamepadManager
 
-try:
-  gamepad0 = InputDevice('/dev/input/event0')
-except:
-  print("First Gamepad not connected")
-  exit(1)
+#################################
+# get_manager
+#   The gamepads for players 1 and 2.  Nothing gets opened until somebody
+#   asks for it, and it's fine for either (or both) to be missing:  they're
+#   picked up whenever they get plugged in.  See gamepad_manager.py.
+#################################
+manager = None
 
-try:
-  gamepad1 = InputDevice('/dev/input/event1')
-except:
-  print("Second Gamepad not connected")
-  exit(1)
+def get_manager():
+  global manager
+  if manager is None:
+    manager = GamepadManager(2)
+  return manager
+
+def close_gamepads():
+  global manager
+  if manager is not None:
+    manager.close()
+    manager = None
 
 #################################
 # gamepad_parse
 #   parses a single event and returns a string that represents that event.
+#   None if it's not an event we care about.
 #################################
 def gamepad_parse(event):
-
-    # These are the key definitions for the generic USB joystick
-    d_up = 544
-    d_down = 545
-    d_left = 546
-    d_right = 547
-    x = 288
-    y = 291
-    a = 289
-    b = 290
-    select = 296
-    start = 297
-    right_bumper = 293
-    left_bumper = 292 
-
-    # parse keypress events
-    if event.type ==ecodes.EV_KEY:
-
-      # 1 indicates key press.  0 indicates release
-      if event.value == 1:
-        if event.code == x:
-          return("X")
-        elif event.code == y:
-          return("Y")
-        elif event.code == a:
-          return("A") 
-        elif event.code == b: 
-          return("B")
-        elif event.code == select:
-          return("Select")
-        elif event.code == start:
-          return("Start")
-        elif event.code == right_bumper:
-          return("Right-bumper")
-        elif event.code == left_bumper:
-          return("Left-bumper")
-
-    # type 3 are absolute axis events.  The D-pad uses these.
-    if event.type == 3:
-      # code 0 are x axis events
-      if (event.code == 0):
-        if event.value == 0:
-          return("D-left")
-        if event.value == 255:
-          return("D-right")
-        # ignoring the "return to center" value of 127.
-
-      # code 1 are y axis events
-      if (event.code == 1):
-        if event.value == 0:
-          return("D-up")
-        if event.value == 255:
-          return("D-down")
-  
-################################################
-# gamepad_read_blocking
-#   This returns a single event from the gamepad...blocking until we get one.
-################################################
-def gamepad_read_blocking(gamepad):
-
-  # This isn't perfect...since we're returning the first value we see, if there are
-  #   "chorded" presses, we can miss events.
-  for event in gamepad.read_loop():
-    event_string = gamepad_parse(event)
-    if (event_string != None):
-      return gamepad_parse(event)
-
-################################################
-# gamepad_read_nonblocking
-#   This returns a single event from the gamepad....
-################################################
-def gamepad_read_nonblocking(gamepad):
-
-  # This isn't perfect...since we're returning the first value we see, if there are
-  #   "chorded" presses, we can miss events.
-  event = gamepad.read_one()
-  if event == None:
-    return "No Input"
-  else:
-    event_string = gamepad_parse(event)
-    if (event_string != None):
-      return gamepad_parse(event)
-    else:
-      return "No Input"
+  action = decode(default_table, event)
+  if action == ACTION_NONE:
+    return None
+  return action_names[action]
 
 ################################################
 # gamepad0_read_nonblocking
 #   This returns a single event from gamepad0
 ################################################
 def gamepad0_read_nonblocking():
-  return gamepad_read_nonblocking(gamepad0)
+  return get_manager().read_nonblocking(0)
 
 ################################################
 # gamepad1_read_nonblocking
-#   This returns a single event from gamepad0
+#   This returns a single event from gamepad1
 ################################################
 def gamepad1_read_nonblocking():
-  return gamepad_read_nonblocking(gamepad1)
+  return get_manager().read_nonblocking(1)
+
+################################################
+# gamepad0_read_all
+#   This returns every queued event from gamepad0
+################################################
+def gamepad0_read_all():
+  return get_manager().read_all(0)
+
+################################################
+# gamepad1_read_all
+#   This returns every queued event from gamepad1
+################################################
+def gamepad1_read_all():
+  return get_manager().read_all(1)
+
+################################################
+# slot_read_blocking
+#   Waits for the gamepad in slot (which might not be plugged in yet) to
+#   give us something we care about.
+################################################
+def slot_read_blocking(slot):
+  manager = get_manager()
+  while True:
+    if slot in manager.wait(None):
+      input = manager.read_nonblocking(slot)
+      if input != "No Input":
+        return input
 
 ################################################
 # gamepad0_read_locking
 #   This returns a single event from gamepad0
 ################################################
 def gamepad0_read_blocking():
-  return gamepad_read_blocking(gamepad0)
+  return slot_read_blocking(0)
 
 ################################################
 # gamepad1_read_blocking
 #   This returns a single event from gamepad1
 ################################################
 def gamepad1_read_blocking():
-  return gamepad_read_blocking(gamepad1)
+  return slot_read_blocking(1)
+
+################################################
+# gamepads_wait
+#   Sleeps until either gamepad has an event queued, a gamepad is plugged
+#   in or pulled out, or until timeout seconds have passed.  Returns the
+#   list of slots that are ready to read (empty on timeout).  A timeout of
+#   None waits forever.
+################################################
+def gamepads_wait(timeout):
+  return get_manager().wait(timeout)
@@ -0,0 +1,318 @@
+#################################################
+# engine.py - the game rules, with no hardware attached
+#
+# Knows about the playfield, where the players are and which way they're
+# going, and nothing else:  no matrix, no gamepads, no clock.  Every call
+# to step() is one tick.  It takes each player's requested direction and
+# hands back a list of events describing what happened, which the caller
+# can draw, print, record, or ignore.
+#
+# Any number of players.  Their state is kept in parallel arrays indexed
+# by player number (head cell index, direction, alive flag), and a tick
+# is one pass over them to pick target cells and one to apply the moves.
+#
+# Trails normally stay put until the round ends.  With a trail_length,
+# each rider only keeps that many cells:  every cell it moves onto goes
+# into a ring buffer of cell indices (one per player, all in one array
+# allocated up front), and once the ring is full the oldest cell is
+# cleared as the rider moves on.  That's a constant amount of work per
+# rider per tick, however long the trails are.
+#################################################
+
+from array import array
+
+from collision_grid import CollisionGrid
+
+###################################
+# Directions
+#   Clockwise from up, so the opposite direction is always d ^ 2.
+###################################
+DIR_UP = 0
+DIR_RIGHT = 1
+DIR_DOWN = 2
+DIR_LEFT = 3
+
+direction_names = ["up", "right", "down", "left"]
+
+def opposite(direction):
+  return direction ^ 2
+
+###################################
+# Events returned by step()
+#   (EVENT_MOVE, player, x, y)   player moved onto x,y
+#   (EVENT_CRASH, player, x, y)  player ran into something at x,y
+#   (EVENT_WIN, player)          game over, player won
+#   (EVENT_TIE,)                 game over, nobody won
+#   (EVENT_ERASE, player, x, y)  the tail end of player's trail at x,y
+#                                is gone (only with a trail_length)
+###################################
+EVENT_MOVE = 0
+EVENT_CRASH = 1
+EVENT_WIN = 2
+EVENT_TIE = 3
+EVENT_ERASE = 4
+
+###################################
+# default_starts()
+#   Players alternate between the top of the playfield going down and
+#   the bottom going up, spread out evenly across each.  With two players
+#   that's p1 at the top middle and p2 at the bottom middle.
+#   Returns a list of (x, y, direction), one per player.
+###################################
+def default_starts(width, height, players=2):
+  start_y = 5
+  top_count = (players + 1) // 2
+  bottom_count = players // 2
+
+  starts = []
+  for player in range(players):
+    if player % 2 == 0:
+      slot = player // 2
+      starts.append((width * (slot + 1) // (top_count + 1), start_y, DIR_DOWN))
+    else:
+      slot = player // 2
+      starts.append((width * (slot + 1) // (bottom_count + 1), height - start_y, DIR_UP))
+  return starts
+
+###################################
+# random_starts()
+#   Seeded start positions for headless matches:  everybody somewhere at
+#   least margin cells in from the walls, facing any way, and no two
+#   players within spacing cells (Manhattan) of each other.  rng is a
+#   random.Random.
+###################################
+def random_starts(width, height, players, rng, margin=4, spacing=8):
+  starts = []
+  tries = 0
+  while len(starts) < players:
+    tries += 1
+    if tries > 1000 * players:
+      raise ValueError("can't fit %d players %d apart on %dx%d" % (players, spacing, width, height))
+    x = rng.randrange(margin, width - margin)
+    y = rng.randrange(margin, height - margin)
+    if [start for start in starts if abs(start[0] - x) + abs(start[1] - y) < spacing]:
+      continue
+    starts.append((x, y, rng.randrange(4)))
+  return starts
+
+###################################
+# EngineSnapshot
+#   Room for a copy of everything step() changes:  the grid cells, the
+#   player arrays and the few counters.  Allocated once and reused, so
+#   saving and restoring are slice copies with nothing to allocate.
+###################################
+class EngineSnapshot(object):
+
+  def __init__(self, engine):
+    self.cells = bytearray(engine.grid.size)
+    self.pos = array("i", engine.pos)
+    self.dirs = bytearray(engine.players)
+    self.alive = bytearray(engine.players)
+    self.trail = array("i", engine.trail)
+    self.trail_next = array("i", engine.trail_next)
+    self.trail_count = array("i", engine.trail_count)
+    self.alive_count = 0
+    self.tick = 0
+    self.game_over = False
+    self.winner = None
+
+class CyclesEngine(object):
+
+  ###################################
+  # trail_length is how many cells each rider's trail can be, head
+  # included, or None for trails that last the whole round.  It has to
+  # be at least 2:  tails are pulled in before anybody moves, so with
+  # just the head left two riders face to face could pass through each
+  # other.
+  ###################################
+  def __init__(self, width, height, starts=None, trail_length=None):
+    self.width = width
+    self.height = height
+    self.grid = CollisionGrid(width, height)
+    if starts is None:
+      starts = default_starts(width, height)
+    self.starts = starts
+    if (trail_length is not None) and (trail_length < 2):
+      raise ValueError("trail_length has to be at least 2")
+    self.trail_length = trail_length
+
+    players = len(starts)
+    self.players = players
+    self.pos = array("i", [0] * players)
+    self.dirs = bytearray(players)
+    self.alive = bytearray(players)
+    self.targets = array("i", [0] * players)
+
+    # how many players want each cell this tick.  Only the targeted cells
+    # are ever non-zero, and they're put back to zero before step() returns.
+    self.claims = bytearray(self.grid.size)
+
+    # Player n's ring is trail[n * trail_length:(n + 1) * trail_length].
+    # trail_next is the slot the next cell goes in, which is also the
+    # oldest cell once the ring is full.
+    ring_size = trail_length or 0
+    self.trail = array("i", [0] * (players * ring_size))
+    self.trail_next = array("i", [0] * players)
+    self.trail_count = array("i", [0] * players)
+
+    self.reset()
+
+  ###################################
+  # reset()
+  #   puts everybody back at their start positions on an empty playfield.
+  ###################################
+  def reset(self):
+    grid = self.grid
+    grid.reset()
+
+    for player in range(self.players):
+      start_x, start_y, start_dir = self.starts[player]
+      index = grid.index(start_x, start_y)
+      self.pos[player] = index
+      self.dirs[player] = start_dir
+      self.alive[player] = 1
+      grid.test_and_set(index)
+      if self.trail_length:
+        self.trail[player * self.trail_length] = index
+        self.trail_next[player] = 1 % self.trail_length
+        self.trail_count[player] = 1
+
+    self.alive_count = self.players
+    self.tick = 0
+    self.game_over = False
+    self.winner = None
+
+  def coords(self, player):
+    return self.grid.coords(self.pos[player])
+
+  ###################################
+  # save() / restore()
+  #   copy the whole game state into, or back out of, an EngineSnapshot.
+  ###################################
+  def save(self, snapshot):
+    snapshot.cells[:] = self.grid.cells
+    snapshot.pos[:] = self.pos
+    snapshot.dirs[:] = self.dirs
+    snapshot.alive[:] = self.alive
+    snapshot.trail[:] = self.trail
+    snapshot.trail_next[:] = self.trail_next
+    snapshot.trail_count[:] = self.trail_count
+    snapshot.alive_count = self.alive_count
+    snapshot.tick = self.tick
+    snapshot.game_over = self.game_over
+    snapshot.winner = self.winner
+
+  def restore(self, snapshot):
+    self.grid.cells[:] = snapshot.cells
+    self.pos[:] = snapshot.pos
+    self.dirs[:] = snapshot.dirs
+    self.alive[:] = snapshot.alive
+    self.trail[:] = snapshot.trail
+    self.trail_next[:] = snapshot.trail_next
+    self.trail_count[:] = snapshot.trail_count
+    self.alive_count = snapshot.alive_count
+    self.tick = snapshot.tick
+    self.game_over = snapshot.game_over
+    self.winner = snapshot.winner
+
+  ###################################
+  # step()
+  #   inputs has one entry per player:  the direction they want to go, or
+  #   None to keep going the way they are.  Players can't back into
+  #   themselves...those requests are ignored.
+  #
+  #   Everybody moves at once.  A player crashes if their target cell is
+  #   already taken, or if another player is moving into the same cell
+  #   this tick (both crash).  Two heads swapping places crash too, since
+  #   each one's target is the other's current head.
+  #
+  #   The game is over once there's at most one player left standing:
+  #   a win for the survivor, or a tie if nobody made it.
+  #
+  #   With a trail_length, full trails lose their oldest cell before
+  #   anybody moves, so a rider can follow right behind a tail (its own
+  #   or anybody's) without it depending on who moves first.
+  ###################################
+  def step(self, inputs):
+    events = []
+    if self.game_over:
+      return events
+
+    self.tick += 1
+    cells = self.grid.cells
+    offsets = self.grid.step
+    pos = self.pos
+    dirs = self.dirs
+    alive = self.alive
+    targets = self.targets
+    claims = self.claims
+    players = self.players
+
+    # pass 0:  pull in the tails
+    length = self.trail_length
+    if length:
+      trail = self.trail
+      trail_next = self.trail_next
+      trail_count = self.trail_count
+      stride = self.grid.stride
+      for player in range(players):
+        if alive[player] and (trail_count[player] == length):
+          oldest = trail[player * length + trail_next[player]]
+          cells[oldest] = 0
+          trail_count[player] = length - 1
+          y, x = divmod(oldest, stride)
+          events.append((EVENT_ERASE, player, x - 1, y - 1))
+
+    # pass 1:  turns and target cells
+    for player in range(players):
+      if not alive[player]:
+        continue
+      new_dir = inputs[player]
+      if (new_dir is not None) and (new_dir != dirs[player] ^ 2):
+        dirs[player] = new_dir
+      target = pos[player] + offsets[dirs[player]]
+      targets[player] = target
+      claims[target] += 1
+
+    # pass 2:  crash or move
+    stride = self.grid.stride
+    for player in range(players):
+      if not alive[player]:
+        continue
+      target = targets[player]
+      # same as grid.coords(), without the call
+      y, x = divmod(target, stride)
+      x -= 1
+      y -= 1
+      if cells[target] or (claims[target] > 1):
+        # mark it even if it was empty (a contested cell), so it's a wreck
+        # for anyone still riding.
+        cells[target] = 1
+        alive[player] = 0
+        self.alive_count -= 1
+        events.append((EVENT_CRASH, player, x, y))
+      else:
+        cells[target] = 1
+        pos[player] = target
+        events.append((EVENT_MOVE, player, x, y))
+        if length:
+          slot = trail_next[player]
+          trail[player * length + slot] = target
+          slot += 1
+          if slot == length:
+            slot = 0
+          trail_next[player] = slot
+          trail_count[player] += 1
+
+    for player in range(players):
+      claims[targets[player]] = 0
+
+    if (self.alive_count == 0) or ((self.alive_count == 1) and (players > 1)):
+      self.game_over = True
+      if self.alive_count == 1:
+        self.winner = [player for player in range(players) if alive[player]][0]
+        events.append((EVENT_WIN, self.winner))
+      else:
+        events.append((EVENT_TIE,))
+
+    return events
@@ -0,0 +1,299 @@
+#################################################
+# gamepad_manager.py - finds gamepads, and copes with them coming and going
+#
+# Rather than opening fixed /dev/input/eventN paths, the manager looks at
+# every input device and keeps the ones that look like gamepads:  joystick
+# or gamepad buttons, plus X/Y (or hat) axes.  Keyboards, mice and the
+# like are skipped.  Gamepads are handed out to player slots in the order
+# they show up.
+#
+# /dev/input is watched with inotify, and the watch is part of the same
+# select() as the gamepads, so a controller being plugged in wakes the
+# game loop just like a button press does.  Nothing polls.  A controller
+# that gets unplugged shows up as a read error;  its slot is emptied (that
+# rider just keeps going straight) and the next gamepad to appear takes
+# it over.  The same controller plugged back into the same USB port gets
+# its old slot back even if another slot is empty.
+#
+# Nothing here fails if there are no gamepads yet.  Reads from an empty
+# slot just come back empty.
+#################################################
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+from evdev import InputDevice, ecodes
+
+from gamepad_profiles import ACTION_NONE, action_names, profile_for
+
+###################################
+# DirectoryWatch
+#   inotify on one directory, through ctypes since there's no inotify in
+#   the standard library.  fileno() can go straight into select().
+###################################
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+inotify_event = struct.Struct("iIII")
+
+class DirectoryWatch(object):
+
+  def __init__(self, path):
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+      raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    mask = IN_CREATE | IN_DELETE | IN_ATTRIB | IN_MOVED_TO | IN_MOVED_FROM
+    if libc.inotify_add_watch(fd, path.encode("utf-8"), mask) < 0:
+      error = ctypes.get_errno()
+      os.close(fd)
+      raise OSError(error, "inotify_add_watch %s failed" % path)
+    self.fd = fd
+
+  def fileno(self):
+    return self.fd
+
+  ###################################
+  # read()
+  #   list of (mask, name) for everything that's happened since last
+  #   time.  Empty if nothing has.
+  ###################################
+  def read(self):
+    changes = []
+    while True:
+      try:
+        data = os.read(self.fd, 4096)
+      except OSError as e:
+        if e.errno != errno.EAGAIN:
+          raise
+        break
+      offset = 0
+      while offset + inotify_event.size <= len(data):
+        wd, mask, cookie, name_length = inotify_event.unpack_from(data, offset)
+        offset += inotify_event.size
+        name = data[offset:offset + name_length].rstrip(b"\0").decode("utf-8", "replace")
+        offset += name_length
+        changes.append((mask, name))
+    return changes
+
+  def close(self):
+    os.close(self.fd)
+
+###################################
+# is_gamepad()
+#   joystick/gamepad buttons (BTN_JOYSTICK up through BTN_THUMBR) and a
+#   pair of axes to steer with.  Codes are from linux/input-event-codes.h.
+###################################
+BTN_JOYSTICK = 0x120
+BTN_THUMBR = 0x13e
+ABS_X = 0x00
+ABS_Y = 0x01
+ABS_HAT0X = 0x10
+ABS_HAT0Y = 0x11
+
+def is_gamepad(device):
+  capabilities = device.capabilities()
+  keys = capabilities.get(ecodes.EV_KEY, [])
+  axes = [axis[0] if isinstance(axis, tuple) else axis for axis in capabilities.get(ecodes.EV_ABS, [])]
+  has_buttons = [key for key in keys if BTN_JOYSTICK <= key <= BTN_THUMBR] != []
+  has_stick = ((ABS_X in axes) and (ABS_Y in axes)) or ((ABS_HAT0X in axes) and (ABS_HAT0Y in axes))
+  return has_buttons and has_stick
+
+class GamepadManager(object):
+
+  # without inotify, how often wait() looks for new gamepads
+  rescan_interval = 2.0
+
+  def __init__(self, slots=2, directory="/dev/input"):
+    self.directory = directory
+    self.devices = [None] * slots
+    self.tables = [None] * slots
+
+    # who was last in each slot, so a replugged controller goes back there
+    self.identities = [None] * slots
+
+    # paths we've got open (path -> slot), and ones to leave alone until
+    # they go away and come back:  not gamepads, or just unplugged.
+    self.paths = {}
+    self.skipped = set()
+
+    try:
+      self.watch = DirectoryWatch(directory)
+    except OSError as e:
+      print("Can't watch %s for gamepads (%s)...plug them in before starting" % (directory, e))
+      self.watch = None
+
+    self.last_scan = time.time()
+    self.scan()
+
+  def connected(self, slot):
+    return self.devices[slot] is not None
+
+  ###################################
+  # scan()
+  #   tries everything in the directory that we haven't already sorted out.
+  ###################################
+  def scan(self):
+    try:
+      names = sorted(os.listdir(self.directory))
+    except OSError:
+      return
+    for name in names:
+      self.try_open(os.path.join(self.directory, name))
+
+  def try_open(self, path):
+    if (not os.path.basename(path).startswith("event")) or (path in self.paths) or (path in self.skipped):
+      return
+    if None not in self.devices:
+      return
+
+    try:
+      device = InputDevice(path)
+    except (IOError, OSError):
+      # gone already, or udev hasn't set the permissions yet (we'll hear
+      # about it again when it does).
+      return
+
+    if not is_gamepad(device):
+      device.close()
+      self.skipped.add(path)
+      return
+
+    identity = (device.name, getattr(device, "phys", None))
+    slot = None
+    for candidate in range(len(self.devices)):
+      if (self.devices[candidate] is None) and (self.identities[candidate] == identity):
+        slot = candidate
+        break
+    if slot is None:
+      slot = self.devices.index(None)
+
+    self.devices[slot] = device
+    self.tables[slot] = profile_for(device)
+    self.identities[slot] = identity
+    self.paths[path] = slot
+    print("Gamepad %d connected: %s" % (slot + 1, device.name))
+
+  def disconnect(self, slot):
+    device = self.devices[slot]
+    if device is None:
+      return
+    self.devices[slot] = None
+    self.tables[slot] = None
+    for path in [path for path in self.paths if self.paths[path] == slot]:
+      del self.paths[path]
+      self.skipped.add(path)
+    try:
+      device.close()
+    except (IOError, OSError):
+      pass
+    print("Gamepad %d disconnected" % (slot + 1))
+
+    # a spare gamepad that didn't have a slot can have this one
+    self.scan()
+
+  ###################################
+  # handle_changes()
+  #   what to do with the inotify events.
+  ###################################
+  def handle_changes(self):
+    for mask, name in self.watch.read():
+      path = os.path.join(self.directory, name)
+      if mask & (IN_DELETE | IN_MOVED_FROM):
+        if path in self.paths:
+          self.disconnect(self.paths[path])
+        self.skipped.discard(path)
+      else:
+        if mask & (IN_CREATE | IN_MOVED_TO):
+          self.skipped.discard(path)
+        self.try_open(path)
+
+  ###################################
+  # read_all()
+  #   everything queued on slot's gamepad as (timestamp, action) tuples,
+  #   oldest first.  Same as dual_gamepad.gamepad0_read_all(), except an
+  #   empty or unplugged slot just gives an empty list.
+  ###################################
+  def read_all(self, slot):
+    device = self.devices[slot]
+    if device is None:
+      return []
+    table = self.tables[slot]
+    actions = []
+    while True:
+      try:
+        for event in device.read():
+          action = table.get((event.type, event.code, event.value), ACTION_NONE)
+          if action != ACTION_NONE:
+            actions.append((event.timestamp(), action))
+      except (IOError, OSError) as e:
+        if e.errno != errno.EAGAIN:
+          # ENODEV when it's been unplugged
+          self.disconnect(slot)
+        break
+    return actions
+
+  ###################################
+  # read_nonblocking()
+  #   one event's action name, or "No Input".
+  ###################################
+  def read_nonblocking(self, slot):
+    device = self.devices[slot]
+    if device is None:
+      return "No Input"
+    try:
+      event = device.read_one()
+    except (IOError, OSError):
+      self.disconnect(slot)
+      return "No Input"
+    if event is None:
+      return "No Input"
+    return action_names[self.tables[slot].get((event.type, event.code, event.value), ACTION_NONE)]
+
+  ###################################
+  # wait()
+  #   sleeps until a gamepad has something queued, a gamepad comes or
+  #   goes, or timeout seconds are up (None for forever).  Returns the
+  #   list of slots with input waiting.
+  ###################################
+  def wait(self, timeout):
+    waiting = [device for device in self.devices if device is not None]
+    if self.watch is not None:
+      waiting.append(self.watch)
+    elif None in self.devices:
+      # no inotify:  fall back to looking every so often
+      if (timeout is None) or (timeout > self.rescan_interval):
+        timeout = self.rescan_interval
+      if time.time() - self.last_scan >= self.rescan_interval:
+        self.last_scan = time.time()
+        self.scan()
+    try:
+      ready, _, _ = select.select(waiting, [], [], timeout)
+    except (select.error, ValueError):
+      # interrupted by a signal, or a device closed under us...just treat
+      # it like a timeout.
+      return []
+
+    if (self.watch is not None) and (self.watch in ready):
+      self.handle_changes()
+    return [slot for slot in range(len(self.devices))
+            if (self.devices[slot] is not None) and (self.devices[slot] in ready)]
+
+  def close(self):
+    for slot in range(len(self.devices)):
+      if self.devices[slot] is not None:
+        self.devices[slot].close()
+        self.devices[slot] = None
+    if self.watch is not None:
+      self.watch.close()
+      self.watch = None
@@ -0,0 +1,93 @@
+#################################################
+# gamepad_profiles.py - gamepad event decode tables
+#
+# Doesn't need evdev or an actual gamepad, so the tables (and the action
+# codes) can be used on machines with nothing plugged in.
+#################################################
+
+import json
+import os
+
+# event type numbers from linux/input-event-codes.h, so profiles can say
+# "EV_KEY" instead of 1.  Same values as evdev.ecodes.
+event_types = {"EV_SYN": 0, "EV_KEY": 1, "EV_REL": 2, "EV_ABS": 3}
+
+#################################
+# Action codes
+#   Decoded events are small ints rather than strings.  action_names maps
+#   them back onto the strings gamepad_parse() has always returned.
+#################################
+ACTION_NONE = 0
+ACTION_UP = 1
+ACTION_DOWN = 2
+ACTION_LEFT = 3
+ACTION_RIGHT = 4
+ACTION_X = 5
+ACTION_Y = 6
+ACTION_A = 7
+ACTION_B = 8
+ACTION_SELECT = 9
+ACTION_START = 10
+ACTION_RIGHT_BUMPER = 11
+ACTION_LEFT_BUMPER = 12
+
+action_names = ["No Input", "D-up", "D-down", "D-left", "D-right",
+                "X", "Y", "A", "B", "Select", "Start",
+                "Right-bumper", "Left-bumper"]
+
+action_codes = dict((name, code) for code, name in enumerate(action_names))
+
+#################################
+# Mapping profiles
+#   gamepad_profiles.json maps (event type, code, value) onto action names
+#   for each kind of controller we know about.  Each profile has a "match"
+#   section (name substring, vendor and/or product id); an empty match
+#   means "anything", and is used when nothing more specific fits.
+#   Everything gets compiled into lookup dicts once, when this is imported.
+#################################
+profile_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gamepad_profiles.json")
+
+def load_profiles(path):
+  with open(path) as f:
+    raw = json.load(f)
+
+  profiles = []
+  for profile_name in sorted(raw):
+    profile = raw[profile_name]
+    table = {}
+    for type_name, code, value, action in profile["events"]:
+      table[(event_types[type_name], code, value)] = action_codes[action]
+    profiles.append((profile_name, profile.get("match", {}), table))
+
+  # specific matches get checked before the catch-all ones.
+  profiles.sort(key=lambda p: len(p[1]) == 0)
+  return profiles
+
+profiles = load_profiles(profile_file)
+
+###################################
+# profile_for()
+#   finds the decode table for a gamepad.
+###################################
+def profile_for(gamepad):
+  for profile_name, match, table in profiles:
+    if ("name" in match) and (match["name"] not in gamepad.name):
+      continue
+    if ("vendor" in match) and (match["vendor"] != gamepad.info.vendor):
+      continue
+    if ("product" in match) and (match["product"] != gamepad.info.product):
+      continue
+    return table
+
+  print("No gamepad profile matches " + gamepad.name)
+  return {}
+
+# used by gamepad_parse(), which doesn't know which device an event came from.
+default_table = profiles[-1][2]
+
+#################################
+# decode
+#   turns a single event into an action code using one of the tables.
+#################################
+def decode(table, event):
+  return table.get((event.type, event.code, event.value), ACTION_NONE)
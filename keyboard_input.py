@@ -0,0 +1,140 @@
+#################################################
+# keyboard_input.py - both players on one keyboard
+#
+# Reading stdin one string at a time and comparing it with a key loses
+# presses:  two players hitting keys in the same tick come back as "iw",
+# which isn't either of them.  Instead the terminal is put in cbreak mode
+# (no line buffering, no echo), wait() sleeps in select() until a key
+# comes in or the timeout is up, and whatever bytes are waiting get split
+# into a queue per player through the key map.  read_all() hands a
+# player's queue back as (timestamp, action) tuples, same as
+# dual_gamepad.gamepad0_read_all(), so the presses can go straight into a
+# TurnBuffer.
+#
+# The terminal gets put back by close(), on the way out of a with block,
+# at exit, or on SIGTERM, whichever comes first.
+#################################################
+
+import atexit
+import os
+import select
+import signal
+import sys
+import termios
+import time
+
+from gamepad_profiles import ACTION_UP, ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT
+
+# key -> (player, action)
+default_keymap = {
+  "i": (0, ACTION_UP), "j": (0, ACTION_LEFT), "k": (0, ACTION_DOWN), "l": (0, ACTION_RIGHT),
+  "w": (1, ACTION_UP), "a": (1, ACTION_LEFT), "s": (1, ACTION_DOWN), "d": (1, ACTION_RIGHT),
+}
+
+class KeyboardInput(object):
+
+  def __init__(self, keymap=default_keymap, players=2, stream=None):
+    if stream is None:
+      stream = sys.stdin
+    self.fd = stream.fileno()
+    self.queues = [[] for player in range(players)]
+
+    # by byte value, since that's what comes off the fd
+    self.lookup = {}
+    for key in keymap:
+      self.lookup[ord(key)] = keymap[key]
+
+    self.old_attributes = None
+    self.old_sigterm = None
+    self.eof = False
+    self.open()
+
+  ###################################
+  # open()
+  #   cbreak mode:  keys show up as soon as they're pressed and don't get
+  #   echoed.  Ctrl-C still works.
+  ###################################
+  def open(self):
+    if not os.isatty(self.fd):
+      return
+    self.old_attributes = termios.tcgetattr(self.fd)
+    attributes = termios.tcgetattr(self.fd)
+    attributes[3] = attributes[3] & ~(termios.ICANON | termios.ECHO)
+    attributes[6][termios.VMIN] = 1
+    attributes[6][termios.VTIME] = 0
+    termios.tcsetattr(self.fd, termios.TCSANOW, attributes)
+
+    atexit.register(self.close)
+    if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+      self.old_sigterm = signal.SIG_DFL
+      signal.signal(signal.SIGTERM, self.terminated)
+
+  def terminated(self, signum, frame):
+    # turn it into a normal exit so finally blocks and atexit get to run
+    raise SystemExit(128 + signum)
+
+  def close(self):
+    if self.old_attributes is not None:
+      termios.tcsetattr(self.fd, termios.TCSANOW, self.old_attributes)
+      self.old_attributes = None
+    if self.old_sigterm is not None:
+      signal.signal(signal.SIGTERM, self.old_sigterm)
+      self.old_sigterm = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  ###################################
+  # wait()
+  #   sleeps until a key comes in or timeout seconds are up (None for
+  #   forever), and queues up everything that's waiting.  Returns the
+  #   list of players that have something queued.
+  ###################################
+  def wait(self, timeout):
+    if self.eof:
+      # nothing more is ever coming...just sleep
+      if timeout is not None:
+        time.sleep(timeout)
+      return []
+
+    try:
+      ready, _, _ = select.select([self.fd], [], [], timeout)
+    except select.error:
+      # interrupted by a signal...just treat it like a timeout.
+      ready = []
+    if ready:
+      self.drain()
+    return [player for player in range(len(self.queues)) if self.queues[player]]
+
+  ###################################
+  # drain()
+  #   one read() gets everything the terminal has for us, since select()
+  #   says there's at least a byte there.
+  ###################################
+  def drain(self):
+    data = os.read(self.fd, 1024)
+    if not data:
+      self.eof = True
+      return
+    now = time.time()
+    lookup = self.lookup
+    queues = self.queues
+    for byte in bytearray(data):
+      if byte in lookup:
+        player, action = lookup[byte]
+        if player < len(queues):
+          queues[player].append((now, action))
+
+  ###################################
+  # read_all()
+  #   player's presses since last time, oldest first.  Picks up anything
+  #   waiting on the terminal first, without blocking.
+  ###################################
+  def read_all(self, player):
+    self.wait(0)
+    actions = self.queues[player]
+    self.queues[player] = []
+    return actions
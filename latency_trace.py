@@ -0,0 +1,136 @@
+#################################################
+# latency_trace.py - where the time goes between a button and a pixel
+#
+# Per-phase latency histograms for the game loop:
+#
+#   input_wait      kernel event timestamp -> we read it
+#   decode          reading + decoding everything queued on the gamepads
+#   simulate        one engine step
+#   render          drawing the tick's events + the frame swap
+#   sleep           time blocked waiting for input or the next tick
+#   input_to_pixel  kernel event timestamp -> frame with that turn swapped in
+#
+# evdev timestamps come from the wall clock, so input_wait and
+# input_to_pixel are measured against time.time().
+#
+# The tracer is always there, but the game loop only calls it when
+# tracer.enabled is set, so leaving tracing off costs one test per tick.
+#################################################
+
+phases = ["input_wait", "decode", "simulate", "render", "sleep", "input_to_pixel"]
+
+###################################
+# Histogram
+#   log2 buckets in microseconds:  bucket n holds [2^n, 2^(n+1)) us, with
+#   everything under 1us in bucket 0.  Cheap to add to, and plenty of
+#   resolution to see whether something is 100us or 10ms.
+###################################
+class Histogram(object):
+
+  bucket_count = 32
+
+  def __init__(self):
+    self.reset()
+
+  def reset(self):
+    self.buckets = [0] * self.bucket_count
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def add(self, seconds):
+    usec = int(seconds * 1e6)
+    if usec < 1:
+      bucket = 0
+    else:
+      bucket = min(usec.bit_length() - 1, self.bucket_count - 1)
+    self.buckets[bucket] += 1
+    self.count += 1
+    self.total += seconds
+    if seconds > self.max:
+      self.max = seconds
+
+  ###################################
+  # merge()
+  #   adds another histogram's samples into this one.
+  ###################################
+  def merge(self, other):
+    for bucket in range(self.bucket_count):
+      self.buckets[bucket] += other.buckets[bucket]
+    self.count += other.count
+    self.total += other.total
+    if other.max > self.max:
+      self.max = other.max
+
+  ###################################
+  # percentile()
+  #   upper edge (in seconds) of the bucket holding the p'th percentile.
+  ###################################
+  def percentile(self, p):
+    if self.count == 0:
+      return 0.0
+    wanted = self.count * p / 100.0
+    seen = 0
+    for bucket in range(self.bucket_count):
+      seen += self.buckets[bucket]
+      if seen >= wanted:
+        return min((2 ** (bucket + 1)) / 1e6, self.max)
+    return self.max
+
+  def summary(self):
+    if self.count == 0:
+      return "no samples"
+    return "n=%d avg=%.2fms p50<=%.2fms p99<=%.2fms max=%.2fms" % (
+      self.count, self.total / self.count * 1000.0,
+      self.percentile(50) * 1000.0, self.percentile(99) * 1000.0, self.max * 1000.0)
+
+  ###################################
+  # bars()
+  #   one line per non-empty bucket, with a little text bar chart.
+  ###################################
+  def bars(self, width=40):
+    lines = []
+    biggest = max(self.buckets)
+    for bucket in range(self.bucket_count):
+      if self.buckets[bucket] == 0:
+        continue
+      bar = "#" * max(1, self.buckets[bucket] * width // biggest)
+      lines.append("  %8dus %6d %s" % (2 ** bucket, self.buckets[bucket], bar))
+    return lines
+
+class LatencyTracer(object):
+
+  def __init__(self, enabled=False, path=None):
+    self.enabled = enabled
+    self.path = path
+    self.histograms = dict((phase, Histogram()) for phase in phases)
+
+  def record(self, phase, seconds):
+    self.histograms[phase].add(seconds)
+
+  def reset(self):
+    for phase in phases:
+      self.histograms[phase].reset()
+
+  def report(self, title="latency"):
+    lines = ["---- %s ----" % title]
+    for phase in phases:
+      histogram = self.histograms[phase]
+      lines.append("%-15s %s" % (phase, histogram.summary()))
+      lines.extend(histogram.bars())
+    return "\n".join(lines)
+
+  ###################################
+  # end_round()
+  #   prints the round's histograms (and appends them to the trace file,
+  #   if there is one), then starts fresh for the next round.
+  ###################################
+  def end_round(self, title="round"):
+    if not self.enabled:
+      return
+    text = self.report(title)
+    print(text)
+    if self.path:
+      with open(self.path, "a") as f:
+        f.write(text + "\n")
+    self.reset()
@@ -0,0 +1,199 @@
+#################################################
+# net_client.py - simulated network clients
+#
+# Connects any number of fake players and spectators to a net_server.py
+# and plays for a few rounds.  Each client keeps its own copy of the
+# playfield from the tick deltas, which doubles as a check on the
+# server:  a move onto a cell the client already has filled in means a
+# delta went missing or arrived out of order.
+#
+# Players turn at random, but never straight into something they can
+# see.  Needs Python 3 (asyncio).
+#
+#   python3 net_client.py --host pi.local --players 2 --spectators 20 --rounds 5
+#
+# Prints how evenly the ticks arrived (the gap between them should sit
+# right on the server's tick time) and any mismatches.
+#################################################
+
+import argparse
+import asyncio
+import random
+
+from collision_grid import CollisionGrid
+from engine import EVENT_MOVE
+from latency_trace import Histogram
+from tick_scheduler import monotonic
+from net_protocol import FrameReader, message_type, NO_SEAT, ROLE_PLAYER, ROLE_SPECTATOR
+from net_protocol import MSG_WELCOME, MSG_START, MSG_TICK, MSG_END
+from net_protocol import encode_hello, encode_turn, encode_udp_turn
+from net_protocol import decode_welcome, decode_start, decode_tick, decode_end
+
+class SimClient(asyncio.Protocol):
+
+  def __init__(self, role, rounds, rng, turn_chance=0.1, udp=None):
+    self.role = role
+    self.rounds = rounds
+    self.rng = rng
+    self.turn_chance = turn_chance
+    self.udp = udp
+
+    self.reader = FrameReader()
+    self.transport = None
+    self.done = asyncio.get_event_loop().create_future()
+
+    self.seat = NO_SEAT
+    self.token = 0
+    self.grid = None
+    self.heads = []
+    self.dirs = []
+    self.alive = False
+
+    self.rounds_seen = 0
+    self.ticks = 0
+    self.mismatches = 0
+    self.last_tick_time = None
+    self.tick_gaps = Histogram()
+
+  def connection_made(self, transport):
+    self.transport = transport
+    transport.write(encode_hello(self.role))
+
+  def connection_lost(self, exc):
+    if not self.done.done():
+      self.done.set_result(False)
+
+  def data_received(self, data):
+    for payload in self.reader.feed(data):
+      kind = message_type(payload)
+      if kind == MSG_WELCOME:
+        self.seat, self.token, width, height, players, tick_seconds = decode_welcome(payload)
+        self.grid = CollisionGrid(width, height)
+      elif kind == MSG_START:
+        self.start_round(decode_start(payload)[1])
+      elif kind == MSG_TICK:
+        self.tick(*decode_tick(payload))
+      elif kind == MSG_END:
+        decode_end(payload)
+        self.rounds_seen += 1
+        self.last_tick_time = None
+        if self.rounds_seen >= self.rounds:
+          self.done.set_result(True)
+          self.transport.close()
+
+  def start_round(self, starts):
+    grid = self.grid
+    grid.reset()
+    self.heads = []
+    self.dirs = []
+    for start_x, start_y, start_dir in starts:
+      index = grid.index(start_x, start_y)
+      grid.test_and_set(index)
+      self.heads.append(index)
+      self.dirs.append(start_dir)
+    self.alive = self.seat != NO_SEAT
+
+  def tick(self, tick_number, events):
+    now = monotonic()
+    if self.last_tick_time is not None:
+      self.tick_gaps.add(now - self.last_tick_time)
+    self.last_tick_time = now
+    self.ticks += 1
+
+    grid = self.grid
+    for kind, player, x, y in events:
+      index = grid.index(x, y)
+      if kind == EVENT_MOVE:
+        if grid.test_and_set(index):
+          self.mismatches += 1
+        step = index - self.heads[player]
+        if step in grid.step:
+          self.dirs[player] = grid.step.index(step)
+        self.heads[player] = index
+      else:
+        grid.test_and_set(index)
+        if player == self.seat:
+          self.alive = False
+
+    if self.alive:
+      self.steer()
+
+  ###################################
+  # steer()
+  #   Turns now and then, and always when the way ahead is blocked.
+  ###################################
+  def steer(self):
+    grid = self.grid
+    head = self.heads[self.seat]
+    current = self.dirs[self.seat]
+    open_dirs = [d for d in range(4) if (d != current ^ 2) and not grid.cells[head + grid.step[d]]]
+    if not open_dirs:
+      return
+    if (current in open_dirs) and (self.rng.random() >= self.turn_chance):
+      return
+    direction = self.rng.choice(open_dirs)
+    if direction == current:
+      return
+    if self.udp is not None:
+      self.udp.sendto(encode_udp_turn(self.token, direction))
+    else:
+      self.transport.write(encode_turn(direction))
+
+###################################
+# run_clients()
+#   Connects everybody, waits until they've all seen rounds rounds, and
+#   prints what they saw.
+###################################
+async def run_clients(host, port, players, spectators, rounds, udp=False, seed=0):
+  loop = asyncio.get_event_loop()
+  clients = []
+  udp_transports = []
+  for number in range(players + spectators):
+    role = ROLE_PLAYER
+    if number >= players:
+      role = ROLE_SPECTATOR
+    udp_transport = None
+    if udp and (role == ROLE_PLAYER):
+      udp_transport, protocol = await loop.create_datagram_endpoint(asyncio.DatagramProtocol,
+                                                                   remote_addr=(host, port))
+      udp_transports.append(udp_transport)
+    client = SimClient(role, rounds, random.Random(seed + number), udp=udp_transport)
+    await loop.create_connection(lambda: client, host, port)
+    clients.append(client)
+
+  await asyncio.gather(*[client.done for client in clients])
+  for udp_transport in udp_transports:
+    udp_transport.close()
+
+  gaps = Histogram()
+  ticks = 0
+  mismatches = 0
+  finished = 0
+  for client in clients:
+    ticks += client.ticks
+    mismatches += client.mismatches
+    if client.rounds_seen >= rounds:
+      finished += 1
+    gaps.merge(client.tick_gaps)
+
+  print("%d players, %d spectators:  %d/%d finished, %d ticks received, %d mismatches" % (
+    players, spectators, finished, len(clients), ticks, mismatches))
+  print("tick gaps " + gaps.summary())
+  return mismatches == 0
+
+def main():
+  parser = argparse.ArgumentParser(description="Simulated players and spectators for net_server.py.")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=4242)
+  parser.add_argument("--players", type=int, default=2)
+  parser.add_argument("--spectators", type=int, default=0)
+  parser.add_argument("--rounds", type=int, default=1)
+  parser.add_argument("--udp", action="store_true", help="send turns over UDP")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  asyncio.run(run_clients(args.host, args.port, args.players, args.spectators,
+                          args.rounds, args.udp, args.seed))
+
+if __name__ == "__main__":
+  main()
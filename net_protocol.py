@@ -0,0 +1,157 @@
+#################################################
+# net_protocol.py - what goes over the wire for network games
+#
+# Every message is a 2 byte length followed by that many bytes of
+# payload, and every payload starts with a one byte message type.  All
+# numbers are little endian.
+#
+#   client -> server
+#     HELLO    role(B)                   ROLE_PLAYER or ROLE_SPECTATOR
+#     TURN     direction(B)              over the TCP connection, or...
+#     TURN     token(I) direction(B)     ...as a bare UDP datagram (no
+#                                        length prefix)
+#
+#   server -> client
+#     WELCOME  seat(B) token(I) width(H) height(H) players(B) tick_ms(H)
+#              seat is NO_SEAT for spectators.  token is for UDP turns.
+#     START    round(I) players(B), then players x  x(H) y(H) dir(B)
+#     TICK     tick(I) count(B), then count x  kind_player(B) x(H) y(H)
+#              kind_player is the engine event (EVENT_MOVE or
+#              EVENT_CRASH) << 4 | player, so at most 16 players
+#     END      winner(B)                 NO_SEAT for a tie
+#
+# A tick is only the cells that changed, so it's a few bytes per rider
+# no matter how big the playfield is.  The server encodes each tick once
+# and sends the same bytes to everybody.
+#################################################
+
+import struct
+
+from engine import EVENT_MOVE, EVENT_CRASH
+
+MSG_HELLO = 1
+MSG_WELCOME = 2
+MSG_TURN = 3
+MSG_START = 4
+MSG_TICK = 5
+MSG_END = 6
+
+ROLE_PLAYER = 0
+ROLE_SPECTATOR = 1
+
+NO_SEAT = 255
+
+length_prefix = struct.Struct("<H")
+msg_type = struct.Struct("<B")
+hello = struct.Struct("<BB")
+welcome = struct.Struct("<BBIHHBH")
+turn = struct.Struct("<BB")
+udp_turn = struct.Struct("<BIB")
+start = struct.Struct("<BIB")
+start_entry = struct.Struct("<HHB")
+tick = struct.Struct("<BIB")
+tick_event = struct.Struct("<BHH")
+end = struct.Struct("<BB")
+
+def frame(payload):
+  return length_prefix.pack(len(payload)) + payload
+
+def message_type(payload):
+  return msg_type.unpack_from(payload, 0)[0]
+
+###################################
+# encode_ / decode_ helpers
+#   encode_ ones return a whole framed message, ready to write.  decode_
+#   ones take a payload (length prefix already stripped).
+###################################
+def encode_hello(role):
+  return frame(hello.pack(MSG_HELLO, role))
+
+def encode_welcome(seat, token, width, height, players, tick_seconds):
+  return frame(welcome.pack(MSG_WELCOME, seat, token, width, height, players,
+                            int(round(tick_seconds * 1000))))
+
+def decode_welcome(payload):
+  kind, seat, token, width, height, players, tick_ms = welcome.unpack(payload)
+  return seat, token, width, height, players, tick_ms / 1000.0
+
+def encode_turn(direction):
+  return frame(turn.pack(MSG_TURN, direction))
+
+def encode_udp_turn(token, direction):
+  return udp_turn.pack(MSG_TURN, token, direction)
+
+def encode_start(round_number, starts):
+  parts = [start.pack(MSG_START, round_number, len(starts))]
+  for start_x, start_y, start_dir in starts:
+    parts.append(start_entry.pack(start_x, start_y, start_dir))
+  return frame(b"".join(parts))
+
+def decode_start(payload):
+  kind, round_number, players = start.unpack_from(payload, 0)
+  offset = start.size
+  starts = []
+  for player in range(players):
+    starts.append(start_entry.unpack_from(payload, offset))
+    offset += start_entry.size
+  return round_number, starts
+
+###################################
+# encode_tick()
+#   events are the engine's; only moves and crashes go out, the win/tie
+#   event becomes an END message.
+###################################
+def encode_tick(tick_number, events):
+  parts = [b""]
+  count = 0
+  for event in events:
+    if event[0] in (EVENT_MOVE, EVENT_CRASH):
+      parts.append(tick_event.pack((event[0] << 4) | event[1], event[2], event[3]))
+      count += 1
+  parts[0] = tick.pack(MSG_TICK, tick_number, count)
+  return frame(b"".join(parts))
+
+def decode_tick(payload):
+  kind, tick_number, count = tick.unpack_from(payload, 0)
+  offset = tick.size
+  events = []
+  for i in range(count):
+    kind_player, x, y = tick_event.unpack_from(payload, offset)
+    offset += tick_event.size
+    events.append((kind_player >> 4, kind_player & 0xf, x, y))
+  return tick_number, events
+
+def encode_end(winner):
+  if winner is None:
+    winner = NO_SEAT
+  return frame(end.pack(MSG_END, winner))
+
+def decode_end(payload):
+  winner = end.unpack(payload)[1]
+  if winner == NO_SEAT:
+    return None
+  return winner
+
+###################################
+# FrameReader
+#   Collects stream bytes and hands back whole payloads as they complete.
+###################################
+class FrameReader(object):
+
+  def __init__(self):
+    self.buffer = bytearray()
+
+  def feed(self, data):
+    buffer = self.buffer
+    buffer += data
+    payloads = []
+    offset = 0
+    while len(buffer) - offset >= length_prefix.size:
+      size = length_prefix.unpack_from(buffer, offset)[0]
+      end_offset = offset + length_prefix.size + size
+      if end_offset > len(buffer):
+        break
+      payloads.append(bytes(buffer[offset + length_prefix.size:end_offset]))
+      offset = end_offset
+    del buffer[:offset]
+    return payloads
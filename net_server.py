@@ -0,0 +1,316 @@
+#################################################
+# net_server.py - network multiplayer server
+#
+# Runs the authoritative engine and tick loop, and lets players (and any
+# number of spectators) in over the network instead of plugging gamepads
+# into the Pi.  Wire format is in net_protocol.py.
+#
+#   TCP   connect, HELLO, then a stream of START / TICK / END messages.
+#         Players can send their turns back on the same connection...
+#   UDP   ...or as datagrams to the same port, using the token from their
+#         WELCOME.
+#
+# Every tick is encoded once (just the new cells and crashes) and written
+# to each client in one go.  A client that can't keep up and lets its
+# send buffer fill gets dropped rather than slowing the tick loop down.
+# Somebody joining partway through a round gets the round so far as one
+# batch, so they're caught up before the next tick.
+#
+# Needs Python 3 (asyncio).
+#
+#   python3 net_server.py --port 4242 --players 2
+#   python3 net_server.py --players 4 --fill-bots
+#
+# Bots in empty seats think in worker processes (bot_pool.py), so a slow
+# decision never holds up the event loop.  One that isn't back in time
+# just keeps its bot going straight for that tick.
+#
+# --loopback-players / --loopback-spectators start simulated clients
+# (net_client.py) against the server over localhost, for testing it end
+# to end without any other machines:
+#
+#   python3 net_server.py --loopback-players 4 --loopback-spectators 50 --rounds 3
+#################################################
+
+import argparse
+import asyncio
+import random
+import time
+
+from engine import CyclesEngine, default_starts
+from turn_buffer import TurnBuffer
+from tick_scheduler import TickScheduler
+from bot import direction_actions
+from bot_pool import BotPool
+from net_protocol import FrameReader, message_type, hello, turn, udp_turn
+from net_protocol import MSG_HELLO, MSG_TURN, ROLE_PLAYER, NO_SEAT
+from net_protocol import encode_welcome, encode_start, encode_tick, encode_end
+
+# the other way round from bot.direction_actions
+action_dirs = dict((action, direction) for direction, action in enumerate(direction_actions))
+
+###################################
+# ClientConnection
+#   One TCP client.  Just unpacks messages and hands them to the server.
+###################################
+class ClientConnection(asyncio.Protocol):
+
+  def __init__(self, server):
+    self.server = server
+    self.transport = None
+    self.reader = FrameReader()
+    self.seat = None
+    self.joined = False
+
+  def connection_made(self, transport):
+    self.transport = transport
+
+  def data_received(self, data):
+    for payload in self.reader.feed(data):
+      kind = message_type(payload)
+      if (kind == MSG_HELLO) and (len(payload) == hello.size) and not self.joined:
+        self.server.join(self, hello.unpack(payload)[1])
+      elif (kind == MSG_TURN) and (len(payload) == turn.size) and (self.seat is not None):
+        self.server.turn(self.seat, turn.unpack(payload)[1])
+
+  def connection_lost(self, exc):
+    self.server.leave(self)
+
+###################################
+# TurnDatagrams
+#   UDP turns.  Anything that isn't a turn with a live token is ignored.
+###################################
+class TurnDatagrams(asyncio.DatagramProtocol):
+
+  def __init__(self, server):
+    self.server = server
+
+  def datagram_received(self, data, addr):
+    if len(data) != udp_turn.size:
+      return
+    kind, token, direction = udp_turn.unpack(data)
+    seat = self.server.tokens.get(token)
+    if (kind == MSG_TURN) and (seat is not None):
+      self.server.turn(seat, direction)
+
+class CyclesServer(object):
+
+  ###################################
+  # max_buffer is how many bytes can be waiting to go out to one client
+  # before we give up on it.
+  ###################################
+  def __init__(self, width, height, players, tick_seconds, fill_bots=False,
+               round_pause=3.0, bot_budget=0.01, max_buffer=64 * 1024):
+    self.engine = CyclesEngine(width, height, default_starts(width, height, players))
+    self.tick_seconds = tick_seconds
+    self.fill_bots = fill_bots
+    self.round_pause = round_pause
+    self.max_buffer = max_buffer
+
+    self.seats = [None] * players
+    self.tokens = {}
+    self.clients = []
+    self.turn_buffers = [TurnBuffer(self.engine.dirs[seat]) for seat in range(players)]
+    self.bot_pool = None
+    if fill_bots:
+      self.bot_pool = BotPool(self.engine, list(range(players)), bot_budget)
+    self.seats_changed = asyncio.Event()
+
+    # everything sent so far this round, for anyone joining late
+    self.history = bytearray()
+    self.round_number = 0
+    self.dropped = 0
+
+  ###################################
+  # join()
+  #   Players get the first free seat, or end up spectating if there
+  #   isn't one.
+  ###################################
+  def join(self, connection, role):
+    engine = self.engine
+    connection.joined = True
+    seat = NO_SEAT
+    token = 0
+    if role == ROLE_PLAYER:
+      for free in range(engine.players):
+        if self.seats[free] is None:
+          seat = free
+          token = random.getrandbits(32)
+          self.seats[free] = connection
+          self.tokens[token] = free
+          connection.seat = free
+          connection.token = token
+          self.seats_changed.set()
+          break
+
+    connection.transport.write(encode_welcome(seat, token, engine.width, engine.height,
+                                              engine.players, self.tick_seconds) + bytes(self.history))
+    self.clients.append(connection)
+
+  def leave(self, connection):
+    if connection in self.clients:
+      self.clients.remove(connection)
+    if connection.seat is not None:
+      self.seats[connection.seat] = None
+      del self.tokens[connection.token]
+      connection.seat = None
+      self.seats_changed.set()
+
+  def turn(self, seat, direction):
+    if 0 <= direction < 4:
+      self.turn_buffers[seat].push(direction, time.time())
+
+  ###################################
+  # broadcast()
+  #   One write per client.  Slow clients get cut off.
+  ###################################
+  def broadcast(self, data):
+    max_buffer = self.max_buffer
+    for client in list(self.clients):
+      transport = client.transport
+      if transport.get_write_buffer_size() > max_buffer:
+        self.dropped += 1
+        transport.abort()
+        self.leave(client)
+      else:
+        transport.write(data)
+
+  ###################################
+  # ask_bots()
+  #   Empty seats' bots pick up any answers that are back for this tick
+  #   and send off the board for the next one.  Never waits.
+  ###################################
+  def ask_bots(self):
+    for bot in self.bot_pool.bots:
+      seat = bot.player
+      if self.seats[seat] is not None:
+        continue
+      for timestamp, action in bot.read_all():
+        self.turn_buffers[seat].push(action_dirs[action], timestamp)
+
+  def close(self):
+    if self.bot_pool is not None:
+      self.bot_pool.close()
+      self.bot_pool = None
+
+  def seats_ready(self):
+    if self.fill_bots:
+      return [seat for seat in self.seats if seat is not None] != []
+    return None not in self.seats
+
+  ###################################
+  # run()
+  #   Plays rounds back to back (as long as there's somebody to play),
+  #   rounds of them or forever if that's None.
+  ###################################
+  async def run(self, rounds=None):
+    while (rounds is None) or (self.round_number < rounds):
+      while not self.seats_ready():
+        self.seats_changed.clear()
+        await self.seats_changed.wait()
+      await self.play_round()
+      await asyncio.sleep(self.round_pause)
+
+  async def play_round(self):
+    engine = self.engine
+    self.round_number += 1
+    engine.reset()
+    for seat in range(engine.players):
+      self.turn_buffers[seat].reset(engine.dirs[seat])
+
+    del self.history[:]
+    data = encode_start(self.round_number, engine.starts)
+    self.history += data
+    self.broadcast(data)
+
+    scheduler = TickScheduler(1.0 / self.tick_seconds)
+    sent = 0
+    if self.bot_pool is not None:
+      self.ask_bots()
+    while not engine.game_over:
+      delay = scheduler.time_until_tick()
+      if delay > 0:
+        await asyncio.sleep(delay)
+      if not scheduler.tick_due():
+        continue
+
+      # empty seats get a bot, or just keep going straight
+      if self.bot_pool is not None:
+        self.ask_bots()
+
+      events = engine.step([turns.pop() for turns in self.turn_buffers])
+      if self.bot_pool is not None:
+        self.ask_bots()
+      data = encode_tick(engine.tick, events)
+      if engine.game_over:
+        data += encode_end(engine.winner)
+      self.history += data
+      self.broadcast(data)
+      sent += len(data) * len(self.clients)
+
+    if engine.winner is None:
+      result = "tie"
+    else:
+      result = "player %d wins" % (engine.winner + 1)
+    print("Round %d: %s after %d ticks, %d clients, %.0f bytes/tick sent, %d dropped" % (
+      self.round_number, result, engine.tick, len(self.clients), float(sent) / engine.tick, self.dropped))
+    print("Tick stats: " + scheduler.stats())
+    if self.bot_pool is not None:
+      self.bot_pool.end_round()
+
+async def serve(args):
+  loop = asyncio.get_event_loop()
+  server = CyclesServer(args.width, args.height, args.players, args.tick, args.fill_bots, args.round_pause)
+
+  host = args.host
+  port = args.port
+  if args.loopback_players or args.loopback_spectators:
+    host = "127.0.0.1"
+
+  listener = await loop.create_server(lambda: ClientConnection(server), host, port)
+  port = listener.sockets[0].getsockname()[1]
+  datagrams, protocol = await loop.create_datagram_endpoint(lambda: TurnDatagrams(server),
+                                                           local_addr=(host, port))
+  print("Listening on %s:%d (TCP and UDP)" % (host, port))
+
+  try:
+    if args.loopback_players or args.loopback_spectators:
+      from net_client import run_clients
+      await asyncio.gather(server.run(args.rounds),
+                           run_clients(host, port, args.loopback_players, args.loopback_spectators,
+                                       args.rounds, udp=args.udp))
+    else:
+      await server.run(args.rounds)
+  finally:
+    listener.close()
+    datagrams.close()
+    server.close()
+
+def main():
+  parser = argparse.ArgumentParser(description="Network light cycle server.")
+  parser.add_argument("--host", default="0.0.0.0")
+  parser.add_argument("--port", type=int, default=4242)
+  parser.add_argument("--width", type=int, default=64)
+  parser.add_argument("--height", type=int, default=64)
+  parser.add_argument("--players", type=int, default=2)
+  parser.add_argument("--tick", type=float, default=0.1, help="seconds per tick")
+  parser.add_argument("--fill-bots", action="store_true",
+                      help="start as soon as one player is in, with bots in the empty seats")
+  parser.add_argument("--round-pause", type=float, default=3.0, help="seconds between rounds")
+  parser.add_argument("--rounds", type=int, help="stop after this many rounds")
+  parser.add_argument("--loopback-players", type=int, default=0,
+                      help="simulated players to connect over localhost")
+  parser.add_argument("--loopback-spectators", type=int, default=0,
+                      help="simulated spectators to connect over localhost")
+  parser.add_argument("--udp", action="store_true", help="simulated players send turns over UDP")
+  args = parser.parse_args()
+
+  if not (1 <= args.players <= 16):
+    parser.error("--players must be between 1 and 16")
+  if (args.loopback_players or args.loopback_spectators) and (args.rounds is None):
+    args.rounds = 1
+
+  asyncio.run(serve(args))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,131 @@
+#################################################
+# renderer.py - batched frame composition for the RGB matrix
+#
+# Keeps one persistent full-panel frame.  Drawing calls only touch that
+# frame and remember which cells changed; present() pushes the changes
+# to the matrix's offscreen canvas in one batch and swaps it in on vsync.
+#
+# The matrix is double buffered, so the canvas we get back from a swap
+# is the one we drew the frame *before* last.  That means each present
+# has to replay the cells from the previous present as well as its own.
+#
+# Anything else that wants the frames (the spectator stream) can add a
+# tap, which present() calls with the cells that changed.
+#################################################
+
+from PIL import Image, ImageDraw
+
+class FrameRenderer(object):
+
+  def __init__(self, matrix, width, height):
+    self.matrix = matrix
+    self.width = width
+    self.height = height
+
+    self.frame = Image.new("RGB", (width, height))
+    self.pixels = self.frame.load()
+    self.draw = ImageDraw.Draw(self.frame)
+
+    self.canvas = matrix.CreateFrameCanvas()
+
+    # cells changed since the last present, and during the one before it.
+    self.dirty = []
+    self.stale = []
+
+    # how many more presents need to push the whole frame (one per buffer).
+    self.full_redraw = 2
+
+    self.taps = []
+
+  ###################################
+  # add_tap()
+  #   tap(pixels, cells) gets called on every present() with the frame's
+  #   pixel access object and the list of x,y cells changed since the
+  #   last one (maybe with repeats), or None if the whole frame changed.
+  ###################################
+  def add_tap(self, tap):
+    self.taps.append(tap)
+
+  ###################################
+  # set_pixel()
+  #   color is an (r,g,b) tuple.
+  ###################################
+  def set_pixel(self, x, y, color):
+    self.pixels[x, y] = color
+    self.dirty.append((x, y))
+
+  ###################################
+  # clear()
+  #   blanks the whole frame.
+  ###################################
+  def clear(self):
+    self.frame.paste((0, 0, 0), (0, 0, self.width, self.height))
+    self.full_redraw = 2
+
+  ###################################
+  # draw_box()
+  #   outlines the edge of the panel...used for the walls.
+  ###################################
+  def draw_box(self, color):
+    self.draw.rectangle((0, 0, self.width - 1, self.height - 1), outline=color)
+    self.full_redraw = 2
+
+  ###################################
+  # draw_image()
+  #   copies a PIL image into the frame with its top left corner at x,y.
+  #   Full-panel images just redraw everything; small ones mark their
+  #   cells dirty.
+  ###################################
+  def draw_image(self, image, x=0, y=0):
+    self.frame.paste(image, (x, y))
+
+    image_width, image_height = image.size
+    if (image_width >= self.width) & (image_height >= self.height):
+      self.full_redraw = 2
+      return
+
+    for cell_y in range(max(y, 0), min(y + image_height, self.height)):
+      for cell_x in range(max(x, 0), min(x + image_width, self.width)):
+        self.dirty.append((cell_x, cell_y))
+
+  ###################################
+  # draw_frame()
+  #   replaces the whole frame with width x height RGB bytes (anything
+  #   with the buffer interface will do, like a NumPy array).  cells is
+  #   the list of x,y that are different from the frame being replaced,
+  #   if the caller knows, or None to redraw everything.
+  ###################################
+  def draw_frame(self, rgb, cells=None):
+    self.frame.frombytes(rgb)
+    if cells is None:
+      self.full_redraw = 2
+    else:
+      self.dirty.extend(cells)
+
+  ###################################
+  # present()
+  #   pushes this frame's changes to the back buffer and swaps it in.
+  ###################################
+  def present(self):
+    canvas = self.canvas
+
+    if self.taps:
+      cells = self.dirty
+      if self.full_redraw == 2:
+        cells = None
+      for tap in self.taps:
+        tap(self.pixels, cells)
+
+    if self.full_redraw:
+      canvas.SetImage(self.frame, 0, 0)
+      self.full_redraw -= 1
+    else:
+      pixels = self.pixels
+      for cells in (self.stale, self.dirty):
+        for x, y in cells:
+          r, g, b = pixels[x, y]
+          canvas.SetPixel(x, y, r, g, b)
+
+    self.canvas = self.matrix.SwapOnVSync(canvas)
+    self.stale = self.dirty
+    self.dirty = []
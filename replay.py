@@ -0,0 +1,463 @@
+#################################################
+# replay.py - recorded rounds, and playing them back
+#
+# The engine is deterministic, so a round is fully described by where
+# everybody started and which directions went into each step().  That's
+# all a replay file holds.
+#
+# File layout (all little endian):
+#
+#   "CYRP" version(1 byte)                      once, at the top
+#   then one block per round:
+#     "R" width(H) height(H) players(B) tick_ms(H)
+#       or, for a round with limited-length trails,
+#     "L" width(H) height(H) players(B) tick_ms(H) trail_length(H)
+#     players x  start_x(H) start_y(H) start_dir(B)
+#     records, each a varint followed by one byte:
+#       varint = ticks since the last record << 1
+#       turn:    low bit 0, byte = player << 2 | direction
+#       end:     low bit 1, byte = winner (255 for a tie)
+#
+# A turn is usually two bytes.  Rounds are built up in memory while they
+# run and appended to the file in one write when they end, so recording
+# never touches the disk mid-tick.  If that write got cut off, the reader
+# keeps every round before it, and the next writer to open the file cuts
+# the partial round off before adding any more.
+#
+# Playback memory-maps the file, indexes the rounds, and decodes and
+# re-simulates just the ones it needs with the engine.  Seeking is a
+# reset plus a fast-forward, which at a few hundred thousand ticks a
+# second is instant for any real round.
+#
+#   python replay.py cycles.replay                  list the rounds
+#   python replay.py cycles.replay --verify         re-run them all
+#   python replay.py cycles.replay --round 3 --display terminal --speed 4
+#   python replay.py cycles.replay --round 3 --seek 200 --display terminal
+#################################################
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+from engine import CyclesEngine, EVENT_MOVE, EVENT_CRASH, EVENT_ERASE
+
+magic = b"CYRP"
+version = 1
+round_marker = b"R"
+trail_round_marker = b"L"
+no_winner = 255
+
+file_header = struct.Struct("<4sB")
+round_header = struct.Struct("<cHHBH")
+start_entry = struct.Struct("<HHB")
+trail_entry = struct.Struct("<H")
+
+###################################
+# ReplayWriter
+#   start_round() when the round starts, turns() after every step(), and
+#   end_round() once it's over.  Only end_round() writes anything.
+###################################
+class ReplayWriter(object):
+
+  def __init__(self, path):
+    self.path = path
+    self.buffer = bytearray()
+    self.last_tick = 0
+    self.last_inputs = bytearray()
+
+    # bytes of a cut off round that recover() threw away
+    self.dropped = 0
+    self.recover()
+
+  ###################################
+  # recover()
+  #   Cuts the file back to the end of its last complete round, so new
+  #   rounds don't get appended after half of one.  Raises ValueError if
+  #   the file is there but isn't a replay file.
+  ###################################
+  def recover(self):
+    if not os.path.exists(self.path):
+      return
+    size = os.path.getsize(self.path)
+    if size == 0:
+      return
+
+    if size < file_header.size:
+      # even the header didn't make it
+      with open(self.path, "rb") as f:
+        start = f.read()
+      if not file_header.pack(magic, version).startswith(start):
+        raise ValueError("%s: not a version %d replay file" % (self.path, version))
+      end = 0
+    else:
+      reader = ReplayReader(self.path)
+      end = reader.end
+      reader.close()
+
+    if end < size:
+      with open(self.path, "r+b") as f:
+        f.truncate(end)
+      self.dropped = size - end
+
+  def start_round(self, engine, tick_seconds):
+    buffer = self.buffer
+    del buffer[:]
+    self.last_tick = 0
+    self.last_inputs = bytearray(start[2] for start in engine.starts)
+
+    marker = round_marker
+    if engine.trail_length:
+      marker = trail_round_marker
+    buffer += round_header.pack(marker, engine.width, engine.height,
+                                engine.players, int(round(tick_seconds * 1000)))
+    if engine.trail_length:
+      buffer += trail_entry.pack(engine.trail_length)
+    for start_x, start_y, start_dir in engine.starts:
+      buffer += start_entry.pack(start_x, start_y, start_dir)
+
+  ###################################
+  # turns()
+  #   inputs is the list that just went into engine.step() for tick.
+  #   None, or the same direction as that player's last input, can't
+  #   change anything in the engine, so those cost nothing.
+  ###################################
+  def turns(self, tick, inputs):
+    last_inputs = self.last_inputs
+    for player in range(len(inputs)):
+      direction = inputs[player]
+      if (direction is not None) and (direction != last_inputs[player]):
+        last_inputs[player] = direction
+        self.add_record((tick - self.last_tick) << 1, (player << 2) | direction)
+        self.last_tick = tick
+
+  def end_round(self, engine):
+    winner = engine.winner
+    if winner is None:
+      winner = no_winner
+    self.add_record(((engine.tick - self.last_tick) << 1) | 1, winner)
+
+    new_file = (not os.path.exists(self.path)) or (os.path.getsize(self.path) == 0)
+    with open(self.path, "ab") as f:
+      if new_file:
+        f.write(file_header.pack(magic, version))
+      f.write(self.buffer)
+    del self.buffer[:]
+
+  def add_record(self, value, byte):
+    buffer = self.buffer
+    while value > 0x7f:
+      buffer.append((value & 0x7f) | 0x80)
+      value >>= 7
+    buffer.append(value)
+    buffer.append(byte)
+
+###################################
+# ReplayRound
+#   One recorded round.  turns is a list of (tick, player, direction) in
+#   tick order, ticks is how long the round went, and winner is a player
+#   number or None for a tie.  trail_length is None unless the trails
+#   were limited.
+###################################
+class ReplayRound(object):
+
+  def __init__(self, width, height, starts, tick_seconds, turns, ticks, winner, trail_length=None):
+    self.width = width
+    self.height = height
+    self.starts = starts
+    self.tick_seconds = tick_seconds
+    self.turns = turns
+    self.ticks = ticks
+    self.winner = winner
+    self.trail_length = trail_length
+
+  def describe(self):
+    if self.winner is None:
+      result = "tie"
+    else:
+      result = "player %d wins" % (self.winner + 1)
+    trails = ""
+    if self.trail_length:
+      trails = ", trails of %d" % self.trail_length
+    return "%dx%d %d players%s, %d ticks, %d turns, %s" % (
+      self.width, self.height, len(self.starts), trails, self.ticks, len(self.turns), result)
+
+###################################
+# ReplayReader
+#   Maps the file and indexes the rounds in it:  where each one starts
+#   and how big a playfield it's for.  Turns only get decoded for a
+#   round somebody asks for with read_round(), so a file with thousands
+#   of rounds in it costs a few numbers a round to keep open.
+#
+#   end is where the last complete round ends:  anything after that is a
+#   round that got cut off or is garbage.  update() picks up rounds
+#   appended since, without going over the ones already indexed.
+###################################
+class ReplayReader(object):
+
+  def __init__(self, path):
+    self.path = path
+    self.data = None
+    self.size = 0
+    self.end = 0
+
+    # (offset, width, height, players) per round
+    self.entries = []
+    self.update()
+
+  def __len__(self):
+    return len(self.entries)
+
+  ###################################
+  # update()
+  #   re-maps the file if it's changed size, and indexes any new rounds.
+  ###################################
+  def update(self):
+    size = os.path.getsize(self.path)
+    if size == self.size:
+      return
+    if size < self.end:
+      # cut back (see ReplayWriter.recover())...start over
+      self.entries = []
+      self.end = 0
+
+    self.close()
+    self.size = size
+    if size == 0:
+      return
+    with open(self.path, "rb") as f:
+      self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = self.data
+
+    if self.end == 0:
+      if size < file_header.size:
+        raise ValueError("%s: too short to be a replay" % self.path)
+      file_magic, file_version = file_header.unpack_from(data, 0)
+      if (file_magic != magic) or (file_version != version):
+        raise ValueError("%s: not a version %d replay file" % (self.path, version))
+      self.end = file_header.size
+
+    offset = self.end
+    while offset + round_header.size <= size:
+      try:
+        header, next_offset = self.parse_round(data, offset, None)
+      except (struct.error, ValueError):
+        # The last round got cut off (power pulled mid-write?), or what
+        # follows doesn't make sense as a round.  Keep everything before.
+        break
+      width, height, starts = header[:3]
+      self.entries.append((offset, width, height, len(starts)))
+      offset = next_offset
+      self.end = offset
+
+  def close(self):
+    if self.data is not None:
+      self.data.close()
+      self.data = None
+
+  ###################################
+  # read_round()
+  #   decodes round number (from 0) into a ReplayRound.
+  ###################################
+  def read_round(self, number):
+    turns = []
+    header, offset = self.parse_round(self.data, self.entries[number][0], turns)
+    width, height, starts, tick_seconds, ticks, winner, trail_length = header
+    return ReplayRound(width, height, starts, tick_seconds, turns, ticks, winner, trail_length)
+
+  ###################################
+  # parse_round()
+  #   reads the round starting at offset, appending its turns to turns
+  #   unless that's None.  Returns (width, height, starts, tick_seconds,
+  #   ticks, winner, trail_length) and where the next round starts.
+  #   Raises ValueError if it isn't a round.
+  ###################################
+  def parse_round(self, data, offset, turns):
+    marker, width, height, players, tick_ms = round_header.unpack_from(data, offset)
+    if marker not in (round_marker, trail_round_marker):
+      raise ValueError("%s: bad round marker at offset %d" % (self.path, offset))
+    offset += round_header.size
+
+    trail_length = None
+    if marker == trail_round_marker:
+      trail_length = trail_entry.unpack_from(data, offset)[0]
+      offset += trail_entry.size
+
+    starts = []
+    for player in range(players):
+      start = start_entry.unpack_from(data, offset)
+      if (start[0] >= width) or (start[1] >= height) or (start[2] > 3):
+        raise ValueError("%s: bad start position at offset %d" % (self.path, offset))
+      starts.append(start)
+      offset += start_entry.size
+
+    tick = 0
+    while True:
+      value = 0
+      shift = 0
+      while True:
+        byte = struct.unpack_from("B", data, offset)[0]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+          break
+      byte = struct.unpack_from("B", data, offset)[0]
+      offset += 1
+
+      tick += value >> 1
+      if value & 1:
+        winner = byte
+        break
+      if (byte >> 2) >= players:
+        raise ValueError("%s: turn for a player that isn't there at offset %d" % (self.path, offset))
+      if turns is not None:
+        turns.append((tick, byte >> 2, byte & 3))
+
+    if (winner != no_winner) and (winner >= players):
+      raise ValueError("%s: bad winner at offset %d" % (self.path, offset))
+    if winner == no_winner:
+      winner = None
+    return (width, height, starts, tick_ms / 1000.0, tick, winner, trail_length), offset
+
+###################################
+# ReplayPlayer
+#   Drives an engine through a recorded round.  step() is one tick and
+#   hands back the engine's events, same as engine.step().
+###################################
+class ReplayPlayer(object):
+
+  def __init__(self, replay_round):
+    self.round = replay_round
+    self.engine = CyclesEngine(replay_round.width, replay_round.height, replay_round.starts,
+                               replay_round.trail_length)
+    self.rewind()
+
+  def rewind(self):
+    self.engine.reset()
+    self.next_turn = 0
+
+  def step(self):
+    engine = self.engine
+    turns = self.round.turns
+    tick = engine.tick + 1
+    inputs = [None] * engine.players
+    next_turn = self.next_turn
+    while (next_turn < len(turns)) and (turns[next_turn][0] == tick):
+      inputs[turns[next_turn][1]] = turns[next_turn][2]
+      next_turn += 1
+    self.next_turn = next_turn
+    return engine.step(inputs)
+
+  ###################################
+  # seek()
+  #   Puts the engine at the end of the given tick.  Going forward just
+  #   runs ahead, going back starts over.  Returns all the events from
+  #   the ticks it went through, for redrawing.
+  ###################################
+  def seek(self, tick):
+    engine = self.engine
+    events = []
+    if tick < engine.tick:
+      self.rewind()
+    while (engine.tick < tick) and not engine.game_over:
+      events.extend(self.step())
+    return events
+
+  ###################################
+  # verify()
+  #   Plays the whole round and checks it ends when and how the recording
+  #   says it did.
+  ###################################
+  def verify(self):
+    self.rewind()
+    self.seek(self.round.ticks)
+    engine = self.engine
+    return engine.game_over and (engine.tick == self.round.ticks) and (engine.winner == self.round.winner)
+
+###################################
+# play_round()
+#   Shows a round on a display.  speed is a multiple of the recorded tick
+#   rate, 0 for as fast as possible.  Anything before start_tick is
+#   drawn in one go.
+###################################
+def play_round(replay_round, display, speed=1.0, start_tick=0):
+  from renderer import FrameRenderer
+  from colors import black, wall_color, player_colors
+
+  player = ReplayPlayer(replay_round)
+  engine = player.engine
+  renderer = FrameRenderer(display, replay_round.width, replay_round.height)
+
+  def draw(events):
+    for event in events:
+      if event[0] in (EVENT_MOVE, EVENT_CRASH):
+        renderer.set_pixel(event[2], event[3], player_colors[event[1]])
+      elif event[0] == EVENT_ERASE:
+        renderer.set_pixel(event[2], event[3], black)
+
+  renderer.clear()
+  renderer.draw_box(wall_color)
+  for rider in range(engine.players):
+    start_x, start_y = engine.coords(rider)
+    renderer.set_pixel(start_x, start_y, player_colors[rider])
+  draw(player.seek(start_tick))
+  renderer.present()
+
+  period = 0.0
+  if speed > 0:
+    period = replay_round.tick_seconds / speed
+  while not engine.game_over:
+    draw(player.step())
+    renderer.present()
+    if period:
+      time.sleep(period)
+
+def main():
+  parser = argparse.ArgumentParser(description="List, check or play back recorded rounds.")
+  parser.add_argument("path", help="replay file")
+  parser.add_argument("--verify", action="store_true",
+                      help="re-simulate every round and check the results match")
+  parser.add_argument("--round", type=int, help="round to play back (from 1)")
+  parser.add_argument("--speed", type=float, default=1.0,
+                      help="playback speed, as a multiple of real time (0 = flat out)")
+  parser.add_argument("--seek", type=int, default=0, help="start playback at this tick")
+  parser.add_argument("--display", default="terminal", help="where to play it back")
+  args = parser.parse_args()
+
+  reader = ReplayReader(args.path)
+
+  if args.round is not None:
+    if not (1 <= args.round <= len(reader)):
+      parser.error("--round must be between 1 and %d" % len(reader))
+    from display_backends import open_display, close_display
+    replay_round = reader.read_round(args.round - 1)
+    display = open_display(args.display, replay_round.height, replay_round.width)
+    try:
+      play_round(replay_round, display, args.speed, args.seek)
+    finally:
+      close_display(display)
+    return
+
+  failures = 0
+  for number in range(len(reader)):
+    replay_round = reader.read_round(number)
+    line = "round %d: %s" % (number + 1, replay_round.describe())
+    if args.verify:
+      if ReplayPlayer(replay_round).verify():
+        line += "  ok"
+      else:
+        line += "  MISMATCH"
+        failures += 1
+    print(line)
+
+  if reader.end < reader.size:
+    print("(%d bytes at the end aren't a complete round)" % (reader.size - reader.end))
+  if failures:
+    print("%d round(s) didn't replay the same" % failures)
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,372 @@
+#################################################
+# rollback.py - rollback netcode for remote players
+#
+# Waiting every tick for the slowest peer's input would make the game
+# only as smooth as the worst connection.  Instead each peer runs its own
+# engine and steps it on time, guessing any remote input it doesn't have
+# yet:  a remote player is predicted to keep doing whatever they did
+# last.  When the real input turns up and would have steered the rider
+# differently from the guess, the engine is put back to how it was
+# before that tick and the ticks since are played again with what's now
+# known.  A guess of "turn right" for a rider that's already going right
+# is the same as no turn, so that doesn't count as different.
+#
+# That needs the state from before each recent tick, so there's a ring
+# buffer of EngineSnapshots (window ticks deep).  A snapshot is a slice
+# copy of the collision grid plus the player arrays, well under a
+# microsecond on a single panel.  An input older than the window can't
+# be rolled back to, so can_advance() says to hold off stepping until
+# the oldest tick in the window is fully known.
+#
+# advance() hands back what to change on screen:  cells drawn in the
+# old guess that are gone now, plus the events to draw.
+#
+#   python rollback.py --latency 3 --jitter 2 --seconds 10
+#
+# is a stress test:  peers trade inputs through a fake network with that
+# many ticks of delay, flat out, and the rollbacks per second and
+# whether every peer ended up with the same game get reported.
+#################################################
+
+import argparse
+import random
+
+from engine import CyclesEngine, EngineSnapshot, default_starts, EVENT_MOVE, EVENT_CRASH
+from tick_scheduler import monotonic
+
+###################################
+# steered()
+#   the way a rider heading in heading actually goes with input
+#   direction:  None and reversals leave it as it is.
+###################################
+def steered(direction, heading):
+  if (direction is None) or (direction == heading ^ 2):
+    return heading
+  return direction
+
+class RollbackSession(object):
+
+  ###################################
+  # local_players are the player numbers whose input comes from this
+  # peer.  Everybody else's arrives through remote_input().
+  ###################################
+  def __init__(self, engine, local_players, window=16):
+    self.engine = engine
+    self.window = window
+    players = engine.players
+
+    self.local = bytearray(players)
+    for player in local_players:
+      self.local[player] = 1
+
+    # all indexed by tick % window
+    self.snapshots = [EngineSnapshot(engine) for slot in range(window)]
+    self.inputs = [[None] * players for slot in range(window)]
+    self.confirmed = [bytearray(players) for slot in range(window)]
+    self.events = [[] for slot in range(window)]
+
+    self.rollbacks = 0
+    self.resimulated = 0
+    self.too_late = 0
+    self.reset()
+
+  ###################################
+  # reset()
+  #   new round.  self.tick counts advance() calls, which is the same as
+  #   engine.tick until the (maybe only predicted) game is over.
+  ###################################
+  def reset(self):
+    self.engine.reset()
+    self.tick = 0
+    self.confirmed_tick = 0
+    self.rollback_from = None
+    self.early = {}
+
+    # each remote player's newest real input, and its tick, which is the
+    # guess for every tick after it
+    self.last_known = [None] * self.engine.players
+    self.last_known_tick = [0] * self.engine.players
+
+  ###################################
+  # settled()
+  #   True once every input up to the current tick is known, so what the
+  #   engine shows is what really happened.
+  ###################################
+  def settled(self):
+    return self.confirmed_tick == self.tick
+
+  ###################################
+  # round_over()
+  #   True once the game is over for real:  the engine says so, and
+  #   every input up to the tick it ended on is known and accounted for.
+  #   Inputs after that can't change anything.
+  ###################################
+  def round_over(self):
+    engine = self.engine
+    if not engine.game_over or (self.confirmed_tick < engine.tick):
+      return False
+    return (self.rollback_from is None) or (self.rollback_from > engine.tick)
+
+  def can_advance(self):
+    return self.tick - self.confirmed_tick < self.window - 1
+
+  ###################################
+  # advance()
+  #   one tick.  local_inputs has an entry for every player, but only the
+  #   local players' are used.  Returns (cleared, events):  x,y cells to
+  #   blank out because a rollback took them back, then the engine events
+  #   to draw, from any re-simulated ticks followed by this one.
+  ###################################
+  def advance(self, local_inputs):
+    cleared, events = self.catch_up()
+
+    engine = self.engine
+    self.tick += 1
+    tick = self.tick
+    slot = tick % self.window
+    engine.save(self.snapshots[slot])
+
+    inputs = self.inputs[slot]
+    confirmed = self.confirmed[slot]
+    local = self.local
+    last_known = self.last_known
+    for player in range(engine.players):
+      if local[player]:
+        inputs[player] = local_inputs[player]
+        confirmed[player] = 1
+      else:
+        inputs[player] = last_known[player]
+        confirmed[player] = 0
+    for player, direction in self.early.pop(tick, ()):
+      inputs[player] = direction
+      confirmed[player] = 1
+      last_known[player] = direction
+      self.last_known_tick[player] = tick
+
+    tick_events = engine.step(inputs)
+    self.events[slot] = tick_events
+    events.extend(tick_events)
+    self.update_confirmed()
+    return cleared, events
+
+  ###################################
+  # remote_input()
+  #   player's real input for tick (a direction or None).  Every remote
+  #   player needs one of these for every tick, turn or no turn.
+  ###################################
+  def remote_input(self, player, tick, direction):
+    if tick > self.tick:
+      self.early.setdefault(tick, []).append((player, direction))
+      return
+    if tick <= self.tick - self.window:
+      self.too_late += 1
+      return
+
+    window = self.window
+    self.confirmed[tick % window][player] = 1
+
+    # This input, and the guesses for every later tick we haven't heard
+    # about yet, might be different from what we ran with.  Each tick's
+    # snapshot has the heading it was played with, which is right for
+    # any tick before a rollback that's already waiting...from there on
+    # it all gets re-run anyway.
+    first_change = None
+    pending = self.rollback_from
+    for later in range(tick, self.tick + 1):
+      slot = later % window
+      if (later > tick) and self.confirmed[slot][player]:
+        break
+      inputs = self.inputs[slot]
+      if (first_change is None) and ((pending is None) or (later < pending)):
+        snapshot = self.snapshots[slot]
+        if snapshot.alive[player]:
+          heading = snapshot.dirs[player]
+          if steered(inputs[player], heading) != steered(direction, heading):
+            first_change = later
+      inputs[player] = direction
+
+    if first_change is not None:
+      self.rollback_from = first_change
+
+    if tick > self.last_known_tick[player]:
+      self.last_known[player] = direction
+      self.last_known_tick[player] = tick
+    self.update_confirmed()
+
+  def update_confirmed(self):
+    window = self.window
+    while (self.confirmed_tick < self.tick) and (0 not in self.confirmed[(self.confirmed_tick + 1) % window]):
+      self.confirmed_tick += 1
+
+  ###################################
+  # catch_up()
+  #   does any rollback that's waiting:  back to the snapshot from before
+  #   the first wrong tick, then forward again to where we were.  advance()
+  #   calls it, but it can be called any time to fix up the picture early.
+  ###################################
+  def catch_up(self):
+    start = self.rollback_from
+    if start is None:
+      return [], []
+    self.rollback_from = None
+    self.rollbacks += 1
+
+    engine = self.engine
+    window = self.window
+    old_cells = set()
+    for tick in range(start, self.tick + 1):
+      for event in self.events[tick % window]:
+        if event[0] in (EVENT_MOVE, EVENT_CRASH):
+          old_cells.add((event[2], event[3]))
+
+    engine.restore(self.snapshots[start % window])
+    events = []
+    new_cells = set()
+    for tick in range(start, self.tick + 1):
+      slot = tick % window
+      engine.save(self.snapshots[slot])
+      tick_events = engine.step(self.inputs[slot])
+      self.events[slot] = tick_events
+      for event in tick_events:
+        if event[0] in (EVENT_MOVE, EVENT_CRASH):
+          new_cells.add((event[2], event[3]))
+      events.extend(tick_events)
+    self.resimulated += self.tick + 1 - start
+
+    return list(old_cells - new_cells), events
+
+###################################
+# Stress test
+###################################
+
+###################################
+# steer()
+#   turns now and then, and when the way ahead is blocked, going by what
+#   this peer's engine currently thinks the board looks like.
+###################################
+def steer(engine, player, rng, turn_chance):
+  if engine.game_over or not engine.alive[player]:
+    return None
+  cells = engine.grid.cells
+  offsets = engine.grid.step
+  head = engine.pos[player]
+  current = engine.dirs[player]
+  open_dirs = [d for d in range(4) if (d != current ^ 2) and not cells[head + offsets[d]]]
+  if not open_dirs:
+    return None
+  if (current in open_dirs) and (rng.random() >= turn_chance):
+    return None
+  return rng.choice(open_dirs)
+
+###################################
+# stress_round()
+#   one round with a peer per player, flat out.  Every peer's input for
+#   a tick reaches the others latency ticks later, give or take up to
+#   jitter more.  Returns the peers' sessions.
+###################################
+def stress_round(width, height, players, latency, jitter, window, rng, turn_chance=0.05):
+  starts = default_starts(width, height, players)
+  sessions = [RollbackSession(CyclesEngine(width, height, starts), [peer], window)
+              for peer in range(players)]
+  peer_rngs = [random.Random(rng.random()) for peer in range(players)]
+  in_flight = []
+  frame = 0
+  stalls = 0
+
+  while True:
+    frame += 1
+
+    # deliver whatever has arrived by now
+    waiting = []
+    for message in in_flight:
+      arrival, peer, player, tick, direction = message
+      if arrival <= frame:
+        sessions[peer].remote_input(player, tick, direction)
+      else:
+        waiting.append(message)
+    in_flight = waiting
+
+    finished = True
+    for peer in range(players):
+      session = sessions[peer]
+      if not session.round_over():
+        finished = False
+      if not session.can_advance():
+        stalls += 1
+        continue
+      inputs = [None] * players
+      inputs[peer] = steer(session.engine, peer, peer_rngs[peer], turn_chance)
+      session.advance(inputs)
+      for other in range(players):
+        if other != peer:
+          arrival = frame + latency + rng.randint(0, jitter)
+          in_flight.append((arrival, other, peer, session.tick, inputs[peer]))
+
+    if finished:
+      return sessions, stalls
+
+###################################
+# time_snapshots()
+#   microseconds for one save and one restore.
+###################################
+def time_snapshots(width, height, count=20000):
+  engine = CyclesEngine(width, height)
+  snapshot = EngineSnapshot(engine)
+  start = monotonic()
+  for i in range(count):
+    engine.save(snapshot)
+  middle = monotonic()
+  for i in range(count):
+    engine.restore(snapshot)
+  end = monotonic()
+  return (middle - start) / count * 1e6, (end - middle) / count * 1e6
+
+def main():
+  parser = argparse.ArgumentParser(description="Rollback stress test:  peers with made-up network latency.")
+  parser.add_argument("--width", type=int, default=64)
+  parser.add_argument("--height", type=int, default=64)
+  parser.add_argument("--players", type=int, default=2)
+  parser.add_argument("--latency", type=int, default=3, help="ticks before an input reaches the other peers")
+  parser.add_argument("--jitter", type=int, default=2, help="up to this many more ticks, at random")
+  parser.add_argument("--window", type=int, default=16, help="ticks of snapshots kept")
+  parser.add_argument("--seconds", type=float, default=5.0)
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  save_us, restore_us = time_snapshots(args.width, args.height)
+  print("snapshot save %.2fus  restore %.2fus" % (save_us, restore_us))
+
+  rng = random.Random(args.seed)
+  rounds = 0
+  ticks = 0
+  rollbacks = 0
+  resimulated = 0
+  too_late = 0
+  stalls = 0
+  desyncs = 0
+
+  start_time = monotonic()
+  while monotonic() - start_time < args.seconds:
+    sessions, round_stalls = stress_round(args.width, args.height, args.players,
+                                          args.latency, args.jitter, args.window, rng)
+    rounds += 1
+    stalls += round_stalls
+    reference = sessions[0].engine
+    for session in sessions:
+      engine = session.engine
+      ticks += session.tick
+      rollbacks += session.rollbacks
+      resimulated += session.resimulated
+      too_late += session.too_late
+      if (engine.grid.cells != reference.grid.cells) or (engine.winner != reference.winner):
+        desyncs += 1
+  elapsed = monotonic() - start_time
+
+  print("%d rounds, %d peer ticks, %d rollbacks (%.1f ticks re-run each)" % (
+    rounds, ticks, rollbacks, float(resimulated) / max(rollbacks, 1)))
+  print("%.0f rollbacks/sec  %.0f re-run ticks/sec  %.0f peer ticks/sec" % (
+    rollbacks / elapsed, resimulated / elapsed, ticks / elapsed))
+  print("stalls=%d  too late=%d  desyncs=%d" % (stalls, too_late, desyncs))
+
+if __name__ == "__main__":
+  main()
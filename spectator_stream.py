@@ -0,0 +1,484 @@
+#################################################
+# spectator_stream.py - watch the game from somewhere other than the panel
+#
+# Taps the renderer (see FrameRenderer.add_tap()) and sends every frame
+# to any number of viewers as a packet of just the cells that changed.
+# Each frame is encoded once and the same bytes go to everybody, so the
+# work per tick follows the number of changed cells, not the panel size.
+#
+# Packets (little endian):
+#
+#   KEYFRAME  type(B) seq(I) width(H) height(H), then runs over the whole
+#             panel in row order:  count(varint) r g b
+#   DELTA     type(B) seq(I) spans(H), then per span:
+#             skip(varint) count(varint) count x (r g b)
+#             skip is how many cells (row order) since the last span
+#             ended.  Neighbouring changed cells share a span.
+#
+# Viewers connect over TCP and say either "CYCLES\n" for plain packets,
+# each with a 4 byte length in front, or do a websocket handshake
+# ("GET ..."), and get one binary websocket message per packet.  New
+# viewers start with a keyframe.
+#
+# Everything on the game side is non-blocking.  Each viewer has a
+# bounded queue; if a viewer falls so far behind that it fills up, its
+# queued frames are thrown away and it gets a fresh keyframe when it
+# catches up.  Keyframes are the one thing that costs the whole panel to
+# encode, so there's at most one every keyframe_interval frames, shared
+# by every viewer waiting on one.  A slow viewer only ever hurts itself.
+#
+# Frames only come from the renderer, and the countdown, crash animation
+# and end of round screens hold one still for seconds at a time.  The
+# game calls service() while it waits, which keeps the queues moving and
+# sends anybody who joined during the hold a keyframe of the held frame
+# once it's been still for still_time.
+#
+#   python cycles.py --spectate-port 4243
+#   python spectator_stream.py --connect pi.local:4243 --display terminal
+#################################################
+
+import argparse
+import base64
+import errno
+import hashlib
+import socket
+import struct
+from collections import deque
+
+from tick_scheduler import monotonic
+
+PACKET_KEYFRAME = 1
+PACKET_DELTA = 2
+
+keyframe_header = struct.Struct("<BIHH")
+delta_header = struct.Struct("<BIH")
+length_prefix = struct.Struct("<I")
+
+raw_hello = b"CYCLES\n"
+websocket_guid = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+would_block = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+def put_varint(buffer, value):
+  while value > 0x7f:
+    buffer.append((value & 0x7f) | 0x80)
+    value >>= 7
+  buffer.append(value)
+
+def get_varint(data, offset):
+  value = 0
+  shift = 0
+  while True:
+    byte = data[offset]
+    offset += 1
+    value |= (byte & 0x7f) << shift
+    shift += 7
+    if byte < 0x80:
+      return value, offset
+
+###################################
+# encode_keyframe()
+#   the whole frame, run length encoded.  Mostly black, so it's small.
+###################################
+def encode_keyframe(seq, pixels, width, height):
+  packet = bytearray(keyframe_header.pack(PACKET_KEYFRAME, seq, width, height))
+  run_color = None
+  run_length = 0
+  for y in range(height):
+    for x in range(width):
+      color = pixels[x, y]
+      if color == run_color:
+        run_length += 1
+        continue
+      if run_length:
+        put_varint(packet, run_length)
+        packet.extend(run_color)
+      run_color = color
+      run_length = 1
+  put_varint(packet, run_length)
+  packet.extend(run_color)
+  return packet
+
+###################################
+# encode_delta()
+#   cells is a list of x,y that changed, repeats allowed.
+###################################
+def encode_delta(seq, pixels, width, cells):
+  indexes = sorted(set(y * width + x for x, y in cells))
+  body = bytearray()
+  spans = 0
+  position = 0
+  i = 0
+  count = len(indexes)
+  while i < count:
+    first = indexes[i]
+    last = i
+    while (last + 1 < count) and (indexes[last + 1] == indexes[last] + 1):
+      last += 1
+    put_varint(body, first - position)
+    put_varint(body, last - i + 1)
+    for index in indexes[i:last + 1]:
+      body.extend(pixels[index % width, index // width])
+    position = indexes[last] + 1
+    spans += 1
+    i = last + 1
+  return bytearray(delta_header.pack(PACKET_DELTA, seq, spans)) + body
+
+###################################
+# FrameDecoder
+#   The viewer end:  applies packets to an RGB byte buffer.  apply()
+#   returns the x,y cells that changed, or None for a keyframe.
+###################################
+class FrameDecoder(object):
+
+  def __init__(self):
+    self.width = 0
+    self.height = 0
+    self.rgb = bytearray()
+    self.seq = None
+
+  def apply(self, packet):
+    packet = bytearray(packet)
+    kind = packet[0]
+    if kind == PACKET_KEYFRAME:
+      kind, self.seq, self.width, self.height = keyframe_header.unpack_from(packet, 0)
+      rgb = bytearray()
+      offset = keyframe_header.size
+      while offset < len(packet):
+        run_length, offset = get_varint(packet, offset)
+        rgb.extend(packet[offset:offset + 3] * run_length)
+        offset += 3
+      self.rgb = rgb
+      return None
+
+    kind, self.seq, spans = delta_header.unpack_from(packet, 0)
+    rgb = self.rgb
+    width = self.width
+    changed = []
+    position = 0
+    offset = delta_header.size
+    for span in range(spans):
+      skip, offset = get_varint(packet, offset)
+      count, offset = get_varint(packet, offset)
+      position += skip
+      rgb[position * 3:(position + count) * 3] = packet[offset:offset + count * 3]
+      offset += count * 3
+      for index in range(position, position + count):
+        changed.append((index % width, index // width))
+      position += count
+    return changed
+
+###################################
+# Viewer
+#   one connected spectator, and what's waiting to go to them.  mode is
+#   None until they've said hello.
+###################################
+class Viewer(object):
+
+  def __init__(self, sock):
+    self.sock = sock
+    self.mode = None
+    self.incoming = bytearray()
+    self.queue = deque()
+    self.queued = 0
+    self.sent = 0
+    self.needs_keyframe = True
+
+class SpectatorStream(object):
+
+  ###################################
+  # max_queue is how many bytes can wait for one viewer before we give
+  # up on what's queued and start them over with a keyframe.
+  # keyframe_interval is the fewest frames between keyframes for viewers
+  # that are joining or catching up.  still_time is how many seconds a
+  # frame has to be held before service() sends it out as a keyframe.
+  ###################################
+  def __init__(self, port, width, height, host="", max_queue=256 * 1024, keyframe_interval=10,
+               still_time=0.5, clock=monotonic):
+    self.width = width
+    self.height = height
+    self.max_queue = max_queue
+    self.keyframe_interval = keyframe_interval
+    self.still_time = still_time
+    self.clock = clock
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(16)
+    listener.setblocking(False)
+    self.listener = listener
+    self.port = listener.getsockname()[1]
+
+    self.viewers = []
+    self.seq = 0
+    self.resyncs = 0
+
+    # when the last keyframe went out
+    self.keyframe_seq = -keyframe_interval
+    self.keyframe = None
+    self.keyframes = 0
+
+    # the last frame tapped, and when
+    self.pixels = None
+    self.frame_time = 0.0
+
+  ###################################
+  # tap()
+  #   hand this to FrameRenderer.add_tap().
+  ###################################
+  def tap(self, pixels, cells):
+    self.seq += 1
+    self.pixels = pixels
+    self.frame_time = self.clock()
+    self.service()
+    viewers = self.viewers
+    if not viewers:
+      return
+
+    # A whole new frame has to go to everybody.  Otherwise only viewers
+    # waiting on a keyframe need one, and they can wait a few frames.
+    keyframe = None
+    if (cells is None) or self.keyframe_due():
+      keyframe = self.frame_packet(encode_keyframe(self.seq, pixels, self.width, self.height))
+      self.keyframe = keyframe
+      self.keyframe_seq = self.seq
+      self.keyframes += 1
+
+    delta = None
+    for viewer in viewers:
+      if viewer.mode is None:
+        continue
+      if viewer.needs_keyframe or (cells is None):
+        if (keyframe is not None) and ((cells is None) or not viewer.queue):
+          viewer.needs_keyframe = False
+          self.queue(viewer, keyframe[viewer.mode])
+      else:
+        if delta is None:
+          delta = self.frame_packet(encode_delta(self.seq, pixels, self.width, cells))
+        self.queue(viewer, delta[viewer.mode])
+
+    for viewer in list(viewers):
+      self.flush(viewer)
+
+  ###################################
+  # keyframe_due()
+  #   True if somebody's waiting on a keyframe with nothing else left to
+  #   send them, and it's been long enough since the last one.
+  ###################################
+  def keyframe_due(self):
+    if self.seq - self.keyframe_seq < self.keyframe_interval:
+      return False
+    for viewer in self.viewers:
+      if (viewer.mode is not None) and viewer.needs_keyframe and not viewer.queue:
+        return True
+    return False
+
+  ###################################
+  # frame_packet()
+  #   the packet wrapped up for each kind of viewer.
+  ###################################
+  def frame_packet(self, packet):
+    size = len(packet)
+    if size < 126:
+      websocket = bytearray([0x82, size])
+    elif size < 65536:
+      websocket = bytearray([0x82, 126]) + struct.pack(">H", size)
+    else:
+      websocket = bytearray([0x82, 127]) + struct.pack(">Q", size)
+    return {"raw": bytes(length_prefix.pack(size) + packet),
+            "websocket": bytes(websocket + packet)}
+
+  def queue(self, viewer, data):
+    if viewer.queued + len(data) > self.max_queue:
+      # Too far behind.  Keep whatever's half sent (so the stream stays
+      # in step), throw out the rest, and start over from a keyframe.
+      while len(viewer.queue) > 1:
+        viewer.queued -= len(viewer.queue.pop())
+      if viewer.queue and (viewer.sent == 0):
+        viewer.queued -= len(viewer.queue.pop())
+      viewer.needs_keyframe = True
+      self.resyncs += 1
+      return
+    viewer.queue.append(data)
+    viewer.queued += len(data)
+
+  ###################################
+  # flush()
+  #   sends as much as the socket will take right now.
+  ###################################
+  def flush(self, viewer):
+    queue = viewer.queue
+    while queue:
+      data = queue[0]
+      try:
+        sent = viewer.sock.send(data[viewer.sent:])
+      except socket.error as error:
+        if error.args[0] in would_block:
+          return
+        self.drop(viewer)
+        return
+      viewer.sent += sent
+      if viewer.sent < len(data):
+        return
+      queue.popleft()
+      viewer.queued -= len(data)
+      viewer.sent = 0
+
+  ###################################
+  # send_held_keyframe()
+  #   the frame that's being held, to every viewer waiting on a keyframe
+  #   with nothing else queued.  Only encoded once per frame however
+  #   often this gets called.
+  ###################################
+  def send_held_keyframe(self):
+    waiting = [viewer for viewer in self.viewers
+               if (viewer.mode is not None) and viewer.needs_keyframe and not viewer.queue]
+    if not waiting:
+      return
+    if self.keyframe_seq != self.seq:
+      self.keyframe = self.frame_packet(encode_keyframe(self.seq, self.pixels, self.width, self.height))
+      self.keyframe_seq = self.seq
+      self.keyframes += 1
+    for viewer in waiting:
+      viewer.needs_keyframe = False
+      self.queue(viewer, self.keyframe[viewer.mode])
+
+  ###################################
+  # service()
+  #   takes new connections, reads whatever viewers have sent and sends
+  #   what's queued for them, all without blocking.  If the frame's been
+  #   held for still_time, viewers waiting on a keyframe get it.
+  ###################################
+  def service(self):
+    while True:
+      try:
+        sock, address = self.listener.accept()
+      except socket.error as error:
+        if error.args[0] in would_block:
+          break
+        raise
+      sock.setblocking(False)
+      sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      self.viewers.append(Viewer(sock))
+
+    for viewer in list(self.viewers):
+      try:
+        data = viewer.sock.recv(4096)
+      except socket.error as error:
+        if error.args[0] not in would_block:
+          self.drop(viewer)
+        continue
+      if not data:
+        self.drop(viewer)
+        continue
+      if viewer.mode is None:
+        viewer.incoming += data
+        self.hello(viewer)
+
+    for viewer in list(self.viewers):
+      self.flush(viewer)
+    if (self.pixels is not None) and (self.clock() - self.frame_time >= self.still_time):
+      self.send_held_keyframe()
+      for viewer in list(self.viewers):
+        self.flush(viewer)
+
+  ###################################
+  # hello()
+  #   works out what kind of viewer this is from what they sent first.
+  ###################################
+  def hello(self, viewer):
+    incoming = bytes(viewer.incoming)
+    if incoming.startswith(raw_hello):
+      viewer.mode = "raw"
+    elif incoming.startswith(b"GET "):
+      if b"\r\n\r\n" not in incoming:
+        return
+      key = None
+      for line in incoming.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"sec-websocket-key":
+          key = value.strip()
+      if key is None:
+        self.drop(viewer)
+        return
+      accept = base64.b64encode(hashlib.sha1(key + websocket_guid).digest())
+      self.queue(viewer, b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                         b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+      viewer.mode = "websocket"
+    elif (len(incoming) >= len(raw_hello)) or (b"\n" in incoming):
+      self.drop(viewer)
+      return
+    else:
+      return
+    viewer.incoming = None
+
+  def drop(self, viewer):
+    if viewer in self.viewers:
+      self.viewers.remove(viewer)
+    viewer.sock.close()
+
+  def close(self):
+    for viewer in list(self.viewers):
+      self.drop(viewer)
+    self.listener.close()
+
+###################################
+# watch()
+#   The viewer side:  connects, and shows the stream on a display
+#   backend until the game goes away.
+###################################
+def watch(host, port, display_name):
+  from PIL import Image
+  from display_backends import open_display, close_display
+  from renderer import FrameRenderer
+
+  sock = socket.create_connection((host, port))
+  sock.sendall(raw_hello)
+  decoder = FrameDecoder()
+  display = None
+  renderer = None
+  buffer = bytearray()
+  try:
+    while True:
+      data = sock.recv(65536)
+      if not data:
+        break
+      buffer += data
+      while len(buffer) >= length_prefix.size:
+        size = length_prefix.unpack_from(buffer, 0)[0]
+        if len(buffer) < length_prefix.size + size:
+          break
+        packet = buffer[length_prefix.size:length_prefix.size + size]
+        del buffer[:length_prefix.size + size]
+
+        changed = decoder.apply(packet)
+        if changed is None:
+          if display is None:
+            display = open_display(display_name, decoder.height, decoder.width)
+            renderer = FrameRenderer(display, decoder.width, decoder.height)
+          renderer.draw_image(Image.frombytes("RGB", (decoder.width, decoder.height), bytes(decoder.rgb)))
+        elif renderer is not None:
+          rgb = decoder.rgb
+          width = decoder.width
+          for x, y in changed:
+            offset = (y * width + x) * 3
+            renderer.set_pixel(x, y, tuple(rgb[offset:offset + 3]))
+        if renderer is not None:
+          renderer.present()
+  finally:
+    sock.close()
+    if display is not None:
+      close_display(display)
+
+def main():
+  parser = argparse.ArgumentParser(description="Watch a game being streamed by cycles.py --spectate-port.")
+  parser.add_argument("--connect", required=True, help="host:port of the game")
+  parser.add_argument("--display", default="terminal", help="where to show it")
+  args = parser.parse_args()
+
+  host, _, port = args.connect.rpartition(":")
+  watch(host or "localhost", int(port), args.display)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,9 @@
+#################################################
+# conftest.py - the game's modules live at the top of the repo, not in a
+# package, so put it on the path for the tests.
+#################################################
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
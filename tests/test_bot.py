@@ -0,0 +1,49 @@
+import random
+
+from bot import Bot
+from engine import CyclesEngine, default_starts
+from tick_scheduler import monotonic
+
+# how far past its budget a decision may run:  one Voronoi layer, plus
+# whatever the test machine throws in.
+SLACK = 0.01
+
+def middle_of_round(width, height, players, ticks=40, seed=1):
+  engine = CyclesEngine(width, height, default_starts(width, height, players))
+  rng = random.Random(seed)
+  for tick in range(ticks):
+    engine.step([rng.choice([None, None, None, 0, 1, 2, 3]) for player in range(players)])
+    if engine.game_over:
+      engine.reset()
+  return engine
+
+def slowest_decision(bot, tries=5):
+  slowest = 0
+  for attempt in range(tries):
+    start = monotonic()
+    bot.choose()
+    slowest = max(slowest, monotonic() - start)
+  return slowest
+
+def test_choose_keeps_to_budget_on_big_panel():
+  engine = middle_of_round(128, 96, 4)
+  for budget in (0.001, 0.005, 0.02):
+    bot = Bot(engine, 0, budget)
+    assert slowest_decision(bot) < budget + SLACK
+
+def test_choose_without_time_goes_straight_when_safe():
+  engine = CyclesEngine(128, 96)
+  bot = Bot(engine, 0, budget=0)
+  assert bot.choose() == engine.dirs[0]
+  assert bot.depth_reached == 0
+
+def test_choose_avoids_wall_without_time():
+  engine = CyclesEngine(10, 10, [(5, 1, 0), (5, 8, 0)])
+  bot = Bot(engine, 0, budget=0)
+  assert bot.choose() in (1, 3)
+
+def test_choose_searches_when_there_is_time():
+  engine = CyclesEngine(32, 32)
+  bot = Bot(engine, 0, budget=1.0, max_depth=2)
+  bot.choose()
+  assert bot.depth_reached == 2
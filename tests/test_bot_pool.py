@@ -0,0 +1,51 @@
+from bot_pool import PooledBot
+from engine import CyclesEngine, default_starts
+
+# Stands in for multiprocessing.Pool: every request comes back ready
+# with whatever answer() gives, run in this process.
+class FakeResult(object):
+
+  def __init__(self, answer):
+    self.answer = answer
+
+  def ready(self):
+    return True
+
+  def get(self):
+    return self.answer()
+
+class FakePool(object):
+
+  def __init__(self, answer):
+    self.answer = answer
+    self.requests = 0
+
+  def apply_async(self, function, args, callback=None):
+    self.requests += 1
+    return FakeResult(self.answer)
+
+def crash():
+  raise RuntimeError("worker died")
+
+def test_failed_decision_counts_as_missed_and_asks_again():
+  engine = CyclesEngine(16, 16, default_starts(16, 16, 2))
+  pool = FakePool(crash)
+  bot = PooledBot(pool, engine, 1, 0.03)
+
+  assert bot.read_all() == []
+  assert bot.read_all() == []
+  assert bot.missed == 1
+
+  engine.step([None, None])
+  assert bot.read_all() == []
+  assert pool.requests == 2
+
+def test_answer_turns_the_bot():
+  engine = CyclesEngine(16, 16, default_starts(16, 16, 2))
+  turn = engine.dirs[1] ^ 1
+  bot = PooledBot(FakePool(lambda: (engine.tick, turn)), engine, 1, 0.03)
+
+  bot.read_all()
+  actions = bot.read_all()
+  assert len(actions) == 1
+  assert bot.missed == 0
@@ -0,0 +1,43 @@
+import sys
+
+import pytest
+
+import cycles_sim
+from engine import DIR_LEFT
+
+def write_script(tmp_path, text):
+  path = tmp_path / "round.txt"
+  path.write_text(text)
+  return str(path)
+
+def run_main(monkeypatch, *args):
+  monkeypatch.setattr(sys, "argv", ["cycles_sim.py"] + list(args))
+  cycles_sim.main()
+
+def test_load_script_numbers_players_from_zero(tmp_path):
+  path = write_script(tmp_path, "# comment\n\n12 2 left\n")
+  assert cycles_sim.load_script(path, 2) == {12: [(1, DIR_LEFT)]}
+
+@pytest.mark.parametrize("player", ["0", "3", "-1"])
+def test_load_script_rejects_players_out_of_range(tmp_path, player):
+  path = write_script(tmp_path, "1 1 up\n5 %s left\n" % player)
+  with pytest.raises(ValueError) as error:
+    cycles_sim.load_script(path, 2)
+  assert "line 2" in str(error.value)
+
+@pytest.mark.parametrize("bots", ["-1", "3"])
+def test_bots_outside_players_is_a_usage_error(monkeypatch, bots):
+  with pytest.raises(SystemExit) as error:
+    run_main(monkeypatch, "--players", "2", "--bots", bots)
+  assert error.value.code == 2
+
+def test_bad_script_is_a_usage_error(monkeypatch, tmp_path):
+  path = write_script(tmp_path, "5 9 left\n")
+  with pytest.raises(SystemExit) as error:
+    run_main(monkeypatch, "--script", path)
+  assert error.value.code == 2
+
+def test_script_game_runs(monkeypatch, tmp_path, capsys):
+  path = write_script(tmp_path, "3 1 left\n")
+  run_main(monkeypatch, "--width", "16", "--height", "16", "--script", path, "--bots", "1")
+  assert "games=1" in capsys.readouterr().out
@@ -0,0 +1,107 @@
+import pytest
+
+from engine import CyclesEngine, DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT
+from engine import EVENT_MOVE, EVENT_CRASH, EVENT_WIN, EVENT_TIE, EVENT_ERASE
+
+def kinds(events):
+  return [event[0] for event in events]
+
+@pytest.mark.parametrize("trail_length", [None, 2, 3, 10])
+def test_heads_swapping_places_crash(trail_length):
+  engine = CyclesEngine(10, 10, [(4, 5, DIR_RIGHT), (5, 5, DIR_LEFT)], trail_length)
+  events = engine.step([None, None])
+  assert kinds(events) == [EVENT_CRASH, EVENT_CRASH, EVENT_TIE]
+  assert engine.winner is None
+
+def test_trail_length_has_to_leave_more_than_the_head():
+  for trail_length in (0, 1):
+    with pytest.raises(ValueError):
+      CyclesEngine(10, 10, trail_length=trail_length)
+
+def test_same_cell_head_on_crashes_both():
+  engine = CyclesEngine(10, 10, [(3, 5, DIR_RIGHT), (5, 5, DIR_LEFT)])
+  events = engine.step([None, None])
+  assert events == [(EVENT_CRASH, 0, 4, 5), (EVENT_CRASH, 1, 4, 5), (EVENT_TIE,)]
+  assert engine.game_over
+  assert engine.grid.cells[engine.grid.index(4, 5)]
+
+def test_wall_crash_wins_it_for_the_other_player():
+  engine = CyclesEngine(10, 10, [(0, 5, DIR_LEFT), (5, 2, DIR_DOWN)])
+  events = engine.step([None, None])
+  assert events == [(EVENT_CRASH, 0, -1, 5), (EVENT_MOVE, 1, 5, 3), (EVENT_WIN, 1)]
+  assert engine.winner == 1
+
+def test_both_hitting_walls_is_a_tie():
+  engine = CyclesEngine(10, 10, [(0, 5, DIR_LEFT), (9, 5, DIR_RIGHT)])
+  assert kinds(engine.step([None, None])) == [EVENT_CRASH, EVENT_CRASH, EVENT_TIE]
+  assert engine.winner is None
+
+def test_running_into_a_trail_crashes():
+  engine = CyclesEngine(10, 10, [(2, 5, DIR_RIGHT), (5, 3, DIR_DOWN)])
+  engine.step([None, None])
+  engine.step([None, None])
+  events = engine.step([None, None])
+  assert events == [(EVENT_CRASH, 0, 5, 5), (EVENT_MOVE, 1, 5, 6), (EVENT_WIN, 1)]
+
+def test_reversing_is_ignored():
+  engine = CyclesEngine(10, 10, [(5, 5, DIR_RIGHT), (5, 1, DIR_RIGHT)])
+  events = engine.step([DIR_LEFT, None])
+  assert events[0] == (EVENT_MOVE, 0, 6, 5)
+  assert engine.dirs[0] == DIR_RIGHT
+
+def test_nothing_happens_after_game_over():
+  engine = CyclesEngine(10, 10, [(0, 5, DIR_LEFT), (5, 2, DIR_DOWN)])
+  engine.step([None, None])
+  tick = engine.tick
+  assert engine.step([None, None]) == []
+  assert engine.tick == tick
+
+def test_trail_length_erases_oldest_before_moving():
+  engine = CyclesEngine(10, 10, [(2, 5, DIR_RIGHT), (2, 1, DIR_RIGHT)], trail_length=3)
+  engine.step([None, None])
+  engine.step([None, None])
+  events = engine.step([None, None])
+  assert events == [(EVENT_ERASE, 0, 2, 5), (EVENT_ERASE, 1, 2, 1),
+                    (EVENT_MOVE, 0, 5, 5), (EVENT_MOVE, 1, 5, 1)]
+  assert not engine.grid.cells[engine.grid.index(2, 5)]
+  assert engine.grid.cells[engine.grid.index(3, 5)]
+
+def loop_round(trail_length):
+  # round and round a 2x2 square, back onto the starting cell
+  engine = CyclesEngine(10, 10, [(5, 5, DIR_RIGHT), (1, 1, DIR_DOWN)], trail_length)
+  turns = [None, DIR_DOWN, DIR_LEFT, DIR_UP]
+  events = []
+  for turn in turns:
+    events = engine.step([turn, None])
+  return events
+
+def test_rider_can_follow_its_own_tail():
+  assert (EVENT_MOVE, 0, 5, 5) in loop_round(4)
+
+def test_rider_crashes_into_tail_still_there():
+  assert (EVENT_CRASH, 0, 5, 5) in loop_round(5)
+
+@pytest.mark.parametrize("chaser", [0, 1])
+def test_following_anothers_tail_doesnt_depend_on_player_order(chaser):
+  # the leader goes right along y=5 from 2,5; the chaser comes down onto
+  # 2,5 just as it's erased
+  leader = 1 - chaser
+  starts = [None, None]
+  starts[leader] = (2, 5, DIR_RIGHT)
+  starts[chaser] = (2, 2, DIR_DOWN)
+  engine = CyclesEngine(10, 10, starts, trail_length=3)
+  engine.step([None, None])
+  engine.step([None, None])
+  events = engine.step([None, None])
+  assert (EVENT_MOVE, chaser, 2, 5) in events
+  assert engine.alive[chaser]
+
+def test_reset_puts_everybody_back():
+  engine = CyclesEngine(10, 10, [(2, 5, DIR_RIGHT), (2, 1, DIR_RIGHT)], trail_length=3)
+  fresh = bytearray(engine.grid.cells)
+  for tick in range(5):
+    engine.step([None, None])
+  engine.reset()
+  assert engine.grid.cells == fresh
+  assert engine.tick == 0
+  assert list(engine.alive) == [1, 1]
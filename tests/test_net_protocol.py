@@ -0,0 +1,55 @@
+from engine import EVENT_MOVE, EVENT_CRASH, EVENT_WIN
+from net_protocol import FrameReader, message_type, hello, turn, udp_turn
+from net_protocol import MSG_HELLO, MSG_WELCOME, MSG_TURN, MSG_START, MSG_TICK, MSG_END
+from net_protocol import ROLE_SPECTATOR, NO_SEAT
+from net_protocol import encode_hello, encode_welcome, encode_turn, encode_udp_turn
+from net_protocol import encode_start, encode_tick, encode_end
+from net_protocol import decode_welcome, decode_start, decode_tick, decode_end
+
+def payload(message):
+  payloads = FrameReader().feed(message)
+  assert len(payloads) == 1
+  return payloads[0]
+
+def test_hello_and_turn():
+  data = payload(encode_hello(ROLE_SPECTATOR))
+  assert message_type(data) == MSG_HELLO
+  assert hello.unpack(data)[1] == ROLE_SPECTATOR
+
+  data = payload(encode_turn(3))
+  assert message_type(data) == MSG_TURN
+  assert turn.unpack(data)[1] == 3
+
+  assert udp_turn.unpack(encode_udp_turn(0xdeadbeef, 2)) == (MSG_TURN, 0xdeadbeef, 2)
+
+def test_welcome_round_trip():
+  data = payload(encode_welcome(NO_SEAT, 1234, 128, 96, 4, 0.1))
+  assert message_type(data) == MSG_WELCOME
+  assert decode_welcome(data) == (NO_SEAT, 1234, 128, 96, 4, 0.1)
+
+def test_start_round_trip():
+  starts = [(10, 5, 2), (100, 90, 0), (64, 48, 1)]
+  data = payload(encode_start(7, starts))
+  assert message_type(data) == MSG_START
+  assert decode_start(data) == (7, starts)
+
+def test_tick_round_trip_drops_win_event():
+  events = [(EVENT_MOVE, 0, 3, 4), (EVENT_CRASH, 15, 127, 95), (EVENT_WIN, 0)]
+  data = payload(encode_tick(123456, events))
+  assert message_type(data) == MSG_TICK
+  assert decode_tick(data) == (123456, events[:2])
+
+def test_end_round_trip():
+  assert decode_end(payload(encode_end(2))) == 2
+  data = payload(encode_end(None))
+  assert message_type(data) == MSG_END
+  assert decode_end(data) is None
+
+def test_frame_reader_handles_split_and_joined_messages():
+  stream = encode_start(1, [(1, 2, 3)]) + encode_tick(1, [(EVENT_MOVE, 0, 1, 1)]) + encode_end(0)
+  reader = FrameReader()
+  payloads = []
+  for i in range(len(stream)):
+    payloads.extend(reader.feed(stream[i:i + 1]))
+  assert [message_type(data) for data in payloads] == [MSG_START, MSG_TICK, MSG_END]
+  assert reader.feed(stream) == payloads
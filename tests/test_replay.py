@@ -0,0 +1,133 @@
+import os
+import random
+
+from engine import CyclesEngine, default_starts
+from replay import ReplayWriter, ReplayReader, ReplayPlayer
+
+def record_round(writer, seed, trail_length=None, width=32, height=32):
+  engine = CyclesEngine(width, height, default_starts(width, height, 2), trail_length)
+  rng = random.Random(seed)
+  writer.start_round(engine, 0.1)
+  while not engine.game_over:
+    inputs = [rng.choice([None] * 6 + [0, 1, 2, 3]) for player in range(engine.players)]
+    engine.step(inputs)
+    writer.turns(engine.tick, inputs)
+  writer.end_round(engine)
+  return engine
+
+def read_rounds(path):
+  reader = ReplayReader(path)
+  rounds = [reader.read_round(number) for number in range(len(reader))]
+  reader.close()
+  return rounds
+
+def chop(path, count):
+  size = os.path.getsize(path)
+  with open(path, "r+b") as f:
+    f.truncate(size - count)
+
+def test_reader_keeps_rounds_before_a_cut_off_one(tmp_path):
+  path = str(tmp_path / "cycles.replay")
+  writer = ReplayWriter(path)
+  for seed in range(3):
+    record_round(writer, seed)
+  chop(path, 3)
+
+  reader = ReplayReader(path)
+  assert len(reader) == 2
+  assert reader.end < reader.size
+
+def test_writer_cuts_off_partial_round_before_appending(tmp_path):
+  path = str(tmp_path / "cycles.replay")
+  writer = ReplayWriter(path)
+  for seed in range(3):
+    record_round(writer, seed)
+  chop(path, 3)
+
+  writer = ReplayWriter(path)
+  assert writer.dropped > 0
+  record_round(writer, 10, trail_length=8)
+  record_round(writer, 11)
+
+  reader = ReplayReader(path)
+  assert len(reader) == 4
+  assert reader.end == reader.size
+  assert reader.read_round(2).trail_length == 8
+  for number in range(len(reader)):
+    assert ReplayPlayer(reader.read_round(number)).verify()
+
+def test_writer_recovers_from_a_cut_off_header(tmp_path):
+  path = str(tmp_path / "cycles.replay")
+  with open(path, "wb") as f:
+    f.write(b"CY")
+  writer = ReplayWriter(path)
+  record_round(writer, 1)
+  assert len(read_rounds(path)) == 1
+
+def test_garbage_after_rounds_is_ignored(tmp_path):
+  path = str(tmp_path / "cycles.replay")
+  writer = ReplayWriter(path)
+  record_round(writer, 1)
+  with open(path, "ab") as f:
+    f.write(b"Xnot a round at all")
+  assert len(read_rounds(path)) == 1
+
+def test_writer_refuses_other_files(tmp_path):
+  path = str(tmp_path / "notes.txt")
+  with open(path, "wb") as f:
+    f.write(b"shopping list")
+  try:
+    ReplayWriter(path)
+  except ValueError:
+    pass
+  else:
+    assert False, "wrote into a file that isn't a replay"
+  with open(path, "rb") as f:
+    assert f.read() == b"shopping list"
+
+def test_round_trip(tmp_path):
+  path = str(tmp_path / "cycles.replay")
+  writer = ReplayWriter(path)
+  engines = [record_round(writer, 5), record_round(writer, 6, trail_length=6, width=40, height=24)]
+
+  rounds = read_rounds(path)
+  assert len(rounds) == 2
+  for engine, replay_round in zip(engines, rounds):
+    assert (replay_round.width, replay_round.height) == (engine.width, engine.height)
+    assert [tuple(start) for start in replay_round.starts] == [tuple(start) for start in engine.starts]
+    assert replay_round.ticks == engine.tick
+    assert replay_round.winner == engine.winner
+    assert replay_round.trail_length == engine.trail_length
+    assert replay_round.tick_seconds == 0.1
+    assert ReplayPlayer(replay_round).verify()
+
+def test_turns_are_recorded_only_when_they_change(tmp_path):
+  path = str(tmp_path / "cycles.replay")
+  writer = ReplayWriter(path)
+  engine = CyclesEngine(20, 20, [(5, 5, 1), (5, 15, 1)])
+  writer.start_round(engine, 0.1)
+  script = {3: [2, None], 4: [2, None], 6: [None, 0]}
+  while not engine.game_over:
+    inputs = script.get(engine.tick + 1, [None, None])
+    engine.step(inputs)
+    writer.turns(engine.tick, inputs)
+  writer.end_round(engine)
+
+  replay_round = read_rounds(path)[0]
+  assert replay_round.turns == [(3, 0, 2), (6, 1, 0)]
+
+def test_update_indexes_only_new_rounds(tmp_path):
+  path = str(tmp_path / "cycles.replay")
+  writer = ReplayWriter(path)
+  record_round(writer, 1)
+  reader = ReplayReader(path)
+  assert len(reader) == 1
+  first = reader.entries[0]
+
+  record_round(writer, 2, width=40, height=24)
+  reader.update()
+  assert len(reader) == 2
+  assert reader.entries[0] is first
+  assert reader.entries[1][1:] == (40, 24, 2)
+  assert reader.read_round(1).width == 40
+  reader.close()
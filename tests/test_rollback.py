@@ -0,0 +1,103 @@
+import random
+
+from engine import CyclesEngine, EngineSnapshot, default_starts, DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT
+from rollback import RollbackSession, stress_round
+
+def random_inputs(rng, players):
+  return [rng.choice([None] * 8 + [DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT]) for player in range(players)]
+
+def play(engine, inputs):
+  events = []
+  for tick_inputs in inputs:
+    events.append(engine.step(tick_inputs))
+  return events
+
+def state(engine):
+  return (bytes(engine.grid.cells), list(engine.pos), bytes(engine.dirs), bytes(engine.alive),
+          list(engine.trail), list(engine.trail_next), list(engine.trail_count),
+          engine.alive_count, engine.tick, engine.game_over, engine.winner)
+
+def check_restore_replays_the_same(trail_length):
+  rng = random.Random(7)
+  engine = CyclesEngine(32, 32, default_starts(32, 32, 4), trail_length)
+  play(engine, [random_inputs(rng, 4) for tick in range(10)])
+
+  snapshot = EngineSnapshot(engine)
+  engine.save(snapshot)
+  before = state(engine)
+  inputs = [random_inputs(rng, 4) for tick in range(30)]
+  first_events = play(engine, inputs)
+  after = state(engine)
+
+  engine.restore(snapshot)
+  assert state(engine) == before
+  assert play(engine, inputs) == first_events
+  assert state(engine) == after
+
+def test_restore_replays_the_same():
+  check_restore_replays_the_same(None)
+
+def test_restore_replays_the_same_with_trail_length():
+  check_restore_replays_the_same(5)
+
+def test_late_remote_input_rolls_back_to_the_real_game():
+  starts = default_starts(32, 32, 2)
+  session = RollbackSession(CyclesEngine(32, 32, starts), [0], window=16)
+  reference = CyclesEngine(32, 32, starts)
+
+  # player 2 really turns on tick 3, but we don't hear about it until
+  # tick 6, and nothing at all for the other ticks until then
+  remote = {3: DIR_RIGHT}
+  for tick in range(1, 7):
+    session.advance([None, None])
+    reference.step([None, remote.get(tick)])
+  assert session.engine.grid.cells != reference.grid.cells
+
+  for tick in range(1, 7):
+    session.remote_input(1, tick, remote.get(tick))
+  assert session.settled()
+  cleared, events = session.catch_up()
+  assert session.rollbacks == 1
+  assert cleared
+  assert state(session.engine) == state(reference)
+
+def test_peers_end_up_agreeing():
+  rng = random.Random(3)
+  rollbacks = 0
+  for round_number in range(5):
+    sessions, stalls = stress_round(32, 32, 3, latency=3, jitter=2, window=16, rng=rng, turn_chance=0.1)
+    reference = sessions[0].engine
+    for session in sessions:
+      assert session.engine.grid.cells == reference.grid.cells
+      assert session.engine.winner == reference.winner
+      rollbacks += session.rollbacks
+  assert rollbacks > 0
+
+def test_turn_then_no_turn_rolls_back_once():
+  starts = default_starts(32, 32, 2)
+  session = RollbackSession(CyclesEngine(32, 32, starts), [0], window=16)
+  for tick in range(1, 6):
+    session.advance([None, None])
+
+  session.remote_input(1, 1, None)
+  session.remote_input(1, 2, None)
+  session.remote_input(1, 3, DIR_RIGHT)
+  session.catch_up()
+  assert session.rollbacks == 1
+
+  # from here on it's predicted to keep "turning" right, which is just
+  # going straight, same as no turn at all
+  session.remote_input(1, 4, None)
+  session.remote_input(1, 5, None)
+  session.catch_up()
+  assert session.rollbacks == 1
+  assert session.settled()
+
+def test_reversal_is_the_same_as_no_turn():
+  starts = default_starts(32, 32, 2)
+  session = RollbackSession(CyclesEngine(32, 32, starts), [0], window=16)
+  heading = session.engine.dirs[1]
+  session.advance([None, None])
+  session.remote_input(1, 1, heading ^ 2)
+  session.catch_up()
+  assert session.rollbacks == 0
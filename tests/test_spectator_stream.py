@@ -0,0 +1,181 @@
+import errno
+import random
+import socket
+
+from spectator_stream import SpectatorStream, Viewer, FrameDecoder, length_prefix
+
+WIDTH = 32
+HEIGHT = 16
+
+# A viewer's socket:  takes everything it's sent, or nothing if stuck.
+class FakeSocket(object):
+
+  def __init__(self, stuck=False):
+    self.stuck = stuck
+    self.received = bytearray()
+
+  def send(self, data):
+    if self.stuck:
+      raise socket.error(errno.EAGAIN, "stuck")
+    self.received += data
+    return len(data)
+
+  def recv(self, size):
+    raise socket.error(errno.EAGAIN, "nothing to read")
+
+  def close(self):
+    pass
+
+# Stands in for a PIL pixel access object.
+class Pixels(dict):
+
+  def __init__(self, rng):
+    dict.__init__(self)
+    for y in range(HEIGHT):
+      for x in range(WIDTH):
+        self[x, y] = (0, 0, 0)
+    self.rng = rng
+
+  def scribble(self, count):
+    cells = []
+    for i in range(count):
+      cell = (self.rng.randrange(WIDTH), self.rng.randrange(HEIGHT))
+      self[cell] = (self.rng.randrange(256), self.rng.randrange(256), self.rng.randrange(256))
+      cells.append(cell)
+    return cells
+
+# Only moves when told to.
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+def open_stream(**kwargs):
+  return SpectatorStream(0, WIDTH, HEIGHT, host="127.0.0.1", **kwargs)
+
+def add_viewer(stream, sock):
+  viewer = Viewer(sock)
+  viewer.mode = "raw"
+  stream.viewers.append(viewer)
+  return viewer
+
+def decode_all(data):
+  decoder = FrameDecoder()
+  data = bytearray(data)
+  while data:
+    size = length_prefix.unpack_from(data, 0)[0]
+    decoder.apply(data[length_prefix.size:length_prefix.size + size])
+    del data[:length_prefix.size + size]
+  return decoder
+
+def test_viewer_sees_every_frame():
+  stream = open_stream()
+  try:
+    pixels = Pixels(random.Random(1))
+    sock = FakeSocket()
+    add_viewer(stream, sock)
+    stream.tap(pixels, None)
+    for frame in range(50):
+      stream.tap(pixels, pixels.scribble(5))
+    decoder = decode_all(sock.received)
+    for y in range(HEIGHT):
+      for x in range(WIDTH):
+        offset = (y * WIDTH + x) * 3
+        assert tuple(decoder.rgb[offset:offset + 3]) == pixels[x, y]
+  finally:
+    stream.close()
+
+def test_stuck_viewer_keyframes_are_rate_limited():
+  stream = open_stream(max_queue=2500, keyframe_interval=10)
+  try:
+    pixels = Pixels(random.Random(2))
+    pixels.scribble(WIDTH * HEIGHT)
+    add_viewer(stream, FakeSocket(stuck=True))
+    for frame in range(100):
+      stream.tap(pixels, pixels.scribble(40))
+    assert stream.resyncs >= 5
+    assert stream.keyframes <= 100 // 10 + 1
+  finally:
+    stream.close()
+
+def test_viewers_waiting_share_one_keyframe():
+  stream = open_stream(keyframe_interval=10)
+  try:
+    pixels = Pixels(random.Random(3))
+    stream.tap(pixels, pixels.scribble(5))
+    socks = [FakeSocket() for viewer in range(5)]
+    for sock in socks:
+      add_viewer(stream, sock)
+    stream.tap(pixels, pixels.scribble(5))
+    assert stream.keyframes == 1
+    assert len(set(bytes(sock.received) for sock in socks)) == 1
+  finally:
+    stream.close()
+
+def test_viewer_joining_during_a_hold_gets_the_held_frame():
+  clock = FakeClock()
+  stream = open_stream(keyframe_interval=10, still_time=0.5, clock=clock)
+  try:
+    pixels = Pixels(random.Random(5))
+    stream.tap(pixels, None)
+    stream.tap(pixels, pixels.scribble(5))
+    sock = FakeSocket()
+    add_viewer(stream, sock)
+
+    clock.now += 0.1
+    stream.service()
+    assert not sock.received
+
+    clock.now += 0.5
+    stream.service()
+    stream.service()
+    assert stream.keyframes == 1
+    decoder = decode_all(sock.received)
+    assert decoder.seq == stream.seq
+    for y in range(HEIGHT):
+      for x in range(WIDTH):
+        offset = (y * WIDTH + x) * 3
+        assert tuple(decoder.rgb[offset:offset + 3]) == pixels[x, y]
+  finally:
+    stream.close()
+
+def test_service_sends_what_was_queued():
+  stream = open_stream()
+  try:
+    pixels = Pixels(random.Random(6))
+    sock = FakeSocket(stuck=True)
+    add_viewer(stream, sock)
+    stream.tap(pixels, None)
+    stream.tap(pixels, pixels.scribble(5))
+    assert not sock.received
+
+    sock.stuck = False
+    stream.service()
+    assert decode_all(sock.received).seq == stream.seq
+  finally:
+    stream.close()
+
+def test_keyframe_and_delta_round_trip():
+  from spectator_stream import encode_keyframe, encode_delta
+  rng = random.Random(4)
+  pixels = Pixels(rng)
+  pixels.scribble(100)
+  decoder = FrameDecoder()
+  assert decoder.apply(encode_keyframe(1, pixels, WIDTH, HEIGHT)) is None
+  assert (decoder.width, decoder.height, decoder.seq) == (WIDTH, HEIGHT, 1)
+
+  for seq in range(2, 20):
+    cells = pixels.scribble(rng.randrange(1, 30))
+    # neighbouring cells share a span, and repeats are fine
+    cells += [(0, 0), (1, 0), (2, 0), (0, 0)]
+    changed = decoder.apply(encode_delta(seq, pixels, WIDTH, cells))
+    assert sorted(changed) == sorted(set(cells))
+    assert decoder.seq == seq
+
+  for y in range(HEIGHT):
+    for x in range(WIDTH):
+      offset = (y * WIDTH + x) * 3
+      assert tuple(decoder.rgb[offset:offset + 3]) == pixels[x, y]
@@ -0,0 +1,60 @@
+from timeline import Timeline, run_timeline
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def wait(self, timeout):
+    self.now += timeout
+
+def screens(shown, names, hold):
+  for name in names:
+    def screen(name=name):
+      shown.append(name)
+      yield hold
+    yield screen()
+
+def mashing():
+  return [(0, 1)]
+
+def test_press_skips_holds():
+  clock = FakeClock()
+  timeline = Timeline(clock)
+  shown = []
+  for screen in screens(shown, ["3", "2", "1"], 1.0):
+    timeline.add(screen)
+  assert run_timeline(timeline, [mashing], clock.wait)
+  assert shown == ["3", "2", "1"]
+  assert clock.now == 0.0
+
+def test_unskippable_timeline_plays_out_in_full():
+  clock = FakeClock()
+  timeline = Timeline(clock)
+  shown = []
+  for screen in screens(shown, ["3", "2", "1"], 1.0):
+    timeline.add(screen)
+  assert run_timeline(timeline, [mashing], clock.wait, skippable=False)
+  assert shown == ["3", "2", "1"]
+  assert clock.now == 3.0
+
+def test_interruptible_timeline_stops_on_press():
+  clock = FakeClock()
+  timeline = Timeline(clock)
+  shown = []
+  for screen in screens(shown, ["3", "2", "1"], None):
+    timeline.add(screen)
+  assert run_timeline(timeline, [mashing], clock.wait, interruptible=True)
+  assert shown == ["3"]
+
+def test_background_jobs_always_run():
+  clock = FakeClock()
+  timeline = Timeline(clock)
+  done = []
+  timeline.background(done.append, 1)
+  timeline.background(done.append, 2)
+  assert not run_timeline(timeline, [lambda: []], clock.wait)
+  assert done == [1, 2]
@@ -0,0 +1,45 @@
+from engine import DIR_UP, DIR_RIGHT, DIR_DOWN, DIR_LEFT
+from turn_buffer import TurnBuffer
+
+def test_turns_come_off_one_per_tick():
+  turns = TurnBuffer(DIR_UP)
+  turns.push(DIR_RIGHT, 1.0)
+  turns.push(DIR_DOWN, 2.0)
+  assert turns.pop() == DIR_RIGHT
+  assert turns.turn_timestamp == 1.0
+  assert turns.pop() == DIR_DOWN
+  assert turns.turn_timestamp == 2.0
+  assert turns.pop() == DIR_DOWN
+  assert turns.turn_timestamp is None
+
+def test_reversal_is_dropped():
+  turns = TurnBuffer(DIR_UP)
+  turns.push(DIR_DOWN)
+  assert turns.pop() == DIR_UP
+
+def test_reversal_checked_against_last_queued_turn():
+  # right then left would be a U-turn in one tick's worth of presses
+  turns = TurnBuffer(DIR_UP)
+  turns.push(DIR_RIGHT)
+  turns.push(DIR_LEFT)
+  assert turns.pop() == DIR_RIGHT
+  assert turns.pop() == DIR_RIGHT
+
+def test_duplicates_are_dropped():
+  turns = TurnBuffer(DIR_UP)
+  turns.push(DIR_UP)
+  turns.push(DIR_LEFT)
+  turns.push(DIR_LEFT)
+  assert list(turns.turns) == [(DIR_LEFT, None)]
+
+def test_extra_presses_past_size_are_dropped():
+  turns = TurnBuffer(DIR_UP, size=2)
+  for direction in (DIR_RIGHT, DIR_UP, DIR_LEFT, DIR_DOWN):
+    turns.push(direction)
+  assert [turns.pop() for tick in range(3)] == [DIR_RIGHT, DIR_UP, DIR_UP]
+
+def test_reset_clears_queued_turns():
+  turns = TurnBuffer(DIR_UP)
+  turns.push(DIR_RIGHT)
+  turns.reset(DIR_DOWN)
+  assert turns.pop() == DIR_DOWN
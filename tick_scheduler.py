@@ -0,0 +1,119 @@
+#################################################
+# tick_scheduler.py - fixed timestep tick scheduling
+#
+# Runs the game engine at an exact rate off of a monotonic clock.
+# Deadlines are start + n * period rather than "last tick + period",
+# so a late tick doesn't push every tick after it later too.
+#################################################
+
+try:
+  from time import monotonic
+except ImportError:
+  # python 2 doesn't have time.monotonic, so go to clock_gettime directly.
+  import ctypes
+  import ctypes.util
+
+  class _timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+  _CLOCK_MONOTONIC = 1
+  _librt = ctypes.CDLL(ctypes.util.find_library("rt") or "libc.so.6", use_errno=True)
+  _clock_gettime = _librt.clock_gettime
+  _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_timespec)]
+
+  def monotonic():
+    t = _timespec()
+    if _clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, "clock_gettime failed")
+    return t.tv_sec + t.tv_nsec * 1e-9
+
+###################################
+# TickScheduler
+#   rate_hz is how many ticks per second we want.
+#   max_catchup is how many ticks we're allowed to run back-to-back when
+#   we've fallen behind.  Anything past that is dropped and counted as missed.
+###################################
+class TickScheduler(object):
+
+  def __init__(self, rate_hz, max_catchup=2):
+    self.period = 1.0 / rate_hz
+    self.max_catchup = max_catchup
+    self.reset()
+
+  ###################################
+  # reset()
+  #   starts the schedule over.  First tick is due one period from now.
+  ###################################
+  def reset(self, now=None):
+    if now is None:
+      now = monotonic()
+    self.start_time = now
+    self.next_deadline = now + self.period
+    self.ticks = 0
+    self.missed = 0
+    self.jitter_total = 0.0
+    self.jitter_max = 0.0
+
+  ###################################
+  # time_until_tick()
+  #   seconds until the next tick is due.  Zero if it's already due.
+  ###################################
+  def time_until_tick(self, now=None):
+    if now is None:
+      now = monotonic()
+    return max(0.0, self.next_deadline - now)
+
+  ###################################
+  # tick_due()
+  #   Returns True (and schedules the following tick) if a tick is due.
+  #   Call it once per tick you run...if we're behind it'll keep returning
+  #   True until we've caught up.
+  ###################################
+  def tick_due(self, now=None):
+    if now is None:
+      now = monotonic()
+    if now < self.next_deadline:
+      return False
+
+    late = now - self.next_deadline
+    behind = int(late / self.period)
+    if behind > self.max_catchup:
+      dropped = behind - self.max_catchup
+      self.missed += dropped
+      self.next_deadline += dropped * self.period
+      late = now - self.next_deadline
+
+    self.ticks += 1
+    self.jitter_total += late
+    if late > self.jitter_max:
+      self.jitter_max = late
+
+    self.next_deadline += self.period
+    return True
+
+  ###################################
+  # measured_rate()
+  #   actual ticks per second since the last reset.
+  ###################################
+  def measured_rate(self, now=None):
+    if now is None:
+      now = monotonic()
+    elapsed = now - self.start_time
+    if elapsed <= 0:
+      return 0.0
+    return self.ticks / elapsed
+
+  ###################################
+  # jitter_avg()
+  #   average lateness of a tick, in seconds.
+  ###################################
+  def jitter_avg(self):
+    if self.ticks == 0:
+      return 0.0
+    return self.jitter_total / self.ticks
+
+  def stats(self):
+    return "ticks=%d missed=%d rate=%.2fHz jitter avg=%.2fms max=%.2fms" % (
+      self.ticks, self.missed, self.measured_rate(),
+      self.jitter_avg() * 1000.0, self.jitter_max * 1000.0)
@@ -0,0 +1,162 @@
+#################################################
+# timeline.py - animations that don't stop the world
+#
+# The crash animation, countdown and text screens used to time.sleep()
+# between frames, which tied the game up for several seconds a round:
+# no input, nothing else getting done.  Here each animation is a
+# generator that draws a keyframe and then yields how many seconds to
+# hold it (None to hold it until somebody presses a button):
+#
+#   def text_screen(text, color, hold):
+#     renderer.draw_image(assets.text(text, color))
+#     renderer.present()
+#     yield hold
+#
+# A Timeline plays them one after another, stepping each one along when
+# its hold is up.  Whatever runs the timeline sleeps in between on
+# whatever it's waiting on for input, so a press can skip the rest of a
+# hold straight away.  Anything handed to background() gets run in the
+# gaps between keyframes, one job per gap, and always before the
+# timeline counts as done.
+#
+# run_timeline() does all that for the usual case.
+#################################################
+
+from collections import deque
+
+from tick_scheduler import monotonic
+
+class Timeline(object):
+
+  def __init__(self, clock=monotonic):
+    self.clock = clock
+    self.sequences = deque()
+    self.jobs = deque()
+    self.current = None
+
+    # when the current keyframe's hold is up.  None holds until skip().
+    self.wake_time = None
+
+  ###################################
+  # add()
+  #   queues an animation (a generator yielding hold times) to play once
+  #   everything before it has.
+  ###################################
+  def add(self, sequence):
+    self.sequences.append(sequence)
+
+  ###################################
+  # background()
+  #   queues job(*args) to run while the animations are holding.
+  ###################################
+  def background(self, job, *args):
+    self.jobs.append((job, args))
+
+  def playing(self):
+    return (self.current is not None) or (len(self.sequences) > 0)
+
+  def done(self):
+    return not self.playing() and not self.jobs
+
+  ###################################
+  # advance()
+  #   draws every keyframe that's due.
+  ###################################
+  def advance(self, now=None):
+    if now is None:
+      now = self.clock()
+    while True:
+      if self.current is None:
+        if not self.sequences:
+          return
+        self.current = self.sequences.popleft()
+        self.wake_time = now
+      if (self.wake_time is None) or (now < self.wake_time):
+        return
+      try:
+        hold = next(self.current)
+      except StopIteration:
+        self.current = None
+        continue
+      if hold is None:
+        self.wake_time = None
+      else:
+        self.wake_time = now + hold
+
+  ###################################
+  # skip()
+  #   ends the current hold, so the next keyframe is due now.
+  ###################################
+  def skip(self):
+    if self.current is not None:
+      self.wake_time = self.clock()
+
+  ###################################
+  # time_until_next()
+  #   seconds until the next keyframe is due:  zero if it already is, or
+  #   None if we're holding until skip().
+  ###################################
+  def time_until_next(self, now=None):
+    if not self.playing():
+      return 0
+    if self.current is None:
+      return 0
+    if self.wake_time is None:
+      return None
+    if now is None:
+      now = self.clock()
+    return max(self.wake_time - now, 0)
+
+  def run_job(self):
+    job, args = self.jobs.popleft()
+    job(*args)
+
+  ###################################
+  # clear()
+  #   drops any animations still to play.  Background jobs are kept.
+  #   The generators are closed, so a try/finally in one gets to tidy up.
+  ###################################
+  def clear(self):
+    if self.current is not None:
+      self.current.close()
+      self.current = None
+    while self.sequences:
+      self.sequences.popleft().close()
+
+###################################
+# run_timeline()
+#   runs timeline until everything on it has played and every background
+#   job is done.  readers are dual_gamepad.gamepad0_read_all() style
+#   functions:  anything from any of them skips the current hold (unless
+#   skippable is False, in which case the input is just thrown away).
+#   If interruptible is True, a press ends all the animations instead.
+#   wait(timeout) sleeps until there might be input, or timeout seconds
+#   (None for forever).  Returns True if anybody pressed anything.
+###################################
+def run_timeline(timeline, readers, wait, skippable=True, interruptible=False):
+  pressed_any = False
+  while not timeline.done():
+    timeline.advance()
+
+    pressed = False
+    for read_all in readers:
+      if read_all():
+        pressed = True
+    pressed_any = pressed_any or pressed
+    if pressed and interruptible:
+      timeline.clear()
+      continue
+    if pressed and skippable:
+      timeline.skip()
+      continue
+
+    if timeline.jobs:
+      timeline.run_job()
+      continue
+
+    if timeline.playing():
+      timeout = timeline.time_until_next()
+      if (timeout is None) or (timeout > 0):
+        wait(timeout)
+
+  return pressed_any
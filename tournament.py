@@ -0,0 +1,256 @@
+#################################################
+# tournament.py - lots of headless bot-vs-bot matches, on every core
+#
+# Each match gets its own seed, which picks the start positions (see
+# engine.random_starts()) and drives any random players, so a match can
+# be played again exactly by its number.  Matches are handed to a
+# process pool a batch at a time and their results are folded into the
+# totals as they come back, in whatever order they finish.  Nothing per
+# match is kept, so memory stays flat however many are played.
+#
+# Entrants are given as kind[:key=value,...]:
+#
+#   bot                 the Voronoi bot (bot.py).  depth= caps its
+#                       lookahead, budget= is seconds per move.
+#   random              turns at random.  chance= per tick (default 0.1).
+#
+#   python tournament.py --matches 20000 bot:depth=1 random
+#   python tournament.py --matches 5000 --width 128 --height 96 bot:depth=1 bot:depth=2
+#
+# Every ordering of the entrants gets played in turn, so nobody always
+# has the same seat.  With one entrant it plays itself.
+#################################################
+
+import argparse
+import itertools
+import multiprocessing
+import random
+import signal
+import sys
+
+from engine import CyclesEngine, random_starts
+from bot import Bot
+from tick_scheduler import monotonic
+
+###################################
+# parse_entrant()
+#   "bot:depth=2,budget=0.01" -> ("bot", {"depth": 2, "budget": 0.01})
+###################################
+entrant_kinds = {"bot": {"depth": 1, "budget": 1.0},
+                 "random": {"chance": 0.1}}
+
+def parse_entrant(spec):
+  kind, _, params = spec.partition(":")
+  if kind not in entrant_kinds:
+    raise ValueError("unknown entrant %s (pick one of %s)" % (kind, ", ".join(sorted(entrant_kinds))))
+  settings = dict(entrant_kinds[kind])
+  if params:
+    for param in params.split(","):
+      key, _, value = param.partition("=")
+      if key not in settings:
+        raise ValueError("%s doesn't take %s" % (kind, key))
+      settings[key] = type(settings[key])(float(value))
+  return kind, settings
+
+###################################
+# Worker side
+#   Each worker keeps one engine and one set of players for the whole
+#   tournament, and just moves the starts around between matches.
+###################################
+worker_setup = None
+worker_engine = None
+worker_bots = {}
+
+def worker_init(setup):
+  global worker_setup
+  global worker_engine
+
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  worker_setup = setup
+  width, height, players, max_ticks, entrants = setup
+  worker_engine = CyclesEngine(width, height, random_starts(width, height, players, random.Random(0)))
+
+###################################
+# play_match()
+#   task is (match number, seats) where seats lists the entrant number in
+#   each seat.  Returns (seats, winning seat or None, ticks, finished).
+###################################
+def play_match(task):
+  match, seats = task
+  width, height, players, max_ticks, entrants = worker_setup
+  engine = worker_engine
+
+  rng = random.Random(match)
+  engine.starts = random_starts(width, height, players, rng)
+  engine.reset()
+
+  movers = []
+  for seat in range(players):
+    kind, settings = entrants[seats[seat]]
+    if kind == "bot":
+      key = (seat, seats[seat])
+      bot = worker_bots.get(key)
+      if bot is None:
+        bot = Bot(engine, seat, settings["budget"], settings["depth"])
+        worker_bots[key] = bot
+      movers.append((bot, 0.0))
+    else:
+      movers.append((None, settings["chance"]))
+
+  inputs = [None] * players
+  while engine.tick < max_ticks:
+    dirs = engine.dirs
+    alive = engine.alive
+    for seat in range(players):
+      inputs[seat] = None
+      if not alive[seat]:
+        continue
+      bot, chance = movers[seat]
+      if bot is not None:
+        direction = bot.choose()
+        if direction != dirs[seat]:
+          inputs[seat] = direction
+      elif rng.random() < chance:
+        inputs[seat] = rng.randrange(4)
+    engine.step(inputs)
+    if engine.game_over:
+      return seats, engine.winner, engine.tick, True
+
+  return seats, None, engine.tick, False
+
+###################################
+# TournamentStats
+#   Running totals, folded in one result at a time.  Match lengths are
+#   counted per tick value, which is bounded by max_ticks.
+###################################
+class TournamentStats(object):
+
+  def __init__(self, entrant_names):
+    self.names = entrant_names
+    count = len(entrant_names)
+    self.played = [0] * count
+    self.wins = [0] * count
+    self.ties = [0] * count
+    self.matches = 0
+    self.unfinished = 0
+    self.total_ticks = 0
+    self.lengths = {}
+
+  def add(self, result):
+    seats, winner, ticks, finished = result
+    self.matches += 1
+    self.total_ticks += ticks
+    self.lengths[ticks] = self.lengths.get(ticks, 0) + 1
+    if not finished:
+      self.unfinished += 1
+
+    for seat in range(len(seats)):
+      entrant = seats[seat]
+      self.played[entrant] += 1
+      if winner == seat:
+        self.wins[entrant] += 1
+      elif finished and (winner is None):
+        self.ties[entrant] += 1
+
+  ###################################
+  # length_percentile()
+  #   match length (ticks) at the p'th percentile.
+  ###################################
+  def length_percentile(self, p):
+    wanted = self.matches * p / 100.0
+    seen = 0
+    for ticks in sorted(self.lengths):
+      seen += self.lengths[ticks]
+      if seen >= wanted:
+        return ticks
+    return 0
+
+  def report(self):
+    lines = ["%-28s %8s %8s %8s %8s %7s" % ("entrant", "played", "wins", "ties", "losses", "win%")]
+    for entrant in range(len(self.names)):
+      played = self.played[entrant]
+      wins = self.wins[entrant]
+      ties = self.ties[entrant]
+      lines.append("%-28s %8d %8d %8d %8d %6.1f%%" % (
+        self.names[entrant], played, wins, ties, played - wins - ties,
+        100.0 * wins / max(played, 1)))
+    if self.matches:
+      lines.append("length: avg=%.1f p50=%d p90=%d max=%d ticks  unfinished=%d" % (
+        float(self.total_ticks) / self.matches, self.length_percentile(50),
+        self.length_percentile(90), max(self.lengths), self.unfinished))
+    return "\n".join(lines)
+
+###################################
+# tasks()
+#   (match number, seats) for every match, generated as they're needed.
+###################################
+def tasks(matches, first_match, entrant_count, players):
+  if entrant_count == 1:
+    orderings = [(0,) * players]
+  else:
+    orderings = list(itertools.permutations(range(entrant_count), min(players, entrant_count)))
+    # more seats than entrants:  fill the rest round robin
+    orderings = [ordering + tuple(seat % entrant_count for seat in range(len(ordering), players))
+                 for ordering in orderings]
+  for match in range(first_match, first_match + matches):
+    yield match, orderings[match % len(orderings)]
+
+def main():
+  parser = argparse.ArgumentParser(description="Play headless bot-vs-bot matches on every core.")
+  parser.add_argument("entrants", nargs="+", help="kind[:key=value,...], e.g. bot:depth=2 or random:chance=0.05")
+  parser.add_argument("--matches", type=int, default=1000)
+  parser.add_argument("--seed", type=int, default=0, help="number of the first match")
+  parser.add_argument("--width", type=int, default=64)
+  parser.add_argument("--height", type=int, default=64)
+  parser.add_argument("--players", type=int, default=2, help="riders per match")
+  parser.add_argument("--max-ticks", type=int, default=10000)
+  parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                      help="worker processes (default one per core)")
+  parser.add_argument("--batch", type=int, default=256,
+                      help="matches handed out per worker at a time")
+  parser.add_argument("--progress", type=float, default=5.0,
+                      help="seconds between progress reports (0 for none)")
+  args = parser.parse_args()
+
+  try:
+    entrants = [parse_entrant(spec) for spec in args.entrants]
+  except ValueError as error:
+    parser.error(str(error))
+
+  setup = (args.width, args.height, args.players, args.max_ticks, entrants)
+  stats = TournamentStats(args.entrants)
+
+  pool = multiprocessing.Pool(args.processes, worker_init, (setup,))
+  all_tasks = tasks(args.matches, args.seed, len(entrants), args.players)
+  batch_size = args.batch * args.processes
+  # small chunks so the load evens out when some matches run long
+  chunksize = max(1, args.batch // 16)
+
+  start_time = monotonic()
+  next_progress = start_time + args.progress
+  try:
+    while True:
+      # Pool.imap pulls everything from its iterable up front, so feed it
+      # a bounded batch at a time to keep memory flat.
+      batch = list(itertools.islice(all_tasks, batch_size))
+      if not batch:
+        break
+      for result in pool.imap_unordered(play_match, batch, chunksize):
+        stats.add(result)
+        if args.progress and (monotonic() >= next_progress):
+          next_progress += args.progress
+          elapsed = monotonic() - start_time
+          print("%d/%d matches  %.1f matches/sec" % (stats.matches, args.matches, stats.matches / elapsed))
+          sys.stdout.flush()
+  finally:
+    pool.terminate()
+    pool.join()
+
+  elapsed = monotonic() - start_time
+  print(stats.report())
+  if elapsed > 0:
+    print("%d matches in %.1fs  %.1f matches/sec on %d processes" % (
+      stats.matches, elapsed, stats.matches / elapsed, args.processes))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,183 @@
+#################################################
+# trails.py - fading trails and glowing heads, a whole frame at a time
+#
+# The flat look draws each new cell once in its rider's color.  With
+# trails turned on, every cell on the panel is recomputed every tick
+# instead:  a rider's newest cell glows (pushed towards white), and the
+# trail behind it fades with age down to a floor so it's still there to
+# be hit.  Brightness and gamma correction for the panels come on top.
+#
+# Doing that a pixel at a time in Python is far too slow for a 128x96
+# chain, so it's done with NumPy.  Next to the collision grid (same
+# padded layout, so an engine cell index works in both) there's an owner
+# buffer (what's in each cell) and a born buffer (the tick it was
+# filled).  Palette, fade, glow, brightness and gamma are all baked into
+# one lookup table indexed by owner and age, so a frame is:
+#
+#   age   = clip(tick - born, 0, fade_ticks - 1)
+#   index = owner * fade_ticks + age
+#   frame = lut[index]
+#
+# all into buffers allocated up front.  The frame goes to the renderer
+# as one block of RGB bytes, along with the cells that are different
+# from the last frame (worked out here in NumPy too), so the matrix and
+# the spectator stream only deal with what actually changed.
+#
+# Needs numpy, which the flat look doesn't, so cycles.py only imports
+# this when asked for trails.
+#################################################
+
+import numpy as np
+
+from latency_trace import Histogram
+from tick_scheduler import monotonic
+
+# what's in a cell.  Riders are KIND_RIDER + player.
+KIND_EMPTY = 0
+KIND_WALL = 1
+KIND_RIDER = 2
+
+###################################
+# build_palette()
+#   the lookup table:  one row per (kind, age), already gamma corrected
+#   and scaled for brightness, as uint8 RGB.
+###################################
+def build_palette(wall_color, player_colors, fade_ticks, floor, head_glow, brightness, gamma):
+  kinds = KIND_RIDER + len(player_colors)
+  lut = np.zeros((kinds, fade_ticks, 3))
+  lut[KIND_WALL, :] = wall_color
+
+  levels = np.linspace(1.0, floor, max(fade_ticks - 1, 1))
+  for player in range(len(player_colors)):
+    color = np.array(player_colors[player], dtype=np.float64)
+    row = lut[KIND_RIDER + player]
+    row[0] = color + (255.0 - color) * head_glow
+    row[1:] = color * levels[:fade_ticks - 1, np.newaxis]
+
+  # colors are picked by eye, but the panels' PWM is linear
+  lut = 255.0 * ((lut / 255.0) * brightness) ** gamma
+  return np.round(lut).astype(np.uint8).reshape(kinds * fade_ticks, 3)
+
+class TrailPipeline(object):
+
+  ###################################
+  # fade_ticks is how long a trail takes to fade down to floor (a
+  # fraction of full brightness).  head_glow is how far the newest cell
+  # is pushed towards white.  brightness (0 to 1) and gamma are for the
+  # panels.
+  ###################################
+  def __init__(self, grid, wall_color, player_colors, fade_ticks=48, floor=0.45,
+               head_glow=0.5, brightness=1.0, gamma=2.2):
+    self.grid = grid
+    self.width = grid.width
+    self.height = grid.height
+    self.fade_ticks = fade_ticks
+    self.lut = build_palette(wall_color, player_colors, fade_ticks, floor, head_glow, brightness, gamma)
+
+    shape = (grid.height + 2, grid.stride)
+    self.owner = np.zeros(shape, dtype=np.uint8)
+    self.born = np.zeros(shape, dtype=np.int32)
+    self.owner_cells = self.owner.reshape(-1)
+    self.born_cells = self.born.reshape(-1)
+
+    # scratch, so a frame doesn't allocate anything
+    self.age = np.zeros(shape, dtype=np.int32)
+    self.index = np.zeros(shape, dtype=np.intp)
+    self.frame = np.zeros((grid.height, grid.width, 3), dtype=np.uint8)
+    self.previous = np.zeros((grid.height, grid.width, 3), dtype=np.uint8)
+    self.differs = np.zeros((grid.height, grid.width, 3), dtype=np.bool_)
+    self.moved = np.zeros((grid.height, grid.width), dtype=np.bool_)
+
+    # x,y cells that changed in the last compose(), or None if it wasn't
+    # worth comparing (the first frame after a reset).
+    self.changed = None
+    self.fresh = True
+
+    # the walls are wherever the collision template is set
+    template = np.frombuffer(bytes(grid.template), dtype=np.uint8).reshape(shape)
+    self.walls = template != 0
+
+    # seconds per frame, for the tick stats
+    self.costs = Histogram()
+    self.reset()
+
+  ###################################
+  # reset()
+  #   just the walls.  Whatever's on the panel by now wasn't drawn by us,
+  #   so the next frame counts as all new.
+  ###################################
+  def reset(self):
+    self.owner.fill(KIND_EMPTY)
+    self.owner[self.walls] = KIND_WALL
+    self.born.fill(0)
+    self.fresh = True
+
+  ###################################
+  # mark()
+  #   player has just got to cell (an engine grid index) on tick.
+  ###################################
+  def mark(self, cell, player, tick):
+    self.owner_cells[cell] = KIND_RIDER + player
+    self.born_cells[cell] = tick
+
+  ###################################
+  # erase()
+  #   cell (an engine grid index) is empty again.
+  ###################################
+  def erase(self, cell):
+    self.owner_cells[cell] = KIND_EMPTY
+
+  ###################################
+  # start_round()
+  #   reset, plus everybody's starting cell.
+  ###################################
+  def start_round(self, engine):
+    self.reset()
+    for player in range(engine.players):
+      self.mark(engine.pos[player], player, engine.tick)
+
+  ###################################
+  # compose()
+  #   the whole panel as of tick, as a height x width x 3 uint8 array.
+  #   The same array comes back every time, so use it before the next
+  #   call.  Leaves the cells that changed since the last one in changed.
+  ###################################
+  def compose(self, tick):
+    start = monotonic()
+    age = self.age
+    index = self.index
+    np.subtract(tick, self.born, out=age)
+    np.clip(age, 0, self.fade_ticks - 1, out=age)
+    np.multiply(self.owner, self.fade_ticks, out=index)
+    np.add(index, age, out=index)
+    np.take(self.lut, index[1:-1, 1:-1], axis=0, out=self.frame, mode="clip")
+
+    if self.fresh:
+      self.changed = None
+      self.fresh = False
+    else:
+      np.not_equal(self.frame, self.previous, out=self.differs)
+      np.any(self.differs, axis=2, out=self.moved)
+      ys, xs = np.nonzero(self.moved)
+      self.changed = list(zip(xs.tolist(), ys.tolist()))
+    np.copyto(self.previous, self.frame)
+
+    self.costs.add(monotonic() - start)
+    return self.frame
+
+  ###################################
+  # measure()
+  #   seconds for one frame, composed and presented through renderer
+  #   (the median of frames tries).  Only draws:  the owner and born
+  #   buffers aren't touched.
+  ###################################
+  def measure(self, renderer, frames=21):
+    times = []
+    for frame in range(frames):
+      start = monotonic()
+      renderer.draw_frame(self.compose(frame), self.changed)
+      renderer.present()
+      times.append(monotonic() - start)
+    self.costs.reset()
+    times.sort()
+    return times[len(times) // 2]
@@ -0,0 +1,61 @@
+#################################################
+# turn_buffer.py - per-player queue of pending turns
+#
+# Lets a player get two quick turns in (say up, then left) inside one
+# tick and have them applied on consecutive ticks instead of the second
+# one overwriting the first.
+#################################################
+
+from collections import deque
+
+from engine import opposite
+
+###################################
+# TurnBuffer
+#   direction is the direction the player is currently heading.
+#   size is the most turns we'll hold onto.  Extra presses are dropped.
+###################################
+class TurnBuffer(object):
+
+  def __init__(self, direction, size=3):
+    self.turns = deque()
+    self.size = size
+    self.reset(direction)
+
+  def reset(self, direction):
+    self.turns.clear()
+    self.direction = direction
+    self.turn_timestamp = None
+
+  ###################################
+  # push()
+  #   queues a turn.  Turns are checked against the last queued direction,
+  #   so you can't back into yourself by chaining two turns in one tick,
+  #   and pressing the way you're already going is ignored.
+  #   timestamp is when the button was pressed, if you know it...it comes
+  #   back out in turn_timestamp when the turn is popped.
+  ###################################
+  def push(self, direction, timestamp=None):
+    if self.turns:
+      last = self.turns[-1][0]
+    else:
+      last = self.direction
+
+    if (direction == last) | (direction == opposite(last)):
+      return
+
+    if len(self.turns) < self.size:
+      self.turns.append((direction, timestamp))
+
+  ###################################
+  # pop()
+  #   returns the direction to use for this tick.  turn_timestamp is left
+  #   as the press time of the turn that was just applied, or None if
+  #   there wasn't one.
+  ###################################
+  def pop(self):
+    if self.turns:
+      self.direction, self.turn_timestamp = self.turns.popleft()
+    else:
+      self.turn_timestamp = None
+    return self.direction